@@ -0,0 +1,135 @@
+# Benchmark indeksów: plan zapytania i czas wykonania bez indeksów i z indeksami.
+#
+# Uruchomienie (osobna baza SQLite, domyślnie 1 000 000 wypożyczeń):
+#   python bench_indexes.py
+#   python bench_indexes.py --borrows 200000 --db bench.sqlite3 --repeat 10
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+parser = argparse.ArgumentParser(description="Benchmark indeksów na tabelach biblioteki")
+parser.add_argument("--borrows", type=int, default=1_000_000, help="liczba wypożyczeń w bazie testowej")
+parser.add_argument("--books", type=int, default=20_000)
+parser.add_argument("--patrons", type=int, default=50_000)
+parser.add_argument("--db", default="bench_indexes.sqlite3", help="plik bazy SQLite używanej w benchmarku")
+parser.add_argument("--repeat", type=int, default=5, help="liczba powtórzeń każdego zapytania")
+args = parser.parse_args()
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
+
+from django.conf import settings
+
+# benchmark nigdy nie pracuje na bazie deweloperskiej
+settings.DATABASES["default"]["NAME"] = args.db
+
+import django
+
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection
+from library.models import Publisher, Category, Author, Book, Patron, Borrow
+
+STATUSES = ['active'] * 15 + ['overdue'] * 5 + ['returned'] * 78 + ['lost'] * 2
+BATCH_SIZE = 10_000
+
+
+def seed():
+    if Borrow.objects.count() >= args.borrows:
+        print(f"Baza {args.db} zawiera już dane, pomijam generowanie.")
+        return
+
+    print(f"Generowanie danych ({args.borrows} wypożyczeń)...")
+    rng = random.Random(42)
+    publisher = Publisher.objects.create(name="Benchmark")
+    category = Category.objects.create(name="Benchmark")
+
+    Author.objects.bulk_create(
+        [Author(first_name="Autor", last_name=f"Nazwisko{i}", nationality="PL") for i in range(args.books // 4)],
+        batch_size=BATCH_SIZE,
+    )
+    Book.objects.bulk_create(
+        [Book(title=f"Książka {i}", publisher=publisher, category=category,
+              publication_year=rng.randint(1900, 2025)) for i in range(args.books)],
+        batch_size=BATCH_SIZE,
+    )
+    Patron.objects.bulk_create(
+        [Patron(library_card_number=f"{i:06d}", first_name="Jan", last_name=f"Czytelnik{i}")
+         for i in range(args.patrons)],
+        batch_size=BATCH_SIZE,
+    )
+
+    book_ids = list(Book.objects.values_list('id', flat=True))
+    patron_ids = list(Patron.objects.values_list('id', flat=True))
+    today = date.today()
+    for start in range(0, args.borrows, BATCH_SIZE):
+        batch = []
+        for _ in range(min(BATCH_SIZE, args.borrows - start)):
+            borrow_date = today - timedelta(days=rng.randint(0, 3 * 365))
+            batch.append(Borrow(
+                patron_id=rng.choice(patron_ids),
+                book_id=rng.choice(book_ids),
+                borrow_date=borrow_date,
+                due_date=borrow_date + timedelta(days=30),
+                status=rng.choice(STATUSES),
+            ))
+        Borrow.objects.bulk_create(batch)
+
+
+# aktualizacja statystyk planisty
+def analyze():
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+
+# Zapytania odpowiadające ścieżkom filtrowania/sortowania udostępnianym przez API
+def queries():
+    today = date.today()
+    patron_id = Patron.objects.values_list('id', flat=True).first()
+    return {
+        "active_borrows (status='active')": Borrow.active_borrows.all(),
+        "filter status + ordering due_date": Borrow.objects.filter(status='overdue').order_by('due_date')[:50],
+        "active past due_date": Borrow.objects.filter(status='active', due_date__lt=today),
+        "patron borrows by status": Borrow.objects.filter(patron_id=patron_id, status='active'),
+        "ordering -borrow_date": Borrow.objects.order_by('-borrow_date')[:50],
+        "book publication_year": Book.objects.filter(publication_year=2000),
+        "book title exact": Book.objects.filter(title="Książka 1234"),
+        "author last_name": Author.objects.filter(last_name="Nazwisko123"),
+    }
+
+
+def run(label):
+    print(f"\n=== {label} ===")
+    for name, queryset in queries().items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        print(f"\n-- {name}: mediana {statistics.median(timings):.2f} ms")
+        print(queryset.explain())
+
+
+def benchmark_indexes():
+    return [(model, index) for model in (Author, Book, Borrow) for index in model._meta.indexes]
+
+
+if __name__ == "__main__":
+    call_command("migrate", verbosity=0)
+    seed()
+
+    with connection.schema_editor() as editor:
+        for model, index in benchmark_indexes():
+            editor.remove_index(model, index)
+    analyze()
+    run("BEZ INDEKSÓW")
+
+    with connection.schema_editor() as editor:
+        for model, index in benchmark_indexes():
+            editor.add_index(model, index)
+    analyze()
+    run("Z INDEKSAMI")
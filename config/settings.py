@@ -25,6 +25,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "library.middleware.MetricsMiddleware",
+    "library.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     'corsheaders.middleware.CorsMiddleware',
@@ -129,7 +131,92 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
-    )
+    ),
+    # stronicowanie kluczem (id + pole sortowania), rozmiar strony można nadpisać w ViewSecie (page_size)
+    'DEFAULT_PAGINATION_CLASS': 'library.pagination.KeysetPagination',
+    'PAGE_SIZE': 50,
+}
+
+# Cache odpowiedzi statystycznych (library.cache), unieważniany sygnałami modeli.
+# Domyślnie pamięć procesu; wspólny cache dla wielu procesów na jednym hoście zapewnia np.
+# "django.core.cache.backends.filebased.FileBasedCache" z LOCATION w katalogu tymczasowym.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "library",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+LIBRARY_CACHE_ALIAS = "default"
+LIBRARY_CACHE_TIMEOUT = None
+
+# Instrumentacja żądań (library.middleware): Server-Timing, log "library.instrumentation"
+# i wykrywanie zapytań N+1. Wyłączona - middleware jest wtedy pomijane przez Django.
+LIBRARY_INSTRUMENTATION = {
+    'ENABLED': False,
+    'SERVER_TIMING': True,
+    'N_PLUS_ONE_THRESHOLD': 5,
+}
+
+# Metryki Prometheusa pod /metrics (library.metrics). Każdy proces zapisuje swoje liczniki
+# w DIRECTORY (<pid>.json), /metrics sumuje wszystkie pliki - katalog należy wyczyścić
+# przy restarcie serwera (library.metrics.clear_files(), np. w on_starting gunicorna).
+LIBRARY_METRICS = {
+    'ENABLED': False,
+    'DIRECTORY': None,
+    'FLUSH_INTERVAL': 1.0,
+}
+
+# Warianty okładek (library.images) - miniatury i WebP/AVIF generowane w puli wątków
+# po zapisie okładki; SYNC=True przetwarza od razu (testy)
+LIBRARY_IMAGES = {
+    'SYNC': False,
+    'WORKERS': 2,
+    'QUALITY': 80,
+}
+
+# Podpowiedzi /api/autocomplete/ (library.autocomplete) - indeks w pamięci każdego procesu,
+# ładowany ze snapshotu SNAPSHOT (gdy aktualny) albo z bazy; MEMORY_BUDGET w bajtach
+LIBRARY_AUTOCOMPLETE = {
+    'MEMORY_BUDGET': 64 * 1024 * 1024,
+    'SNAPSHOT': None,
+    'CHECK_INTERVAL': 2.0,
+}
+
+# Raporty /api/analytics/ (library.analytics) - kolumnowy snapshot danych w pamięci procesu,
+# ładowany ponownie w tle po zmianie wersji tabel (sprawdzanej co CHECK_INTERVAL sekund),
+# nie częściej niż co MIN_AGE sekund
+LIBRARY_ANALYTICS = {
+    'CHECK_INTERVAL': 2.0,
+    'MIN_AGE': 60.0,
+    'CHUNK_SIZE': 10000,
+}
+
+# Podobne książki /api/books/{id}/similar/ (library.recommendations) - indeks K sąsiadów
+# w pliku SNAPSHOT, przebudowywany komendą build_recommendations (np. z crona)
+LIBRARY_RECOMMENDATIONS = {
+    'SNAPSHOT': None,
+    'TOP_K': 20,
+    'MIN_SUPPORT': 1,
+    'CHECK_INTERVAL': 5.0,
+}
+
+# Serwowanie okładek (library.media.media_view). SENDFILE: 'x-accel-redirect' (nginx,
+# lokalizacja internal ACCEL_PREFIX z alias na MEDIA_ROOT) albo 'x-sendfile' (Apache)
+LIBRARY_MEDIA = {
+    'SENDFILE': None,
+    'ACCEL_PREFIX': '/protected-media/',
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'library.instrumentation': {'handlers': ['console'], 'level': 'INFO', 'propagate': False},
+    },
 }
 
 # Graphene
@@ -137,6 +224,20 @@ GRAPHENE = {
     'SCHEMA': 'library.schema.schema',
 }
 
+# Limity zapytań GraphQL sprawdzane przed wykonaniem (library.graphql_cost)
+GRAPHQL_QUERY_LIMITS = {
+    'MAX_DEPTH': 8,
+    'MAX_COST': 10000,
+}
+
+# Zapytania utrwalone (extensions.persistedQuery.sha256Hash)
+GRAPHQL_PERSISTED_QUERIES = {
+    'FILE': None,
+    'ALLOW_REGISTRATION': True,
+    'MAX_REGISTERED': 1000,
+    'ONLY_PERSISTED': False,
+}
+
 SWAGGER_SETTINGS = {
     'SECURITY_DEFINITIONS': {
         'Bearer': {
@@ -2,13 +2,14 @@ from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
-from graphene_django.views import GraphQLView
 
 from django.views.decorators.csrf import csrf_exempt
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
-from library.views import home_view
+from library.views import home_view, metrics_view
+from library.graphql_view import LibraryGraphQLView
+from library.media import media_view
 
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -32,7 +33,10 @@ urlpatterns = [
     path('', home_view, name='home'),
     path('admin/', admin.site.urls),
     path('api/', include('library.urls')),
-    path('graphql/', csrf_exempt(GraphQLView.as_view(graphiql=True))),
+    path('metrics', metrics_view, name='metrics'),
+    # okładki - także poza trybem DEBUG (ETag, Range, opcjonalnie X-Accel-Redirect)
+    re_path(rf'^{settings.MEDIA_URL.lstrip("/")}(?P<path>covers/.+)$', media_view, name='media'),
+    path('graphql/', csrf_exempt(LibraryGraphQLView.as_view(graphiql=True))),
     path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 
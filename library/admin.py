@@ -1,7 +1,16 @@
-from django.contrib import admin
+import codecs
+
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+from django.template.response import TemplateResponse
+from django.urls import path
 from import_export.admin import ExportMixin, ImportExportModelAdmin
 from django.utils import timezone
-from .models import Publisher, Category, Author, Book, BookDetails, Patron, Borrow
+from .models import Publisher, Category, Author, Book, BookDetails, Patron, Borrow, JobRun
+from .counters import update_borrows
+from .importers import DEFAULT_CHUNK_SIZE, BookImporter, BorrowImporter, ImportFileError
 from .resources import (
     PublisherResource,
     CategoryResource,
@@ -12,6 +21,55 @@ from .resources import (
     BorrowResource,
 )
 
+class FastImportForm(forms.Form):
+    file = forms.FileField(label="Plik CSV")
+    chunk_size = forms.IntegerField(label="Rozmiar paczki", min_value=1, initial=DEFAULT_CHUNK_SIZE)
+    dry_run = forms.BooleanField(label="Tylko próba (bez zapisu)", required=False)
+
+
+# Szybki import CSV w panelu admina (library.importers) - alternatywa dla importu
+# django-import-export przy dużych plikach: plik czytany strumieniowo, zapis paczkami
+class FastImportAdminMixin:
+    fast_importer_class = None
+    import_export_change_list_template = "admin/library/change_list_fast_import.html"
+
+    def get_urls(self):
+        name = f'{self.opts.app_label}_{self.opts.model_name}_fast_import'
+        return [
+            path('fast-import/', self.admin_site.admin_view(self.fast_import_view), name=name),
+        ] + super().get_urls()
+
+    def fast_import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        form = FastImportForm(request.POST or None, request.FILES or None)
+        if request.method == 'POST' and form.is_valid():
+            importer = self.fast_importer_class(
+                chunk_size=form.cleaned_data['chunk_size'],
+                dry_run=form.cleaned_data['dry_run'],
+            )
+            try:
+                report = importer.run(codecs.iterdecode(form.cleaned_data['file'], 'utf-8-sig'))
+            except (ImportFileError, UnicodeDecodeError) as error:
+                messages.error(request, f"Import przerwany: {error}")
+            else:
+                level = messages.WARNING if report.error_count else messages.SUCCESS
+                messages.add_message(request, level, report.summary())
+                for line, message in report.errors[:20]:
+                    messages.warning(request, f"Wiersz {line}: {message}")
+            return redirect(f'admin:{self.opts.app_label}_{self.opts.model_name}_changelist')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.opts,
+            'title': f"Szybki import: {self.opts.verbose_name_plural}",
+            'form': form,
+            'columns': self.fast_importer_class.columns,
+            'required_columns': self.fast_importer_class.required_columns,
+        }
+        return TemplateResponse(request, "admin/library/fast_import.html", context)
+
+
 @admin.register(Publisher)
 class PublisherAdmin(ImportExportModelAdmin):
     resource_class = PublisherResource
@@ -31,8 +89,9 @@ class AuthorAdmin(ImportExportModelAdmin):
     search_fields = ("first_name", "last_name", "nationality")
 
 @admin.register(Book)
-class BookAdmin(ImportExportModelAdmin):
+class BookAdmin(FastImportAdminMixin, ImportExportModelAdmin):
     resource_class = BookResource
+    fast_importer_class = BookImporter
     list_display = ("title", "publisher", "publication_year", "category")
     search_fields = ("title",)
     list_filter = ("publisher", "category", "publication_year")
@@ -52,15 +111,26 @@ class PatronAdmin(ImportExportModelAdmin):
 
 @admin.action(description="Oznacz jako zwrócone")
 def mark_as_returned(modeladmin, request, queryset):
-    queryset.update(status='returned', return_date=timezone.now().date())
+    update_borrows(queryset, status='returned', return_date=timezone.now().date())
 
 
 @admin.register(Borrow)
-class BorrowAdmin(ImportExportModelAdmin):
+class BorrowAdmin(FastImportAdminMixin, ImportExportModelAdmin):
     resource_class = BorrowResource
+    fast_importer_class = BorrowImporter
     actions = [mark_as_returned]
     list_display = ("patron", "book", "borrow_date", "due_date", "return_date", "status")
     search_fields = ("patron__first_name", "book__title")
     list_filter = ("status",)
 
 
+@admin.register(JobRun)
+class JobRunAdmin(admin.ModelAdmin):
+    list_display = ("job", "started_at", "duration", "rows_changed", "batches")
+    list_filter = ("job",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
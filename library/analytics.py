@@ -0,0 +1,352 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import versions
+from .models import Author, Book, Borrow, Patron
+
+# Raporty analityczne (GET /api/analytics/...) liczone wektorowo w NumPy na kolumnowym
+# snapshocie wypożyczeń, książek i autorów. Snapshot jest ładowany strumieniowo z values_list
+# (bez obiektów modeli), opatrzony wersjami tabel (library.versions) i trzymany w pamięci
+# procesu do następnej zmiany danych; wyniki raportów są zapamiętywane dla danego snapshotu.
+# Po zmianie danych raporty dalej korzystają z bieżącego snapshotu, a nowy jest ładowany
+# w tle - nie częściej niż co MIN_AGE sekund.
+
+DEFAULT_ANALYTICS = {
+    'CHECK_INTERVAL': 2.0,      # jak często (s) sprawdzać wersje tabel
+    'MIN_AGE': 60.0,            # minimalny wiek (s) snapshotu, zanim zostanie załadowany nowy
+    'CHUNK_SIZE': 10000,        # wiersze pobierane z bazy w jednej paczce
+    'SYNC': False,              # ładowanie nowego snapshotu w wątku żądania (testy)
+}
+
+SNAPSHOT_MODELS = (Borrow, Book, Patron, Author)
+STATUSES = tuple(status for status, _ in Borrow.STATUS_CHOICES)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES)}
+NO_DATE = -1
+
+# przedziały czasu wypożyczenia (dni) w rozkładzie loan_durations; ostatni jest otwarty
+DURATION_BINS = (0, 7, 14, 21, 30, 45, 60, 90, 180)
+MAX_COHORT_MONTHS = 36
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+# czytelnicy z większą liczbą różnych autorów są pomijani w parach autorów - liczba par
+# rośnie z kwadratem liczby autorów czytelnika
+MAX_AUTHORS_PER_PATRON = 300
+# limit zapamiętanych wyników raportów (różne parametry) na snapshot
+MAX_REPORTS = 256
+
+
+logger = logging.getLogger('library.analytics')
+
+
+def get_analytics_settings():
+    return {**DEFAULT_ANALYTICS, **getattr(settings, 'LIBRARY_ANALYTICS', {})}
+
+
+def current_version():
+    table_versions = versions.get_versions(SNAPSHOT_MODELS)
+    return tuple(table_versions[model][0] for model in SNAPSHOT_MODELS)
+
+
+# Odczyt wszystkich tabel snapshotu z jednego stanu bazy (jedna transakcja; w PostgreSQL
+# z poziomem REPEATABLE READ) - liczba wierszy i ich odczyt się zgadzają mimo równoległych zmian
+@contextmanager
+def consistent_read():
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost and connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        yield
+
+
+def load_columns(queryset, fields, dtype, convert, chunk_size):
+    rows = queryset.order_by().values_list(*fields).iterator(chunk_size=chunk_size)
+    return np.fromiter((convert(row) for row in rows), dtype=dtype, count=queryset.count())
+
+
+def day(value):
+    return value.toordinal() if value else NO_DATE
+
+
+# Kolumny danych potrzebne raportom. Daty jako liczby dni (date.toordinal()), brak daty = -1;
+# książki i autorzy posortowani po id - indeks wiersza przez np.searchsorted.
+class Snapshot:
+    BORROW_DTYPE = [
+        ('book_id', 'i8'), ('patron_id', 'i8'), ('status', 'i1'),
+        ('borrow_day', 'i4'), ('due_day', 'i4'), ('return_day', 'i4'),
+    ]
+    BOOK_DTYPE = [('id', 'i8'), ('publication_year', 'i4')]
+    BOOK_AUTHOR_DTYPE = [('book_id', 'i8'), ('author_id', 'i8')]
+
+    # ładowany w consistent_read() (load_snapshot)
+    def __init__(self, version, chunk_size=DEFAULT_ANALYTICS['CHUNK_SIZE']):
+        self.version = version
+        self.loaded_at = time.time()
+        self.reports = {}
+        self.borrows = load_columns(
+            Borrow.objects.all(), ('book_id', 'patron_id', 'status', 'borrow_date', 'due_date', 'return_date'),
+            self.BORROW_DTYPE,
+            lambda row: (row[0], row[1], STATUS_CODES[row[2]], day(row[3]), day(row[4]), day(row[5])),
+            chunk_size,
+        )
+        self.books = np.sort(load_columns(
+            Book.objects.all(), ('id', 'publication_year'), self.BOOK_DTYPE, tuple, chunk_size), order='id')
+        self.book_authors = load_columns(
+            Book.authors.through.objects.all(), ('book_id', 'author_id'), self.BOOK_AUTHOR_DTYPE, tuple, chunk_size)
+        self.patron_count = Patron.objects.count()
+
+    def stats(self):
+        arrays = (self.borrows, self.books, self.book_authors)
+        return {
+            'version': list(self.version),
+            'loaded_at': self.loaded_at,
+            'borrows': len(self.borrows),
+            'books': len(self.books),
+            'patrons': self.patron_count,
+            'bytes': sum(array.nbytes for array in arrays),
+        }
+
+    # Wynik raportu zapamiętany dla tego snapshotu (dane snapshotu się nie zmieniają)
+    def report(self, name, compute, **params):
+        key = (name, tuple(sorted(params.items())))
+        if key not in self.reports:
+            if len(self.reports) >= MAX_REPORTS:
+                self.reports.clear()
+            self.reports[key] = compute(self, **params)
+        return self.reports[key]
+
+
+# Nowy snapshot: wersje tabel i dane z tego samego odczytu
+def load_snapshot(chunk_size=DEFAULT_ANALYTICS['CHUNK_SIZE']):
+    with consistent_read():
+        return Snapshot(current_version(), chunk_size)
+
+
+class AnalyticsService:
+    def __init__(self):
+        self.snapshot = None
+        self.lock = threading.Lock()
+        self.last_check = 0.0
+        self.loading = False
+
+    def reset(self):
+        with self.lock:
+            self.snapshot = None
+            self.last_check = 0.0
+
+    # Aktualny snapshot. Pierwszy jest ładowany w wątku żądania (jeden wątek ładuje, pozostałe
+    # czekają); po zmianie wersji tabel kolejne żądania dostają dotychczasowy snapshot, a nowy
+    # ładuje się w tle, gdy dotychczasowy ma co najmniej MIN_AGE sekund
+    def get_snapshot(self):
+        config = get_analytics_settings()
+        now = time.monotonic()
+        snapshot = self.snapshot
+        if snapshot is not None and now - self.last_check < config['CHECK_INTERVAL']:
+            return snapshot
+        if snapshot is None:
+            with self.lock:
+                if self.snapshot is None:
+                    self.snapshot = load_snapshot(config['CHUNK_SIZE'])
+                    self.last_check = now
+                return self.snapshot
+
+        self.last_check = now
+        if time.time() - snapshot.loaded_at >= config['MIN_AGE'] and current_version() != snapshot.version:
+            self.start_reload(config)
+        return self.snapshot
+
+    def start_reload(self, config):
+        with self.lock:
+            if self.loading:
+                return
+            self.loading = True
+        if config['SYNC']:
+            self.reload(config['CHUNK_SIZE'])
+            return
+
+        def target():
+            try:
+                self.reload(config['CHUNK_SIZE'])
+            except Exception:
+                logger.exception("Nie udało się załadować snapshotu analityki.")
+            finally:
+                connection.close()  # połączenie wątku roboczego
+
+        threading.Thread(target=target, name='analytics', daemon=True).start()
+
+    def reload(self, chunk_size):
+        try:
+            self.snapshot = load_snapshot(chunk_size)
+        finally:
+            self.loading = False
+
+
+service = AnalyticsService()
+
+
+def month_label(index):
+    return str(np.datetime64(int(index), 'M'))
+
+
+# Dni liczone od 0001-01-01 (date.toordinal() == 1) -> datetime64[D]
+def ordinal_dates(days):
+    return (days - date(1970, 1, 1).toordinal()).astype('datetime64[D]')
+
+
+# Retencja kohort: kohorta to miesiąc pierwszego wypożyczenia czytelnika, retention[k] - udział
+# czytelników kohorty, którzy wypożyczali w k-tym miesiącu od pierwszego wypożyczenia
+def retention_cohorts(snapshot, months=12):
+    borrows = snapshot.borrows
+    if not len(borrows):
+        return []
+    month = ordinal_dates(borrows['borrow_day']).astype('datetime64[M]').astype('i8')
+    patrons, patron_index = np.unique(borrows['patron_id'], return_inverse=True)
+
+    first = np.full(len(patrons), np.iinfo('i8').max)
+    np.minimum.at(first, patron_index, month)
+    # aktywne pary (czytelnik, miesiąc) bez powtórzeń
+    span = month.max() - month.min() + 1
+    active = np.unique(patron_index * span + (month - month.min()))
+    active_patron, active_month = np.divmod(active, span)
+    offset = active_month + month.min() - first[active_patron]
+    cohort = first[active_patron]
+
+    cohorts, cohort_index = np.unique(cohort, return_inverse=True)
+    visible = offset < months
+    counts = np.bincount(cohort_index[visible] * months + offset[visible], minlength=len(cohorts) * months)
+    counts = counts.reshape(len(cohorts), months)
+    sizes = counts[:, 0]
+    return [
+        {
+            'cohort': month_label(cohort_month),
+            'patrons': int(size),
+            'retention': [round(float(value), 4) for value in row / size],
+        }
+        for cohort_month, size, row in zip(cohorts, sizes, counts)
+    ]
+
+
+# Rozkład czasu wypożyczenia (return_date - borrow_date, w dniach) dla zakończonych wypożyczeń
+def loan_durations(snapshot):
+    borrows = snapshot.borrows
+    returned = borrows[(borrows['return_day'] != NO_DATE) & (borrows['return_day'] >= borrows['borrow_day'])]
+    durations = returned['return_day'] - returned['borrow_day']
+    edges = np.array([*DURATION_BINS, max(DURATION_BINS[-1], durations.max(initial=0)) + 1])
+    histogram, _ = np.histogram(durations, bins=edges)
+    bins = [
+        {'from': int(low), 'to': int(high) if index < len(DURATION_BINS) - 1 else None, 'count': int(count)}
+        for index, (low, high, count) in enumerate(zip(edges[:-1], edges[1:], histogram))
+    ]
+    if not len(durations):
+        return {'count': 0, 'bins': bins}
+    p50, p90, p95 = np.percentile(durations, (50, 90, 95))
+    return {
+        'count': int(len(durations)),
+        'mean': round(float(durations.mean()), 2),
+        'median': float(p50),
+        'p90': float(p90),
+        'p95': float(p95),
+        'max': int(durations.max()),
+        'bins': bins,
+    }
+
+
+# Odsetek przeterminowanych wypożyczeń według dekady wydania książki. Przeterminowane:
+# status overdue/lost, zwrot po terminie albo aktywne po terminie (today - dzień porównania).
+def overdue_by_decade(snapshot, today):
+    borrows, books = snapshot.borrows, snapshot.books
+    position = np.searchsorted(books['id'], borrows['book_id'])
+    known = position < len(books)
+    known[known] = books['id'][position[known]] == borrows['book_id'][known]
+    borrows, position = borrows[known], position[known]
+
+    today = today.toordinal()
+    status, due, returned = borrows['status'], borrows['due_day'], borrows['return_day']
+    has_due = due != NO_DATE
+    overdue = (
+        np.isin(status, [STATUS_CODES['overdue'], STATUS_CODES['lost']])
+        | (has_due & (returned != NO_DATE) & (returned > due))
+        | (has_due & (status == STATUS_CODES['active']) & (due < today))
+    )
+
+    decade = books['publication_year'][position] // 10 * 10
+    decades, decade_index = np.unique(decade, return_inverse=True)
+    totals = np.bincount(decade_index, minlength=len(decades))
+    late = np.bincount(decade_index, weights=overdue, minlength=len(decades))
+    return [
+        {'decade': int(value), 'borrows': int(total), 'overdue': int(count), 'rate': round(float(count / total), 4)}
+        for value, total, count in zip(decades, totals, late)
+    ]
+
+
+# Pary autorów najczęściej wypożyczanych przez tych samych czytelników (liczba wspólnych
+# czytelników); author - tylko pary z tym autorem
+def co_borrowed_authors(snapshot, limit=DEFAULT_LIMIT, author=None):
+    borrows, book_authors = snapshot.borrows, np.sort(snapshot.book_authors, order='book_id')
+    # wypożyczenie -> autorzy książki (książka może mieć wielu autorów)
+    start = np.searchsorted(book_authors['book_id'], borrows['book_id'], side='left')
+    end = np.searchsorted(book_authors['book_id'], borrows['book_id'], side='right')
+    counts = end - start
+    patron = np.repeat(borrows['patron_id'], counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    author_ids = book_authors['author_id'][np.repeat(start, counts) + offsets]
+
+    authors, author_index = np.unique(author_ids, return_inverse=True)
+    _, patron_index = np.unique(patron, return_inverse=True)
+    # unikalne pary (czytelnik, autor), posortowane po czytelniku
+    pairs = np.unique(patron_index * len(authors) + author_index)
+    if not len(pairs):
+        return []
+    pair_patron, pair_author = np.divmod(pairs, len(authors))
+    group_size = np.diff(np.flatnonzero(np.r_[True, pair_patron[1:] != pair_patron[:-1], True]))
+    small = group_size <= MAX_AUTHORS_PER_PATRON
+    pair_author, group_size = pair_author[np.repeat(small, group_size)], group_size[small]
+
+    # każdy autor czytelnika łączony z kolejnymi autorami tego samego czytelnika
+    following = np.repeat(np.cumsum(group_size), group_size) - np.arange(len(pair_author)) - 1
+    left = np.repeat(np.arange(len(pair_author)), following)
+    right = left + 1 + np.arange(len(left)) - np.repeat(np.cumsum(following) - following, following)
+    first, second = pair_author[left], pair_author[right]
+    if author is not None:
+        position = np.searchsorted(authors, author)
+        if position == len(authors) or authors[position] != author:
+            return []
+        selected = (first == position) | (second == position)
+        first, second = first[selected], second[selected]
+
+    keys, patrons = np.unique(first * len(authors) + second, return_counts=True)
+    if not len(keys):
+        return []
+    limit = min(limit, len(keys))
+    top = np.argpartition(-patrons, limit - 1)[:limit]
+    top = top[np.lexsort((keys[top], -patrons[top]))]
+
+    first_author, second_author = np.divmod(keys[top], len(authors))
+    ids = {int(pk) for pk in authors[np.r_[first_author, second_author]]}
+    names = {item.pk: item.full_name for item in Author.objects.filter(pk__in=ids).only('first_name', 'last_name')}
+    return [
+        {
+            'authors': [{'id': int(authors[index]), 'name': names.get(int(authors[index]))} for index in pair],
+            'patrons': int(patrons[position]),
+        }
+        for position, *pair in zip(top, first_author, second_author)
+    ]
+
+
+REPORTS = {
+    'retention': retention_cohorts,
+    'loan-durations': loan_durations,
+    'overdue-by-decade': overdue_by_decade,
+    'co-borrowed-authors': co_borrowed_authors,
+}
+
+
+def report(name, **params):
+    return service.get_snapshot().report(name, REPORTS[name], **params)
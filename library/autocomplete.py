@@ -0,0 +1,509 @@
+import bisect
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat
+
+from .models import Author, Book, Patron, TableVersion
+
+logger = logging.getLogger('library.autocomplete')
+
+DEFAULT_AUTOCOMPLETE = {
+    'MEMORY_BUDGET': 64 * 1024 * 1024,  # przybliżony limit pamięci indeksu w bajtach
+    'SNAPSHOT': None,                   # plik snapshotu (domyślnie <tmp>/library-autocomplete.json)
+    'SNAPSHOT_INTERVAL': 60.0,          # najczęściej co tyle sekund zapis snapshotu po zmianach
+    'CHECK_INTERVAL': 2.0,              # co ile sekund sprawdzana jest wersja indeksu w bazie
+    'SYNC': False,                      # przebudowa po zmianach z innych procesów od razu, nie w tle
+}
+
+# Wersja indeksu w TableVersion - podbijana tylko przy zmianie indeksowanych tekstów
+# (tytuł, imię i nazwisko, numer karty), nie przy każdym zapisie książki czy czytelnika
+VERSION_TABLE = 'library_autocomplete'
+SNAPSHOT_FORMAT = 1
+
+KINDS = ('book', 'author', 'patron')
+KIND_INDEX = {kind: index for index, kind in enumerate(KINDS)}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+MAX_WORDS = 6
+MAX_PREFIX_TOKENS = 500     # słowa słownika brane pod uwagę dla jednego prefiksu
+CANDIDATES = 2000           # wpisy oceniane dla jednego zapytania
+MIN_FUZZY_LENGTH = 3
+
+# dopasowanie słowa: całe słowo, prefiks, z literówką (zmniejszane z liczbą poprawek)
+EXACT, PREFIX, FUZZY = 1.0, 0.9, 0.8
+
+# przybliżone narzuty obiektów Pythona (bajty) przy liczeniu budżetu pamięci
+ENTRY_OVERHEAD = 200
+TOKEN_OVERHEAD = 120
+POSTING_OVERHEAD = 16
+TRIGRAM_OVERHEAD = 16
+
+WORD = re.compile(r'\w+')
+COMBINING = re.compile('[\u0300-\u036f]')
+# litery bez rozkładu NFKD na literę bazową i znak diakrytyczny
+LETTERS = str.maketrans({'ł': 'l', 'đ': 'd', 'ø': 'o', 'ß': 'ss', 'æ': 'ae', 'œ': 'oe'})
+
+
+def get_autocomplete_settings():
+    return {**DEFAULT_AUTOCOMPLETE, **getattr(settings, 'LIBRARY_AUTOCOMPLETE', {})}
+
+
+def snapshot_path():
+    return get_autocomplete_settings()['SNAPSHOT'] or os.path.join(tempfile.gettempdir(), 'library-autocomplete.json')
+
+
+# Małe litery bez znaków diakrytycznych ("Żółć" -> "zolc")
+def normalize(text):
+    text = text.lower()
+    if text.isascii():
+        return text
+    return COMBINING.sub('', unicodedata.normalize('NFKD', text.translate(LETTERS)))
+
+
+def tokenize(text):
+    return [sys.intern(token) for token in dict.fromkeys(WORD.findall(normalize(text)))]
+
+
+def trigrams(token):
+    padded = f'  {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_distance(word):
+    return 1 if len(word) < 6 else 2
+
+
+# Odległość edycyjna z przestawieniem sąsiednich liter (optimal string alignment)
+def edit_distance(a, b):
+    previous, current = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, current = previous, current, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], before[j - 2] + 1)
+    return current[-1]
+
+
+# Klucz wpisu - jedna liczba zamiast krotki (typ, id)
+def entry_key(kind, pk):
+    return pk * len(KINDS) + KIND_INDEX[kind]
+
+
+def split_key(key):
+    pk, kind = divmod(key, len(KINDS))
+    return KINDS[kind], pk
+
+
+# Indeks jednego procesu: słownik posortowanych słów (spłaszczony trie - prefiks to zakres
+# wyszukiwany bisekcją), listy wpisów dla słów i listy słów dla trigramów do dopasowań
+# z literówkami. Słowa są internowane - słownik, listy i trigramy współdzielą napisy.
+class AutocompleteIndex:
+    def __init__(self, memory_budget, version=0):
+        self.memory_budget = memory_budget
+        self.version = version
+        self.entries = {}           # klucz -> (etykieta, słowa)
+        self.postings = {}          # słowo -> lista kluczy wpisów
+        self.vocabulary = []        # posortowane słowa
+        self.trigrams = {}          # trigram -> lista słów
+        self.size = 0               # przybliżony rozmiar w bajtach
+        self.truncated = False      # część wpisów pominięta z powodu budżetu pamięci
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def label(self, kind, pk):
+        entry = self.entries.get(entry_key(kind, pk))
+        return entry[0] if entry else None
+
+    def entry_size(self, label, tokens):
+        return ENTRY_OVERHEAD + sys.getsizeof(label) + POSTING_OVERHEAD * len(tokens)
+
+    def token_size(self, token):
+        return TOKEN_OVERHEAD + sys.getsizeof(token) + TRIGRAM_OVERHEAD * (len(token) + 1)
+
+    # Dodaje lub zastępuje wpis; False - wpis nie mieści się w budżecie pamięci.
+    # sort=False - nowe słowa na końcu słownika (load() sortuje go raz na koniec).
+    def add(self, kind, pk, label, sort=True):
+        with self.lock:
+            self.remove(kind, pk)
+            tokens = tuple(tokenize(label))
+            size = self.entry_size(label, tokens)
+            size += sum(self.token_size(token) for token in tokens if token not in self.postings)
+            if self.size + size > self.memory_budget:
+                self.truncated = True
+                return False
+            key = entry_key(kind, pk)
+            self.entries[key] = (label, tokens)
+            for token in tokens:
+                keys = self.postings.get(token)
+                if keys is None:
+                    keys = self.postings[token] = []
+                    if sort:
+                        bisect.insort(self.vocabulary, token)
+                    else:
+                        self.vocabulary.append(token)
+                    for trigram in trigrams(token):
+                        self.trigrams.setdefault(trigram, []).append(token)
+                keys.append(key)
+            self.size += size
+            return True
+
+    # Wpisy (typ, id, etykieta) ładowane hurtowo - przy budowie z bazy i ze snapshotu
+    def load(self, rows):
+        with self.lock:
+            for kind, pk, label in rows:
+                self.add(kind, pk, label, sort=False)
+            self.vocabulary.sort()
+
+    def remove(self, kind, pk):
+        with self.lock:
+            key = entry_key(kind, pk)
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return
+            label, tokens = entry
+            for token in tokens:
+                keys = self.postings[token]
+                keys.remove(key)
+                if not keys:
+                    self.size -= self.token_size(token)
+                    del self.postings[token]
+                    del self.vocabulary[bisect.bisect_left(self.vocabulary, token)]
+                    for trigram in trigrams(token):
+                        tokens_with_trigram = self.trigrams[trigram]
+                        tokens_with_trigram.remove(token)
+                        if not tokens_with_trigram:
+                            del self.trigrams[trigram]
+            self.size -= self.entry_size(label, tokens)
+
+    def prefix_tokens(self, word):
+        start = bisect.bisect_left(self.vocabulary, word)
+        stop = bisect.bisect_left(self.vocabulary, word + '\uffff', start)
+        return self.vocabulary[start:min(stop, start + MAX_PREFIX_TOKENS)]
+
+    # Słowa różniące się od `word` o najwyżej max_distance(word) edycji (także przestawienie
+    # liter) - całe albo ich początek (słowo może być niedopisane). Kandydaci: słowa
+    # o wspólnych trigramach.
+    def fuzzy_tokens(self, word):
+        limit = max_distance(word)
+        shared = Counter()
+        for trigram in trigrams(word):
+            shared.update(self.trigrams.get(trigram, ()))
+        minimum = 2 if len(word) >= 5 else 1
+        matches = {}
+        for token, count in shared.items():
+            if count < minimum or len(token) < len(word) - limit:
+                continue
+            distance = min(
+                edit_distance(word, token[:length])
+                for length in range(len(word) - limit, min(len(word) + limit, len(token)) + 1)
+            )
+            if distance <= limit:
+                matches[token] = FUZZY * (1 - distance / (len(word) + 1))
+        return matches
+
+    # Dopasowania słowa zapytania: {słowo słownika: ocena}; każde słowo może być prefiksem
+    def match_word(self, word, fuzzy):
+        matches = {}
+        if fuzzy and len(word) >= MIN_FUZZY_LENGTH:
+            matches.update(self.fuzzy_tokens(word))
+        matches.update(dict.fromkeys(self.prefix_tokens(word), PREFIX))
+        if word in self.postings:
+            matches[word] = EXACT
+        return matches
+
+    def search(self, words, kinds, limit, fuzzy):
+        # kandydaci z najbardziej selektywnego słowa, pozostałe słowa sprawdzane na wpisach
+        matches = [self.match_word(word, fuzzy) for word in words]
+        sizes = [sum(len(self.postings[token]) for token in match) for match in matches]
+        first = min(range(len(words)), key=sizes.__getitem__)
+
+        kind_indexes = {KIND_INDEX[kind] for kind in kinds or KINDS}
+        candidates = {}
+        for token, score in sorted(matches[first].items(), key=lambda item: -item[1]):
+            for key in self.postings[token]:
+                if key % len(KINDS) in kind_indexes and candidates.get(key, 0.0) < score:
+                    candidates[key] = score
+                    if len(candidates) >= CANDIDATES:
+                        break
+            if len(candidates) >= CANDIDATES:
+                break
+
+        results = []
+        query = ' '.join(words)
+        for key, score in candidates.items():
+            label, tokens = self.entries[key]
+            total = score
+            for index, match in enumerate(matches):
+                if index == first:
+                    continue
+                best = max((match.get(token, 0.0) for token in tokens), default=0.0)
+                if not best:
+                    break
+                total += best
+            else:
+                score = total / len(words)
+                if ' '.join(tokens).startswith(query):
+                    score += 0.1
+                results.append((-score, len(label), label, key))
+        results.sort()
+        suggestions = []
+        for score, _, label, key in results[:limit]:
+            kind, pk = split_key(key)
+            suggestions.append({'type': kind, 'id': pk, 'label': label, 'score': round(-score, 3)})
+        return suggestions
+
+    # Podpowiedzi: najpierw dokładne i prefiksowe dopasowania, literówki - gdy tych jest za mało
+    def complete(self, query, kinds=None, limit=DEFAULT_LIMIT):
+        words = tokenize(query)[:MAX_WORDS]
+        if not words:
+            return []
+        with self.lock:
+            results = self.search(words, kinds, limit, fuzzy=False)
+            if len(results) < limit:
+                results = self.search(words, kinds, limit, fuzzy=True)
+        return results
+
+    def stats(self):
+        return {
+            'entries': len(self.entries),
+            'tokens': len(self.vocabulary),
+            'trigrams': len(self.trigrams),
+            'size': self.size,
+            'memory_budget': self.memory_budget,
+            'truncated': self.truncated,
+            'version': self.version,
+        }
+
+    def snapshot(self):
+        with self.lock:
+            entries = [[*split_key(key), label] for key, (label, _) in self.entries.items()]
+        return {'format': SNAPSHOT_FORMAT, 'version': self.version, 'truncated': self.truncated, 'entries': entries}
+
+
+# Teksty indeksowane dla typów: etykieta wpisu
+def book_labels(queryset):
+    return queryset.values_list('pk', 'title')
+
+
+def author_labels(queryset):
+    return queryset.annotate(label=Concat('first_name', Value(' '), 'last_name')).values_list('pk', 'label')
+
+
+def patron_labels(queryset):
+    return queryset.values_list('pk', 'library_card_number')
+
+
+LABELS = {'book': book_labels, 'author': author_labels, 'patron': patron_labels}
+# kolejność ładowania - przy przekroczeniu budżetu pomijane są najrzadziej wypożyczane książki
+SOURCES = (
+    ('patron', lambda: Patron.objects.order_by('pk')),
+    ('author', lambda: Author.objects.order_by('pk')),
+    ('book', lambda: Book.objects.order_by('-borrow_count', 'pk')),
+)
+
+
+def current_version():
+    return TableVersion.objects.filter(table=VERSION_TABLE).values_list('version', flat=True).first() or 0
+
+
+# Podbija wersję indeksu (w bieżącej transakcji) i zwraca nową wartość - wiersz jest
+# zablokowany do końca transakcji, więc poprzednia wersja to dokładnie wartość - 1
+def bump_version():
+    with transaction.atomic():
+        updated = TableVersion.objects.filter(table=VERSION_TABLE).update(version=F('version') + 1)
+        if not updated:
+            TableVersion.objects.get_or_create(table=VERSION_TABLE, defaults={'version': 1})
+        return current_version()
+
+
+def build_index(memory_budget):
+    index = AutocompleteIndex(memory_budget, current_version())
+    index.load(
+        (kind, pk, label)
+        for kind, queryset in SOURCES
+        for pk, label in LABELS[kind](queryset()).iterator(chunk_size=5000)
+    )
+    return index
+
+
+def load_snapshot(memory_budget, path=None):
+    try:
+        with open(path or snapshot_path(), encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get('format') != SNAPSHOT_FORMAT or data.get('version') != current_version():
+        return None
+    index = AutocompleteIndex(memory_budget, data['version'])
+    index.load(data['entries'])
+    index.truncated = index.truncated or data.get('truncated', False)
+    return index
+
+
+def save_snapshot(index, path=None):
+    path = path or snapshot_path()
+    data = index.snapshot()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+# Indeks procesu: ładowany przy pierwszym użyciu ze snapshotu (gdy jego wersja zgadza się
+# z bazą) albo z bazy. Zmiany z tego procesu są nanoszone od razu (sygnały); zmiany z innych
+# procesów wykrywa okresowe porównanie wersji - indeks jest wtedy przebudowywany w tle,
+# a do tego czasu odpowiada poprzedni.
+class AutocompleteService:
+    def __init__(self):
+        self.index = None
+        self.lock = threading.Lock()
+        self.rebuilding = False
+        self.dirty = False
+        self.last_check = 0.0
+        self.last_snapshot = 0.0
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+            self.rebuilding = False
+            self.dirty = False
+            self.last_check = 0.0
+            self.last_snapshot = 0.0
+
+    def get_index(self):
+        if self.index is None:
+            with self.lock:
+                if self.index is None:
+                    budget = get_autocomplete_settings()['MEMORY_BUDGET']
+                    index = load_snapshot(budget)
+                    if index is None:
+                        index = build_index(budget)
+                        save_snapshot(index)
+                    self.index = index
+                    self.last_check = time.monotonic()
+        else:
+            self.refresh()
+        return self.index
+
+    def refresh(self):
+        config = get_autocomplete_settings()
+        now = time.monotonic()
+        if now - self.last_check < config['CHECK_INTERVAL']:
+            return
+        self.last_check = now
+        if current_version() != self.index.version:
+            self.start_rebuild(config)
+        elif self.dirty and now - self.last_snapshot >= config['SNAPSHOT_INTERVAL']:
+            self.dirty = False
+            self.last_snapshot = now
+            self.run(save_snapshot, config, self.index)
+
+    def start_rebuild(self, config):
+        with self.lock:
+            if self.rebuilding:
+                return
+            self.rebuilding = True
+        self.run(self.rebuild, config, config['MEMORY_BUDGET'])
+
+    def rebuild(self, memory_budget):
+        try:
+            index = build_index(memory_budget)
+            save_snapshot(index)
+            self.index = index
+            self.dirty = False
+        finally:
+            self.rebuilding = False
+
+    def run(self, function, config, *args):
+        if config['SYNC']:
+            function(*args)
+            return
+
+        def target():
+            try:
+                function(*args)
+            except Exception:
+                logger.exception("Nie udało się odświeżyć indeksu podpowiedzi.")
+            finally:
+                connection.close()  # połączenie wątku roboczego
+
+        threading.Thread(target=target, name='autocomplete', daemon=True).start()
+
+    # Zmiany tekstów wpisów w tym procesie: {(typ, id): etykieta albo None - usunięcie}.
+    # Wywołujący przekazują tylko rzeczywiste zmiany (porównane ze stanem w bazie przed zapisem,
+    # nie z indeksem procesu, który może nie być załadowany albo być przycięty budżetem pamięci).
+    # Wersja w bazie jest podbijana zawsze (inne procesy przebudują swoje indeksy), indeks
+    # procesu przyjmuje nową wersję tylko, jeśli był aktualny przed zmianą.
+    def apply(self, changes):
+        index = self.index
+        if not changes:
+            return
+        version = bump_version()
+        if index is None:
+            return
+        for (kind, pk), label in changes.items():
+            if label is None:
+                index.remove(kind, pk)
+            else:
+                index.add(kind, pk, label)
+        if index.version == version - 1:
+            index.version = version
+        self.dirty = True
+
+
+service = AutocompleteService()
+
+
+def complete(query, kinds=None, limit=DEFAULT_LIMIT):
+    return service.get_index().complete(query, kinds, max(1, min(limit, MAX_LIMIT)))
+
+
+def object_changed(kind, pk, label):
+    service.apply({(kind, pk): label})
+
+
+def object_deleted(kind, pk):
+    service.apply({(kind, pk): None})
+
+
+# Etykiety obiektów z bazy: {id: etykieta}
+def current_labels(kind, ids):
+    model = {'book': Book, 'author': Author, 'patron': Patron}[kind]
+    return dict(LABELS[kind](model.objects.filter(pk__in=ids)))
+
+
+# Zmiany zbiorcze (library.bulk, importy): etykiety obiektów odczytane z bazy, brakujące są usuwane.
+# previous = {id: etykieta sprzed zmiany} - obiekty z niezmienioną etykietą są pomijane
+# (bez previous każdy obiekt jest zmianą, np. nowe albo usunięte obiekty)
+def objects_changed(kind, ids, previous=None):
+    ids = set(ids)
+    if not ids:
+        return
+    labels = current_labels(kind, ids)
+    service.apply({
+        (kind, pk): labels.get(pk) for pk in ids
+        if previous is None or previous.get(pk) != labels.get(pk)
+    })
+
+
+# Zmiana wszystkich danych (np. generate_data) - indeksy procesów i snapshot są nieaktualne
+def invalidate():
+    bump_version()
+    service.reset()
@@ -0,0 +1,204 @@
+import json
+import math
+import platform
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timezone
+from urllib.parse import urlencode
+
+import django
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import analytics
+from .cache import get_cache
+from .models import Book
+from .urls import router
+
+# Pomiar wydajności API (komenda benchmark_api): opóźnienie p50/p95, liczba zapytań SQL
+# i szczytowe zużycie pamięci dla każdej trasy routera, akcji GET i zapytań GraphQL.
+
+Endpoint = namedtuple('Endpoint', ['name', 'method', 'path', 'data'])
+Regression = namedtuple('Regression', ['name', 'metric', 'baseline', 'current'])
+
+# wartości parametrów w url_path akcji (np. export/(?P<fmt>ndjson|csv))
+ACTION_KWARGS = {'fmt': 'ndjson'}
+
+GRAPHQL_QUERIES = {
+    'books': """{ allBooks(first: 50) { edges { node {
+        title publicationYear category { name } publisher { name }
+        authors(first: 5) { edges { node { fullName } } }
+    } } } }""",
+    'borrows': """{ allBorrows(first: 50) { edges { node {
+        status dueDate patron { fullName } book { title }
+    } } } }""",
+    'patron_borrows': """{ allPatrons(first: 20) { edges { node {
+        fullName borrows(first: 10) { edges { node { status book { title } } } }
+    } } } }""",
+    'stats': """{
+        bookCount { count } categoryStats { name bookCount } publicationYearStats { minYear maxYear }
+        borrowStatusStats { status count } bookPagesStats { averagePages }
+    }""",
+    'book_stats': "{ bookStats { title borrowCount } }",
+    'borrow_timeseries': '{ borrowTimeseries(period: "month", groupBy: "category") { period name count } }',
+}
+
+# metryki porównywane z wynikami bazowymi
+METRICS = ('p50_ms', 'p95_ms', 'queries', 'peak_kb')
+
+
+# Wszystkie trasy DefaultRoutera: lista, szczegóły (pierwszy obiekt) i akcje obsługujące GET,
+# a także pozostałe widoki API i zapytania GraphQL
+def collect_endpoints():
+    endpoints = [Endpoint('api-root', 'GET', reverse('api-root'), None)]
+    for prefix, viewset, basename in router.registry:
+        pk = viewset.queryset.model._default_manager.order_by('pk').values_list('pk', flat=True).first()
+        endpoints.append(Endpoint(f'{basename}-list', 'GET', reverse(f'{basename}-list'), None))
+        if pk is not None:
+            endpoints.append(Endpoint(f'{basename}-detail', 'GET', reverse(f'{basename}-detail', kwargs={'pk': pk}), None))
+
+        for action in viewset.get_extra_actions():
+            if 'get' not in action.mapping:
+                continue
+            kwargs = {name: value for name, value in ACTION_KWARGS.items() if f'(?P<{name}>' in action.url_path}
+            if action.detail:
+                if pk is None:
+                    continue
+                kwargs['pk'] = pk
+            name = f'{basename}-{action.url_name}'
+            endpoints.append(Endpoint(name, 'GET', reverse(name, kwargs=kwargs), None))
+
+    endpoints.append(Endpoint('cache-stats', 'GET', reverse('cache-stats'), None))
+    # wyszukiwanie prefiksu pierwszego słowa tytułu istniejącej książki
+    title = Book.objects.order_by('pk').values_list('title', flat=True).first()
+    if title:
+        query = urlencode({'q': title.split()[0][:4]})
+        endpoints.append(Endpoint('search', 'GET', f"{reverse('search')}?{query}", None))
+        # podpowiedzi: jednoliterowy prefiks (najwięcej pasujących wpisów) i literówka
+        # (zamienione sąsiednie litery najdłuższego słowa tytułu - dopasowanie przybliżone)
+        word = max(title.split(), key=len)
+        for name, query in (('broad-prefix', title[0]), ('typo', word[:1] + word[2:3] + word[1:2] + word[3:])):
+            query = urlencode({'q': query})
+            endpoints.append(Endpoint(f'autocomplete-{name}', 'GET', f"{reverse('autocomplete')}?{query}", None))
+    # podobne książki dla najczęściej wypożyczanej książki (najwięcej wspólnych czytelników),
+    # przez REST i GraphQL; akcja book-similar powyżej dotyczy pierwszej książki
+    popular = Book.objects.order_by('-borrow_count', 'pk').values_list('pk', flat=True).first()
+    if popular is not None:
+        endpoints.append(Endpoint('book-similar-popular', 'GET', reverse('book-similar', kwargs={'pk': popular}), None))
+        query = '{ similarBooks(bookId: %d, first: 10) { score patrons book { title } } }' % popular
+        endpoints.append(Endpoint('graphql-similar_books', 'POST', '/graphql/', {'query': query}))
+    for report in analytics.REPORTS:
+        endpoints.append(Endpoint(f'analytics-{report}', 'GET', reverse('analytics', kwargs={'report': report}), None))
+    for name, query in GRAPHQL_QUERIES.items():
+        endpoints.append(Endpoint(f'graphql-{name}', 'POST', '/graphql/', {'query': query}))
+    return endpoints
+
+
+# Wysyła żądanie i odczytuje całą odpowiedź (także strumieniową) - zwraca (status, treść)
+def send(client, endpoint):
+    if endpoint.method == 'POST':
+        response = client.post(endpoint.path, json.dumps(endpoint.data), content_type='application/json')
+    else:
+        response = client.get(endpoint.path)
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    return response.status_code, content
+
+
+def is_ok(endpoint, status, content):
+    if not 200 <= status < 300:
+        return False
+    if endpoint.path.startswith('/graphql/'):
+        return not json.loads(content).get('errors')
+    return True
+
+
+# Percentyl metodą najbliższej rangi
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+# Czasy mierzone bez tracemalloc (który spowalnia wykonanie); liczba zapytań
+# i pamięć w osobnych przebiegach
+def measure(client, endpoint, repeat=20, warmup=2, cold_cache=False):
+    for _ in range(warmup):
+        send(client, endpoint)
+
+    timings = []
+    for _ in range(repeat):
+        if cold_cache:
+            get_cache().clear()
+        started = time.perf_counter()
+        status, content = send(client, endpoint)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    if cold_cache:
+        get_cache().clear()
+    reset_queries()     # pełny bufor zapytań (9000) uniemożliwiłby zliczanie
+    with CaptureQueriesContext(connection) as queries:
+        send(client, endpoint)
+    query_count = len(queries)  # odczyt od razu - kolejne żądanie czyści connection.queries
+
+    if cold_cache:
+        get_cache().clear()
+    tracemalloc.start()
+    try:
+        send(client, endpoint)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        'method': endpoint.method,
+        'path': endpoint.path,
+        'status': status,
+        'ok': is_ok(endpoint, status, content),
+        'p50_ms': round(percentile(timings, 0.5), 3),
+        'p95_ms': round(percentile(timings, 0.95), 3),
+        'mean_ms': round(sum(timings) / len(timings), 3),
+        'queries': query_count,
+        'peak_kb': round(peak / 1024, 1),
+        'bytes': len(content),
+    }
+
+
+def run(endpoints, repeat=20, warmup=2, cold_cache=False, meta=None):
+    client = Client()
+    results = {endpoint.name: measure(client, endpoint, repeat, warmup, cold_cache) for endpoint in endpoints}
+    return {
+        'meta': {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'repeat': repeat,
+            'cold_cache': cold_cache,
+            **(meta or {}),
+        },
+        'results': results,
+    }
+
+
+# Metryki gorsze od bazowych o więcej niż `threshold` (np. 0.2 = 20%). Liczba zapytań SQL
+# nie może wzrosnąć wcale; przy czasach i pamięci pomijane są zmiany poniżej progu szumu.
+def compare(current, baseline, threshold=0.2, min_delta_ms=1.0, min_delta_kb=64.0):
+    regressions = []
+    for name, base in baseline.get('results', {}).items():
+        result = current['results'].get(name)
+        if result is None:
+            continue
+        for metric in METRICS:
+            old, new = base.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            if metric == 'queries':
+                regressed = new > old
+            else:
+                min_delta = min_delta_ms if metric.endswith('_ms') else min_delta_kb
+                regressed = new > max(old * (1 + threshold), old + min_delta)
+            if regressed:
+                regressions.append(Regression(name, metric, old, new))
+    return regressions
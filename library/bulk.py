@@ -0,0 +1,325 @@
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import transaction
+from django.db.models import Count, prefetch_related_objects
+from rest_framework.exceptions import ValidationError
+
+from . import autocomplete, counters, rollups, search, versions
+from .models import Author, Book, BookDetails, Borrow, Category, Patron, Publisher
+from .serializers import BookBulkItemSerializer, BorrowBulkItemSerializer
+from .signals import bulk_changes
+
+MAX_BATCH_SIZE = 5000       # maksymalna liczba pozycji w jednym żądaniu
+WRITE_BATCH_SIZE = 500      # liczba wierszy w jednym INSERT/UPDATE
+
+# Wynik operacji zbiorczej: zapisane obiekty (przy usuwaniu - ich id)
+# i błędy pozycji w postaci [{"index": <pozycja w paczce>, "errors": {...}}]
+BulkResult = namedtuple('BulkResult', ['objects', 'errors'])
+
+
+def check_batch(items):
+    if not isinstance(items, list):
+        raise ValidationError({'non_field_errors': ['Oczekiwano listy.']})
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValidationError({'non_field_errors': [f'Paczka może zawierać najwyżej {MAX_BATCH_SIZE} pozycji.']})
+
+
+# Walidacja pól każdej pozycji (bez zapytań do bazy): [(index, dane)], {index: błędy}
+def validate_items(serializer_class, items, partial=False):
+    valid, errors = [], {}
+    for index, item in enumerate(items):
+        serializer = serializer_class(data=item, partial=partial)
+        if serializer.is_valid():
+            valid.append((index, dict(serializer.validated_data)))
+        else:
+            errors[index] = serializer.errors
+    return valid, errors
+
+
+# Id istniejących obiektów spośród podanych - jedno zapytanie dla całej paczki
+def existing_ids(model, ids):
+    ids = {pk for pk in ids if pk is not None}
+    if not ids:
+        return set()
+    return set(model.objects.filter(pk__in=ids).values_list('pk', flat=True))
+
+
+def not_found(pk):
+    return [f'Obiekt o id {pk} nie istnieje.']
+
+
+# Sprawdza klucze obce pozycji; relations = {pole: (atrybut modelu, istniejące id)}
+def check_relations(data, relations):
+    errors = {}
+    for name, (attname, ids) in relations.items():
+        pk = data.get(attname)
+        if pk is not None and pk not in ids:
+            errors[name] = not_found(pk)
+    return errors
+
+
+# Obiekty wskazane przez "id" pozycji, pobrane jednym zapytaniem: [(index, obiekt, dane)]
+def load_targets(model, valid, errors):
+    instances = model.objects.in_bulk([data['id'] for _, data in valid if data.get('id') is not None])
+    targets, seen = [], set()
+    for index, data in valid:
+        pk = data.pop('id', None)
+        if pk is None:
+            errors[index] = {'id': ['To pole jest wymagane.']}
+        elif pk not in instances:
+            errors[index] = {'id': not_found(pk)}
+        elif pk in seen:
+            errors[index] = {'id': ['Obiekt występuje w paczce więcej niż raz.']}
+        else:
+            seen.add(pk)
+            targets.append((index, instances[pk], data))
+    return targets
+
+
+# Id do usunięcia: lista liczb albo obiektów {"id": ...}
+def parse_ids(items):
+    check_batch(items)
+    ids, errors = [], {}
+    for index, item in enumerate(items):
+        pk = item.get('id') if isinstance(item, dict) else item
+        if isinstance(pk, int) and not isinstance(pk, bool):
+            ids.append((index, pk))
+        else:
+            errors[index] = {'id': ['Wymagana jest liczba całkowita.']}
+    return ids, errors
+
+
+def select_existing(ids, existing, errors):
+    selected = {}
+    for index, pk in ids:
+        if pk in existing:
+            selected[pk] = None
+        else:
+            errors[index] = {'id': not_found(pk)}
+    return list(selected)
+
+
+def as_list(errors):
+    return [{'index': index, 'errors': errors[index]} for index in sorted(errors)]
+
+
+# Domyślne daty z Borrow.save() i reguły Borrow.clean()
+def prepare_borrow(borrow):
+    borrow.apply_defaults()
+    try:
+        borrow.clean()
+    except DjangoValidationError as error:
+        return {'non_field_errors': error.messages}
+    return {}
+
+
+def borrow_relations(valid):
+    return {
+        'patron': ('patron_id', existing_ids(Patron, (data.get('patron_id') for *_, data in valid))),
+        'book': ('book_id', existing_ids(Book, (data.get('book_id') for *_, data in valid))),
+    }
+
+
+# Dodaje wypożyczenia jednym bulk_create. Przy atomic=True błąd dowolnej pozycji
+# odrzuca całą paczkę, przy atomic=False zapisywane są poprawne pozycje.
+def create_borrows(items, atomic=True):
+    check_batch(items)
+    valid, errors = validate_items(BorrowBulkItemSerializer, items)
+    relations = borrow_relations(valid)
+
+    borrows = []
+    for index, data in valid:
+        data.pop('id', None)
+        borrow = Borrow(**data)
+        item_errors = check_relations(data, relations) or prepare_borrow(borrow)
+        if item_errors:
+            errors[index] = item_errors
+        else:
+            borrows.append(borrow)
+
+    if errors and atomic:
+        return BulkResult([], as_list(errors))
+    if borrows:
+        with transaction.atomic(), bulk_changes():
+            Borrow.objects.bulk_create(borrows, batch_size=WRITE_BATCH_SIZE)
+            counters.apply_changes((None, borrow.counter_state()) for borrow in borrows)
+            versions.models_changed(Borrow)
+    return BulkResult(borrows, as_list(errors))
+
+
+# Aktualizuje wypożyczenia wskazane przez "id" (tylko przesłane pola) jednym bulk_update
+def update_borrows(items, atomic=True):
+    check_batch(items)
+    valid, errors = validate_items(BorrowBulkItemSerializer, items, partial=True)
+    targets = load_targets(Borrow, valid, errors)
+    relations = borrow_relations(targets)
+
+    borrows, changes, fields = [], [], {'borrow_date', 'due_date'}
+    for index, borrow, data in targets:
+        old_state = borrow.counter_state()
+        for name, value in data.items():
+            setattr(borrow, name, value)
+        item_errors = check_relations(data, relations) or prepare_borrow(borrow)
+        if item_errors:
+            errors[index] = item_errors
+            continue
+        borrows.append(borrow)
+        changes.append((old_state, borrow.counter_state()))
+        fields.update(data)
+
+    if errors and atomic:
+        return BulkResult([], as_list(errors))
+    if borrows:
+        with transaction.atomic(), bulk_changes():
+            Borrow.objects.bulk_update(borrows, sorted(fields), batch_size=WRITE_BATCH_SIZE)
+            counters.apply_changes(changes)
+            versions.models_changed(Borrow)
+    return BulkResult(borrows, as_list(errors))
+
+
+def delete_borrows(items, atomic=True):
+    ids, errors = parse_ids(items)
+    states = {
+        row[0]: row[1:]
+        for row in Borrow.objects.filter(pk__in=[pk for _, pk in ids]).values_list('id', 'book_id', 'patron_id', 'status', 'borrow_date')
+    }
+    deleted = select_existing(ids, states, errors)
+
+    if errors and atomic:
+        return BulkResult([], as_list(errors))
+    if deleted:
+        with transaction.atomic(), bulk_changes():
+            Borrow.objects.filter(pk__in=deleted).delete()
+            counters.apply_changes((states[pk], None) for pk in deleted)
+            versions.models_changed(Borrow)
+    return BulkResult(deleted, as_list(errors))
+
+
+def book_relations(valid):
+    relations = {
+        'publisher': ('publisher_id', existing_ids(Publisher, (data.get('publisher_id') for *_, data in valid))),
+        'category': ('category_id', existing_ids(Category, (data.get('category_id') for *_, data in valid))),
+    }
+    authors = existing_ids(Author, (pk for *_, data in valid for pk in data.get('authors', ())))
+    return relations, authors
+
+
+def check_book(data, relations, author_ids):
+    errors = check_relations(data, relations)
+    missing_authors = [pk for pk in data.get('authors', ()) if pk not in author_ids]
+    if missing_authors:
+        errors['authors'] = [f'Autorzy o id {", ".join(map(str, missing_authors))} nie istnieją.']
+    return errors
+
+
+# Wiersze tabeli pośredniej Book.authors jednym bulk_create (replace=True usuwa dotychczasowe)
+def set_authors(book_authors, replace=False):
+    through = Book.authors.through
+    if replace:
+        through.objects.filter(book_id__in=[book.pk for book, _ in book_authors]).delete()
+    through.objects.bulk_create(
+        [
+            through(book_id=book.pk, author_id=author_id)
+            for book, authors in book_authors
+            for author_id in dict.fromkeys(authors)
+        ],
+        batch_size=WRITE_BATCH_SIZE,
+    )
+
+
+def create_books(items, atomic=True):
+    check_batch(items)
+    valid, errors = validate_items(BookBulkItemSerializer, items)
+    relations, author_ids = book_relations(valid)
+
+    book_authors = []
+    for index, data in valid:
+        item_errors = check_book(data, relations, author_ids)
+        if item_errors:
+            errors[index] = item_errors
+            continue
+        data.pop('id', None)
+        authors = data.pop('authors', [])
+        book_authors.append((Book(**data), authors))
+
+    if errors and atomic:
+        return BulkResult([], as_list(errors))
+    books = [book for book, _ in book_authors]
+    if books:
+        with transaction.atomic(), bulk_changes():
+            Book.objects.bulk_create(books, batch_size=WRITE_BATCH_SIZE)
+            set_authors(book_authors)
+            search.index('book', [book.pk for book in books])
+            autocomplete.objects_changed('book', [book.pk for book in books])
+            versions.models_changed(Book, Author)
+        prefetch_related_objects(books, 'authors')
+    return BulkResult(books, as_list(errors))
+
+
+# Aktualizuje książki wskazane przez "id"; przesłana lista "authors" zastępuje dotychczasową
+def update_books(items, atomic=True):
+    check_batch(items)
+    valid, errors = validate_items(BookBulkItemSerializer, items, partial=True)
+    targets = load_targets(Book, valid, errors)
+    relations, author_ids = book_relations(targets)
+
+    books, book_authors, fields, dimensions, titles = [], [], set(), {}, {}
+    for index, book, data in targets:
+        item_errors = check_book(data, relations, author_ids)
+        if item_errors:
+            errors[index] = item_errors
+            continue
+        dimensions[book.pk] = (book.category_id, book.publisher_id)
+        titles[book.pk] = book.title
+        if 'authors' in data:
+            book_authors.append((book, data.pop('authors')))
+        for name, value in data.items():
+            setattr(book, name, value)
+        books.append(book)
+        fields.update(data)
+
+    if errors and atomic:
+        return BulkResult([], as_list(errors))
+    if books:
+        with transaction.atomic(), bulk_changes():
+            if fields:
+                Book.objects.bulk_update(books, sorted(fields), batch_size=WRITE_BATCH_SIZE)
+            if {'category_id', 'publisher_id'} & fields:
+                rollups.move_books(dimensions)
+            if 'publisher_id' in fields:
+                counters.move_books(dimensions)
+            if book_authors:
+                set_authors(book_authors, replace=True)
+            search.index('book', [book.pk for book in books])
+            autocomplete.objects_changed('book', [book.pk for book in books], previous=titles)
+            versions.models_changed(Book, Author)
+        prefetch_related_objects(books, 'authors')
+    return BulkResult(books, as_list(errors))
+
+
+# Usuwa książki razem z ich wypożyczeniami (CASCADE) - liczniki czytelników i wydawców
+# są korygowane o usuwane wypożyczenia
+def delete_books(items, atomic=True):
+    ids, errors = parse_ids(items)
+    existing = existing_ids(Book, (pk for _, pk in ids))
+    deleted = select_existing(ids, existing, errors)
+
+    if errors and atomic:
+        return BulkResult([], as_list(errors))
+    if deleted:
+        with transaction.atomic(), bulk_changes():
+            states = (
+                Borrow.objects
+                .filter(book_id__in=deleted)
+                .order_by()
+                .values('book_id', 'patron_id', 'status', 'borrow_date')
+                .annotate(count=Count('id'))
+                .values_list('book_id', 'patron_id', 'status', 'borrow_date', 'count')
+            )
+            counters.apply_changes((tuple(state), None, count) for *state, count in states)
+            Book.objects.filter(pk__in=deleted).delete()
+            search.remove('book', deleted)
+            autocomplete.objects_changed('book', deleted)
+            versions.models_changed(Book, Author, BookDetails, Borrow)
+    return BulkResult(deleted, as_list(errors))
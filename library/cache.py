@@ -0,0 +1,133 @@
+import hashlib
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+MISSING = object()
+KEY_PREFIX = 'library'
+
+
+# Cache odpowiedzi endpointów statystycznych.
+# Każdy wpis zależy od listy modeli; klucz zawiera aktualne "wersje" tych modeli, a sygnały
+# (library.signals) podbijają wersję modelu przy każdej zmianie - stare wpisy przestają być
+# osiągalne natychmiast, bez zgadywania czasu życia (TTL).
+# Backend wybiera settings.LIBRARY_CACHE_ALIAS (locmem, plikowy, Redis/Memcached...).
+def get_cache():
+    return caches[getattr(settings, 'LIBRARY_CACHE_ALIAS', 'default')]
+
+
+def version_key(model):
+    return f'{KEY_PREFIX}:version:{model._meta.label_lower}'
+
+
+# Wersja startowa oparta na czasie - po wyrzuceniu klucza wersji z cache'u nie wrócimy
+# do wartości, pod którą mogą jeszcze leżeć stare wpisy
+def new_version():
+    return time.time_ns()
+
+
+def get_versions(models):
+    cache = get_cache()
+    keys = [version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def invalidate_models(*models):
+    cache = get_cache()
+    for model in models:
+        key = version_key(model)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, new_version(), timeout=None)
+
+
+def make_key(name, versions, params):
+    raw = repr((versions, params)).encode('utf-8')
+    return f'{KEY_PREFIX}:{name}:{hashlib.md5(raw).hexdigest()}'
+
+
+# Statystyki trafień w obrębie procesu
+class CacheStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {'hits': 0, 'misses': 0})
+
+    def record(self, name, hit):
+        with self._lock:
+            self._counts[name]['hits' if hit else 'misses'] += 1
+
+    def snapshot(self):
+        with self._lock:
+            by_name = {name: dict(counts) for name, counts in self._counts.items()}
+        hits = sum(counts['hits'] for counts in by_name.values())
+        misses = sum(counts['misses'] for counts in by_name.values())
+        for counts in by_name.values():
+            counts['hit_ratio'] = hit_ratio(counts['hits'], counts['misses'])
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hit_ratio(hits, misses),
+            'by_name': by_name,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+def hit_ratio(hits, misses):
+    total = hits + misses
+    return round(hits / total, 4) if total else None
+
+
+stats = CacheStats()
+
+
+# Zwraca (klucz, wartość) - wartość MISSING oznacza brak wpisu
+def lookup(name, models, params=()):
+    key = make_key(name, get_versions(models), params)
+    value = get_cache().get(key, MISSING)
+    stats.record(name, hit=value is not MISSING)
+    return key, value
+
+
+def store(key, value):
+    get_cache().set(key, value, timeout=getattr(settings, 'LIBRARY_CACHE_TIMEOUT', None))
+
+
+# Wynik funkcji `compute` z cache'u (np. dla resolverów GraphQL)
+def cached(name, models, compute, params=()):
+    key, value = lookup(name, models, params)
+    if value is MISSING:
+        value = compute()
+        store(key, value)
+    return value
+
+
+# Dekorator akcji ViewSetu - zapamiętuje response.data udanych odpowiedzi GET
+def cache_response(name, models):
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            params = (sorted(request.query_params.lists()), args, sorted(kwargs.items()))
+            key, data = lookup(name, models, params)
+            if data is not MISSING:
+                return Response(data)
+            response = method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                store(key, response.data)
+            return response
+        return wrapper
+    return decorator
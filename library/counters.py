@@ -0,0 +1,166 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+
+from . import rollups
+from .models import Book, Patron, Publisher, Borrow
+from .versions import models_changed
+
+
+# Zmiany liczników wynikające z przejścia wypożyczenia ze stanu `old_state` do `new_state`.
+# Stan to krotka (book_id, patron_id, status, borrow_date) albo None (brak wypożyczenia).
+# Wynik: {(book_id, patron_id): [zmiana wszystkich, zmiana aktywnych]}
+def borrow_deltas(old_state, new_state):
+    deltas = defaultdict(lambda: [0, 0])
+    for state, sign in ((old_state, -1), (new_state, 1)):
+        if state is None:
+            continue
+        book_id, patron_id, status, _ = state
+        deltas[(book_id, patron_id)][0] += sign
+        if status == 'active':
+            deltas[(book_id, patron_id)][1] += sign
+    return deltas
+
+
+# Suma zmian liczników dla wielu wypożyczeń: changes = [(old_state, new_state), ...]
+# albo [(old_state, new_state, liczba wypożyczeń), ...] (wiele wypożyczeń w tym samym stanie)
+def collect_deltas(changes):
+    deltas = defaultdict(lambda: [0, 0])
+    for old_state, new_state, *count in changes:
+        weight = count[0] if count else 1
+        for key, (total, active) in borrow_deltas(old_state, new_state).items():
+            deltas[key][0] += total * weight
+            deltas[key][1] += active * weight
+    return deltas
+
+
+# liczba wierszy zmienianych jednym UPDATE-em liczników
+UPDATE_BATCH_SIZE = 500
+
+
+# Przyrosty liczników wielu wierszy: {pk: {pole: zmiana}} - jeden UPDATE na paczkę wierszy
+# (SET pole = pole + CASE id WHEN ... END WHERE id IN (...)), niezależnie od liczby wierszy
+def add_to_counters(model, deltas):
+    rows = [(pk, changes) for pk, changes in deltas.items() if any(changes.values())]
+    for start in range(0, len(rows), UPDATE_BATCH_SIZE):
+        batch = rows[start:start + UPDATE_BATCH_SIZE]
+        fields = {field for _, changes in batch for field, delta in changes.items() if delta}
+        model.objects.filter(pk__in=[pk for pk, _ in batch]).update(**{
+            field: F(field) + Case(
+                *(When(pk=pk, then=Value(changes[field])) for pk, changes in batch if changes.get(field)),
+                default=Value(0), output_field=IntegerField(),
+            )
+            for field in fields
+        })
+
+
+# Nanosi zmiany na liczniki książek, czytelników i wydawców (atomowo, przez wyrażenia F)
+def apply_deltas(deltas):
+    books = defaultdict(lambda: [0, 0])
+    patrons = defaultdict(lambda: [0, 0])
+    for (book_id, patron_id), (total, active) in deltas.items():
+        books[book_id][0] += total
+        books[book_id][1] += active
+        patrons[patron_id][0] += total
+        patrons[patron_id][1] += active
+
+    books = {pk: delta for pk, delta in books.items() if any(delta)}
+    patrons = {pk: delta for pk, delta in patrons.items() if any(delta)}
+    if not books and not patrons:
+        return
+
+    with transaction.atomic():
+        publishers = defaultdict(int)
+        book_publishers = dict(Book.objects.filter(pk__in=books).values_list('id', 'publisher_id'))
+        for book_id, (total, _) in books.items():
+            if book_id in book_publishers:
+                publishers[book_publishers[book_id]] += total
+
+        counter_fields = ('borrow_count', 'active_borrow_count')
+        add_to_counters(Book, {pk: dict(zip(counter_fields, delta)) for pk, delta in books.items()})
+        add_to_counters(Patron, {pk: dict(zip(counter_fields, delta)) for pk, delta in patrons.items()})
+        add_to_counters(Publisher, {pk: {'total_borrows': total} for pk, total in publishers.items()})
+        models_changed(Book, Patron, Publisher)
+
+
+# Zmiana wydawcy książek - ich wypożyczenia przechodzą do licznika nowego wydawcy.
+# old_dimensions = {book_id: (category_id, publisher_id)} sprzed zmiany (jak w rollups.move_books)
+def move_books(old_dimensions):
+    publishers = defaultdict(int)
+    rows = Book.objects.filter(pk__in=list(old_dimensions)).values_list('pk', 'publisher_id', 'borrow_count')
+    for pk, publisher_id, borrow_count in rows:
+        old_publisher_id = old_dimensions[pk][1]
+        if old_publisher_id != publisher_id and borrow_count:
+            publishers[old_publisher_id] -= borrow_count
+            publishers[publisher_id] += borrow_count
+
+    publishers = {pk: total for pk, total in publishers.items() if total}
+    if not publishers:
+        return
+    with transaction.atomic():
+        add_to_counters(Publisher, {pk: {'total_borrows': total} for pk, total in publishers.items()})
+        models_changed(Publisher)
+
+
+# Nanosi zmiany wypożyczeń na liczniki i agregaty w czasie (library.rollups)
+def apply_changes(changes):
+    changes = list(changes)
+    apply_deltas(collect_deltas(changes))
+    rollups.apply_changes(changes)
+
+
+# Odpowiednik queryset.update(...) dla wypożyczeń, który aktualizuje też liczniki i agregaty
+# (np. akcja "Oznacz jako zwrócone" w panelu admina). Zmiany liczone z wypożyczeń
+# pogrupowanych według stanu - jedno zapytanie niezależnie od liczby wierszy.
+def update_borrows(queryset, **fields):
+    with transaction.atomic():
+        changes = []
+        tracked = {'status', 'borrow_date'} & set(fields)
+        if tracked:
+            changed = queryset.exclude(status=fields['status']) if tracked == {'status'} else queryset
+            state_fields = ('book_id', 'patron_id', 'status', 'borrow_date')
+            rows = (
+                changed
+                .order_by()
+                .values(*state_fields)
+                .annotate(count=Count('id'))
+                .values_list(*state_fields, 'count')
+            )
+            for book_id, patron_id, status, borrow_date, count in rows:
+                new_state = (book_id, patron_id, fields.get('status', status), fields.get('borrow_date', borrow_date))
+                changes.append(((book_id, patron_id, status, borrow_date), new_state, count))
+
+        updated = queryset.update(**fields)
+        apply_changes(changes)
+        models_changed(Borrow)
+    return updated
+
+
+# Podzapytanie liczące wypożyczenia powiązane z wierszem zewnętrznego zapytania
+def _borrow_count(lookup, **filters):
+    borrows = (
+        Borrow.objects
+        .filter(**{lookup: OuterRef('pk')}, **filters)
+        .order_by()
+        .values(lookup)
+        .annotate(count=Count('id'))
+        .values('count')
+    )
+    return Coalesce(Subquery(borrows), 0)
+
+
+# Przelicza wszystkie liczniki od zera (naprawa rozjazdów)
+def rebuild_counters():
+    with transaction.atomic():
+        Book.objects.update(
+            borrow_count=_borrow_count('book'),
+            active_borrow_count=_borrow_count('book', status='active'),
+        )
+        Patron.objects.update(
+            borrow_count=_borrow_count('patron'),
+            active_borrow_count=_borrow_count('patron', status='active'),
+        )
+        Publisher.objects.update(total_borrows=_borrow_count('book__publisher'))
+        models_changed(Book, Patron, Publisher)
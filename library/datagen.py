@@ -0,0 +1,196 @@
+import random
+from collections import namedtuple
+from datetime import timedelta
+from itertools import accumulate
+
+# Generator danych syntetycznych (komenda generate_data).
+# Moduł nie korzysta z ORM - wiersze (słowniki pól modelu z jawnymi id) generowane są
+# w procesach roboczych, a zapisuje je proces główny (library.seeding).
+# Każdy blok BLOCK_SIZE kolejnych id ma własny generator losowy wyprowadzony z ziarna,
+# więc dane są identyczne niezależnie od liczby procesów i rozmiaru paczki.
+
+BLOCK_SIZE = 1000
+
+FIRST_NAMES = (
+    'Jan', 'Anna', 'Piotr', 'Maria', 'Tomasz', 'Ewa', 'Krzysztof', 'Barbara', 'Andrzej', 'Magdalena',
+    'Paweł', 'Katarzyna', 'Michał', 'Agnieszka', 'Marcin', 'Joanna', 'Robert', 'Monika', 'David', 'Emma',
+)
+LAST_NAMES = (
+    'Kowalski', 'Nowak', 'Wiśniewski', 'Dąbrowski', 'Lewandowski', 'Wójcik', 'Kamiński', 'Zieliński',
+    'Szymański', 'Woźniak', 'Kozłowski', 'Jankowski', 'Mazur', 'Krawczyk', 'Martin', 'Smith', 'Müller',
+)
+NATIONALITIES = ('Poland', 'USA', 'UK', 'Germany', 'France', 'Czech Republic')
+LOCATIONS = ('Poland', 'USA', 'UK', 'Germany')
+TITLE_WORDS = (
+    'Algorytmy', 'Programowanie', 'Wprowadzenie', 'Podstawy', 'Sztuka', 'Praktyka', 'Python', 'Django',
+    'Bazy danych', 'Sieci', 'Systemy', 'Architektura', 'Analiza', 'Projektowanie', 'Wzorce', 'Testowanie',
+)
+CATEGORY_WORDS = ('Programowanie', 'Algorytmy', 'Bazy danych', 'Sieci', 'Sztuczna inteligencja', 'Zarządzanie')
+
+# Udział statusów wypożyczeń i liczba autorów książki (wartość, waga)
+STATUS_WEIGHTS = (('returned', 77), ('active', 15), ('overdue', 5), ('lost', 3))
+AUTHOR_FANOUT = ((1, 70), (2, 20), (3, 7), (4, 3))
+LOAN_DAYS = 30
+
+# Parametry generowania: liczności tabel, ziarno, dzień odniesienia (daty wypożyczeń liczone są
+# wstecz od `today`), długość historii w dniach i wykładnik rozkładu Zipfa popularności książek
+Config = namedtuple('Config', [
+    'publishers', 'categories', 'authors', 'books', 'patrons', 'borrows',
+    'seed', 'today', 'days', 'zipf',
+])
+
+# Kolejność generowania - tabele wskazywane kluczami obcymi są zapisywane wcześniej
+TABLES = ('publishers', 'categories', 'authors', 'patrons', 'books', 'borrows')
+
+
+def cum_weights(pairs):
+    return [value for value, _ in pairs], list(accumulate(weight for _, weight in pairs))
+
+
+# Skumulowane wagi rozkładu Zipfa dla rang 1..n (waga rangi k = 1 / k^s)
+def zipf_weights(n, s):
+    return list(accumulate(1 / rank ** s for rank in range(1, n + 1)))
+
+
+class Generator:
+    def __init__(self, config):
+        self.config = config
+        self.statuses, self.status_weights = cum_weights(STATUS_WEIGHTS)
+        self.fanouts, self.fanout_weights = cum_weights(AUTHOR_FANOUT)
+        self._rankings = {}
+
+    def rng(self, table, block):
+        return random.Random(f'{self.config.seed}:{table}:{block}')
+
+    # (id w kolejności popularności, skumulowane wagi) - ranking to losowa permutacja id,
+    # żeby najpopularniejsze książki nie były po prostu pierwszymi w tabeli
+    def ranking(self, table, n, s):
+        if table not in self._rankings:
+            ids = list(range(1, n + 1))
+            random.Random(f'{self.config.seed}:{table}:ranking').shuffle(ids)
+            self._rankings[table] = (ids, zipf_weights(n, s))
+        return self._rankings[table]
+
+    # Wiersze dla id z przedziału [start, stop): {klucz modelu: [słowniki pól]}
+    def generate(self, table, start, stop):
+        method = getattr(self, f'generate_{table}')
+        rows = {}
+        for block_start in range(start, stop, BLOCK_SIZE):
+            block_stop = min(block_start + BLOCK_SIZE, stop)
+            rng = self.rng(table, (block_start - 1) // BLOCK_SIZE)
+            for key, items in method(rng, range(block_start, block_stop)).items():
+                rows.setdefault(key, []).extend(items)
+        return rows
+
+    def person(self, rng):
+        return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+
+    def generate_publishers(self, rng, ids):
+        return {'publisher': [
+            {
+                'id': pk,
+                'name': f'Wydawnictwo {rng.choice(LAST_NAMES)} {pk}',
+                'email': f'kontakt{pk}@wydawnictwo.example.com',
+                'location': rng.choice(LOCATIONS),
+            }
+            for pk in ids
+        ]}
+
+    def generate_categories(self, rng, ids):
+        return {'category': [{'id': pk, 'name': f'{rng.choice(CATEGORY_WORDS)} {pk}'} for pk in ids]}
+
+    def generate_authors(self, rng, ids):
+        rows = []
+        for pk in ids:
+            first_name, last_name = self.person(rng)
+            rows.append({
+                'id': pk,
+                'first_name': first_name,
+                'last_name': last_name,
+                'email': f'autor{pk}@example.com',
+                'nationality': rng.choice(NATIONALITIES),
+            })
+        return {'author': rows}
+
+    def generate_patrons(self, rng, ids):
+        rows = []
+        for pk in ids:
+            first_name, last_name = self.person(rng)
+            rows.append({
+                'id': pk,
+                'library_card_number': f'{pk:06d}',
+                'first_name': first_name,
+                'last_name': last_name,
+                'email': f'czytelnik{pk}@example.com',
+            })
+        return {'patron': rows}
+
+    # Książki razem ze szczegółami (ISBN z id) i autorami - kilku autorów ma wiele książek
+    def generate_books(self, rng, ids):
+        config = self.config
+        author_ids, author_weights = self.ranking('authors', config.authors, 0.8)
+        books, details, authors = [], [], []
+        for pk in ids:
+            books.append({
+                'id': pk,
+                'title': f'{rng.choice(TITLE_WORDS)} {rng.choice(TITLE_WORDS).lower()} {pk}',
+                'publisher_id': rng.randint(1, config.publishers),
+                'publication_year': max(1900, config.today.year - int(rng.expovariate(1 / 12))),
+                'category_id': rng.randint(1, config.categories) if config.categories else None,
+            })
+            details.append({
+                'id': pk,
+                'book_id': pk,
+                'isbn': f'978{pk:010d}',
+                'pages': min(2000, max(16, int(rng.lognormvariate(5.6, 0.4)))),
+            })
+            fanout = rng.choices(self.fanouts, cum_weights=self.fanout_weights)[0]
+            chosen = rng.choices(author_ids, cum_weights=author_weights, k=fanout)
+            authors.extend({'book_id': pk, 'author_id': author_id} for author_id in dict.fromkeys(chosen))
+        return {'book': books, 'bookdetails': details, 'book_authors': authors}
+
+    # Wypożyczenia: książka z rozkładu Zipfa, czytelnik z łagodniejszego rozkładu potęgowego,
+    # daty zgodne ze statusem (aktywne - ostatnie 30 dni, przeterminowane - po terminie zwrotu)
+    def generate_borrows(self, rng, ids):
+        config = self.config
+        book_ids, book_weights = self.ranking('books', config.books, config.zipf)
+        patron_ids, patron_weights = self.ranking('patrons', config.patrons, 0.6)
+        today = config.today
+        rows = []
+        for pk in ids:
+            status = rng.choices(self.statuses, cum_weights=self.status_weights)[0]
+            return_date = None
+            if status == 'active':
+                borrow_date = today - timedelta(days=rng.randint(0, LOAN_DAYS - 1))
+            elif status == 'overdue':
+                borrow_date = today - timedelta(days=rng.randint(LOAN_DAYS + 1, LOAN_DAYS + 90))
+            elif status == 'returned':
+                borrow_date = today - timedelta(days=rng.randint(1, config.days))
+                loan = int(rng.triangular(1, 2 * LOAN_DAYS, LOAN_DAYS // 2))
+                return_date = min(borrow_date + timedelta(days=loan), today)
+            else:
+                borrow_date = today - timedelta(days=rng.randint(2 * LOAN_DAYS, config.days))
+                return_date = min(borrow_date + timedelta(days=LOAN_DAYS + rng.randint(1, 60)), today)
+            rows.append({
+                'id': pk,
+                'patron_id': rng.choices(patron_ids, cum_weights=patron_weights)[0],
+                'book_id': rng.choices(book_ids, cum_weights=book_weights)[0],
+                'borrow_date': borrow_date,
+                'due_date': borrow_date + timedelta(days=LOAN_DAYS),
+                'return_date': return_date,
+                'status': status,
+            })
+        return {'borrow': rows}
+
+
+# Generator procesu roboczego (ProcessPoolExecutor initializer)
+_generator = None
+
+
+def init_worker(config):
+    global _generator
+    _generator = Generator(config)
+
+
+def generate_chunk(table, start, stop):
+    return _generator.generate(table, start, stop)
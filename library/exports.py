@@ -0,0 +1,87 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+
+from .models import Author
+
+CHUNK_SIZE = 2000       # wierszy pobieranych z bazy na raz (kursor po stronie serwera)
+BUFFER_ROWS = 500       # wierszy łączonych w jeden fragment odpowiedzi
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+# Eksport strumieniowy dużych tabel (NDJSON / CSV).
+# Wiersze czytane są kursorem w paczkach po `chunk_size` (QuerySet.iterator) i od razu
+# wysyłane klientowi, więc zużycie pamięci nie zależy od rozmiaru tabeli - w przeciwieństwie
+# do eksportu django-import-export, który buduje cały Dataset w pamięci.
+# Kolumny jak w library.resources: klucze obce jako id.
+def plain_queryset(queryset):
+    return queryset.select_related(None).prefetch_related(None)
+
+
+# Wiersze jako słowniki {kolumna: wartość} wprost z values_list (bez tworzenia instancji modelu)
+def value_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    attnames = [queryset.model._meta.get_field(name).attname for name in fields]
+    for values in plain_queryset(queryset).values_list(*attnames).iterator(chunk_size=chunk_size):
+        yield dict(zip(fields, values))
+
+
+# Książki z listą id autorów - autorzy dociągani jednym zapytaniem na paczkę `chunk_size`
+def book_rows(queryset, fields, chunk_size=CHUNK_SIZE):
+    columns = [name for name in fields if name != 'authors']
+    attnames = [queryset.model._meta.get_field(name).attname for name in columns]
+    queryset = (
+        plain_queryset(queryset)
+        .only(*attnames)
+        .prefetch_related(Prefetch('authors', queryset=Author.objects.only('id')))
+    )
+    for book in queryset.iterator(chunk_size=chunk_size):
+        row = {name: getattr(book, attname) for name, attname in zip(columns, attnames)}
+        row['authors'] = [author.pk for author in book.authors.all()]
+        yield row
+
+
+def ndjson_lines(rows, fields):
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+# csv.writer pisze do obiektu, który zwraca wiersz zamiast go buforować
+class Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([
+            ','.join(map(str, value)) if isinstance(value, list) else value
+            for value in (row[name] for name in fields)
+        ])
+
+
+# Łączy linie w większe fragmenty - mniej wywołań zapisu po stronie serwera WSGI
+def buffered(lines, size=BUFFER_ROWS):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def streaming_response(rows, fields, fmt, filename):
+    lines = csv_lines(rows, fields) if fmt == 'csv' else ndjson_lines(rows, fields)
+    response = StreamingHttpResponse(buffered(lines), content_type=CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
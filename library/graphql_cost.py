@@ -0,0 +1,93 @@
+from django.conf import settings
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+from graphql.language import (
+    FieldNode, FragmentDefinitionNode, FragmentSpreadNode, InlineFragmentNode, IntValueNode,
+)
+from graphql.validation import ValidationRule
+
+# pola "techniczne" połączeń Relay - nie zwiększają głębokości zapytania
+RELAY_FIELDS = {'edges', 'node', 'pageInfo'}
+
+DEFAULT_LIMITS = {
+    'MAX_DEPTH': 8,         # maksymalna głębokość zagnieżdżenia pól (bez edges/node)
+    'MAX_COST': 10000,      # maksymalny koszt: liczba pól pomnożona przez rozmiary stron połączeń
+    'DEFAULT_PAGE_SIZE': None,  # rozmiar strony, gdy brak first/last (domyślnie RELAY_CONNECTION_MAX_LIMIT)
+}
+
+
+# Limity z settings.GRAPHQL_QUERY_LIMITS uzupełnione wartościami domyślnymi
+def get_limits():
+    limits = {**DEFAULT_LIMITS, **getattr(settings, 'GRAPHQL_QUERY_LIMITS', {})}
+    if limits['DEFAULT_PAGE_SIZE'] is None:
+        limits['DEFAULT_PAGE_SIZE'] = graphene_settings.RELAY_CONNECTION_MAX_LIMIT or 100
+    return limits
+
+
+# Mnożnik kosztu dla pola: first/last dla połączeń, 1 dla zwykłych pól.
+# Wartości ze zmiennych nie są znane na etapie walidacji - przyjmujemy domyślny rozmiar strony.
+def page_size(field, default_page_size):
+    for argument in field.arguments or ():
+        if argument.name.value in ('first', 'last'):
+            if isinstance(argument.value, IntValueNode):
+                return max(int(argument.value.value), 1)
+            return default_page_size
+    if field.selection_set and any(
+        isinstance(selection, FieldNode) and selection.name.value == 'edges'
+        for selection in field.selection_set.selections
+    ):
+        return default_page_size
+    return 1
+
+
+# Statyczna analiza zestawu pól: (głębokość, koszt)
+def measure(selection_set, fragments, default_page_size, multiplier=1, visited=frozenset()):
+    depth, cost = 0, 0
+    for selection in selection_set.selections:
+        if isinstance(selection, FieldNode):
+            name = selection.name.value
+            if name.startswith('__'):
+                continue
+            level = 0 if name in RELAY_FIELDS else 1
+            cost += multiplier
+            sub_depth = 0
+            if selection.selection_set:
+                size = page_size(selection, default_page_size)
+                sub_depth, sub_cost = measure(
+                    selection.selection_set, fragments, default_page_size, multiplier * size, visited)
+                cost += sub_cost
+            depth = max(depth, level + sub_depth)
+
+        elif isinstance(selection, InlineFragmentNode):
+            sub_depth, sub_cost = measure(
+                selection.selection_set, fragments, default_page_size, multiplier, visited)
+            depth, cost = max(depth, sub_depth), cost + sub_cost
+
+        elif isinstance(selection, FragmentSpreadNode):
+            name = selection.name.value
+            if name in visited or name not in fragments:
+                continue    # cykle i nieznane fragmenty zgłaszają standardowe reguły walidacji
+            sub_depth, sub_cost = measure(
+                fragments[name].selection_set, fragments, default_page_size, multiplier, visited | {name})
+            depth, cost = max(depth, sub_depth), cost + sub_cost
+    return depth, cost
+
+
+# Reguła walidacji odrzucająca zbyt głębokie lub zbyt kosztowne zapytania przed ich wykonaniem
+class QueryCostRule(ValidationRule):
+
+    def enter_operation_definition(self, node, *args):
+        limits = get_limits()
+        fragments = {
+            definition.name.value: definition
+            for definition in self.context.document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        depth, cost = measure(node.selection_set, fragments, limits['DEFAULT_PAGE_SIZE'])
+
+        if depth > limits['MAX_DEPTH']:
+            self.report_error(GraphQLError(
+                f"Zapytanie jest zbyt głębokie ({depth}, maksymalnie {limits['MAX_DEPTH']}).", node))
+        if cost > limits['MAX_COST']:
+            self.report_error(GraphQLError(
+                f"Zapytanie jest zbyt kosztowne ({cost}, maksymalnie {limits['MAX_COST']}).", node))
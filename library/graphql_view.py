@@ -0,0 +1,214 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.http import HttpResponseBadRequest, HttpResponseNotAllowed
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import ExecutionResult, GraphQLError, OperationType, execute, get_operation_ast, parse, validate
+from graphql.execution.middleware import MiddlewareManager
+from graphql.validation import specified_rules
+
+from .graphql_cost import QueryCostRule
+from .middleware import get_instrumentation, record_operation, track_resolver
+
+# standardowe reguły GraphQL + limit głębokości i kosztu
+VALIDATION_RULES = (*specified_rules, QueryCostRule)
+
+DEFAULT_PERSISTED_QUERIES = {
+    'FILE': None,               # plik JSON {"<sha256>": "<zapytanie>"} wczytywany przy starcie
+    'ALLOW_REGISTRATION': True, # rejestracja nowych zapytań przez klienta (hash + treść, jak Apollo APQ)
+    'MAX_REGISTERED': 1000,     # limit zapytań zarejestrowanych przez klientów (LRU); zapytania z FILE bez limitu
+    'ONLY_PERSISTED': False,    # odrzucanie zapytań spoza rejestru
+}
+
+
+def get_persisted_settings():
+    return {**DEFAULT_PERSISTED_QUERIES, **getattr(settings, 'GRAPHQL_PERSISTED_QUERIES', {})}
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+# Rejestr zapytań utrwalonych: hash -> sparsowany i zwalidowany dokument. Zapytania z pliku
+# są przypięte, zarejestrowane przez klientów - w LRU o rozmiarze MAX_REGISTERED (rejestracja
+# jest otwarta, więc bez limitu pamięć procesu rosłaby bez końca)
+class PersistedQueryStore:
+    def __init__(self):
+        self._pinned = {}
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+        self._file_loaded = False
+
+    def get(self, schema, sha256):
+        self.load_file(schema)
+        document = self._pinned.get(sha256)
+        if document is not None:
+            return document
+        with self._lock:
+            document = self._documents.get(sha256)
+            if document is not None:
+                self._documents.move_to_end(sha256)
+        return document
+
+    # parsuje i waliduje zapytanie; zwraca (dokument, błędy)
+    def register(self, schema, query, sha256=None, pinned=False):
+        sha256 = sha256 or query_hash(query)
+        if query_hash(query) != sha256:
+            return None, [GraphQLError("Hash zapytania nie zgadza się z jego treścią.")]
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            return None, [error]
+        errors = validate(schema, document, VALIDATION_RULES, graphene_settings.MAX_VALIDATION_ERRORS)
+        if errors:
+            return None, errors
+        with self._lock:
+            if pinned:
+                self._pinned[sha256] = document
+                return document, []
+            self._documents[sha256] = document
+            self._documents.move_to_end(sha256)
+            while len(self._documents) > get_persisted_settings()['MAX_REGISTERED']:
+                self._documents.popitem(last=False)
+        return document, []
+
+    def load_file(self, schema):
+        if self._file_loaded:
+            return
+        with self._lock:
+            if self._file_loaded:
+                return
+            self._file_loaded = True
+        path = get_persisted_settings()['FILE']
+        if not path:
+            return
+        with open(path, encoding='utf-8') as f:
+            queries = json.load(f)
+        for sha256, query in queries.items():
+            _, errors = self.register(schema, query, sha256, pinned=True)
+            if errors:
+                raise ValueError(f"Nieprawidłowe zapytanie utrwalone {sha256}: {errors[0].message}")
+
+    def clear(self):
+        with self._lock:
+            self._pinned.clear()
+            self._documents.clear()
+            self._file_loaded = False
+
+
+persisted_queries = PersistedQueryStore()
+
+
+# Widok GraphQL z limitem kosztu zapytań i obsługą zapytań utrwalonych.
+# Klient wysyła extensions.persistedQuery.sha256Hash (protokół Apollo APQ); dla znanego hasha
+# wykonywany jest gotowy dokument z pominięciem parsowania i walidacji.
+class LibraryGraphQLView(GraphQLView):
+    validation_rules = VALIDATION_RULES
+
+    def get_persisted_hash(self, request, data):
+        extensions = request.GET.get('extensions') or data.get('extensions')
+        if isinstance(extensions, str):
+            try:
+                extensions = json.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        if not isinstance(extensions, dict):
+            return None
+        persisted = extensions.get('persistedQuery') or {}
+        return persisted.get('sha256Hash')
+
+    # Przy włączonej instrumentacji (library.middleware) - śledzenie resolverów
+    def get_middleware(self, request):
+        middleware = super().get_middleware(request)
+        if get_instrumentation(request) is None:
+            return middleware
+        if isinstance(middleware, MiddlewareManager):
+            middleware = middleware.middlewares
+        return [*(middleware or ()), track_resolver]
+
+    def json_encode(self, request, d, pretty=False):
+        metrics = get_instrumentation(request)
+        if metrics is None:
+            return super().json_encode(request, d, pretty)
+        started = time.perf_counter()
+        try:
+            return super().json_encode(request, d, pretty)
+        finally:
+            metrics.serialize_time += time.perf_counter() - started
+
+    def execute_graphql_request(self, request, data, query, variables, operation_name, show_graphiql=False):
+        record_operation(request, operation_name, query)
+        persisted_settings = get_persisted_settings()
+        sha256 = self.get_persisted_hash(request, data)
+
+        if sha256 is None:
+            if persisted_settings['ONLY_PERSISTED'] and query:
+                return ExecutionResult(errors=[GraphQLError("Dozwolone są tylko zapytania utrwalone.")])
+            return super().execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql)
+
+        schema = self.schema.graphql_schema
+        document = persisted_queries.get(schema, sha256)
+        if document is None:
+            if not query:
+                return ExecutionResult(errors=[GraphQLError("PersistedQueryNotFound")])
+            if not persisted_settings['ALLOW_REGISTRATION']:
+                return ExecutionResult(errors=[GraphQLError("PersistedQueryNotSupported")])
+            document, errors = persisted_queries.register(schema, query, sha256)
+            if errors:
+                return ExecutionResult(data=None, errors=errors)
+
+        return self.execute_document(request, document, variables, operation_name, show_graphiql)
+
+    # Wykonanie gotowego (zwalidowanego) dokumentu - odpowiednik końcowej części
+    # GraphQLView.execute_graphql_request
+    def execute_document(self, request, document, variables, operation_name, show_graphiql=False):
+        operation_ast = get_operation_ast(document, operation_name)
+        if operation_ast is not None and operation_ast.name is not None:
+            record_operation(request, operation_ast.name.value)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            if show_graphiql:
+                return None
+            raise HttpError(HttpResponseNotAllowed(
+                ["POST"], f"Can only perform a {operation_ast.operation.value} operation from a POST request."))
+
+        try:
+            execute_options = {
+                "root_value": self.get_root_value(request),
+                "context_value": self.get_context(request),
+                "variable_values": variables,
+                "operation_name": operation_name,
+                "middleware": self.get_middleware(request),
+            }
+            if self.execution_context_class:
+                execute_options["execution_context_class"] = self.execution_context_class
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(self.schema.graphql_schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            return execute(self.schema.graphql_schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
@@ -0,0 +1,167 @@
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from . import versions
+from .models import BookDetails
+
+logger = logging.getLogger('library.images')
+
+DEFAULT_IMAGES = {
+    'SYNC': False,      # przetwarzanie od razu w bieżącym wątku (testy, skrypty)
+    'WORKERS': 2,       # wątki przetwarzające okładki w tle
+    'QUALITY': 80,
+}
+
+# Warianty okładki: nazwa -> maksymalny (szerokość, wysokość); proporcje są zachowane
+VARIANTS = {'medium': (480, 720), 'thumb': (160, 240)}
+VARIANT_DIR = 'covers/variants'
+
+# Formaty wyjściowe: nazwa -> (format Pillow, rozszerzenie). AVIF tylko gdy Pillow go obsługuje.
+FORMATS = {'avif': ('AVIF', 'avif'), 'webp': ('WEBP', 'webp'), 'jpeg': ('JPEG', 'jpg')}
+Image.init()
+OUTPUT_FORMATS = {name: spec for name, spec in FORMATS.items() if spec[0] in Image.SAVE}
+
+
+def get_images_settings():
+    return {**DEFAULT_IMAGES, **getattr(settings, 'LIBRARY_IMAGES', {})}
+
+
+# Okładka jako obraz RGB. Dla JPEG dekodowanie od razu w zmniejszonej skali (draft),
+# wystarczającej dla największego wariantu - nie rozpakowujemy pełnych megapikseli.
+def load_cover(file):
+    image = Image.open(file)
+    largest = max(max(size) for size in VARIANTS.values())
+    image.draft('RGB', (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        image = image.convert('RGBA')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    return image
+
+
+def encode(image, pil_format, quality):
+    buffer = io.BytesIO()
+    image.save(buffer, pil_format, quality=quality, **({'optimize': True} if pil_format == 'JPEG' else {}))
+    return buffer.getvalue()
+
+
+# {'source': nazwa okładki, '<wariant>': {'width', 'height', '<format>': ścieżka w storage}}.
+# Warianty liczone od największego - każdy mniejszy powstaje z poprzedniego.
+def render_variants(details):
+    source = details.cover_image.name
+    stem = PurePosixPath(source).stem
+    quality = get_images_settings()['QUALITY']
+    with details.cover_image.open('rb') as f:
+        image = load_cover(f)
+
+    variants = {'source': source}
+    for name, size in VARIANTS.items():
+        image = image.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        variant = {'width': image.width, 'height': image.height}
+        for format_name, (pil_format, extension) in OUTPUT_FORMATS.items():
+            data = encode(image, pil_format, quality)
+            # hash treści w nazwie - plik o tej nazwie ma zawsze tę samą zawartość
+            path = f'{VARIANT_DIR}/{details.pk}/{stem}-{name}-{hashlib.sha256(data).hexdigest()[:12]}.{extension}'
+            if not default_storage.exists(path):
+                path = default_storage.save(path, ContentFile(data))
+            variant[format_name] = path
+        variants[name] = variant
+    return variants
+
+
+def variant_paths(variants):
+    return [
+        path
+        for name in VARIANTS
+        for format_name, path in variants.get(name, {}).items()
+        if format_name in FORMATS
+    ]
+
+
+def delete_variants(variants):
+    for path in variant_paths(variants):
+        default_storage.delete(path)
+
+
+# Generuje warianty okładki i zapisuje je w BookDetails.cover_variants. Zapis tylko wtedy,
+# gdy okładka nie zmieniła się w międzyczasie; zwraca aktualne warianty.
+def process_cover(details_id, force=False):
+    details = BookDetails.objects.filter(pk=details_id).first()
+    if details is None:
+        return {}
+    source = details.cover_image.name if details.cover_image else ''
+    if not force and details.cover_variants.get('source', '') == source:
+        return details.cover_variants
+
+    variants = render_variants(details) if source else {}
+    queryset = BookDetails.objects.filter(pk=details_id)
+    if source:
+        queryset = queryset.filter(cover_image=source)
+    updated = queryset.update(cover_variants=variants)
+    if not updated:
+        delete_variants(variants)
+        return {}
+    old_paths = set(variant_paths(details.cover_variants)) - set(variant_paths(variants))
+    for path in old_paths:
+        default_storage.delete(path)
+    versions.models_changed(BookDetails)
+    return variants
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(get_images_settings()['WORKERS'], thread_name_prefix='covers')
+        return _executor
+
+
+def process_in_background(details_id):
+    try:
+        process_cover(details_id)
+    except Exception:
+        logger.exception("Nie udało się przetworzyć okładki (BookDetails %s).", details_id)
+    finally:
+        connection.close()  # połączenie wątku roboczego
+
+
+# Po zmianie okładki: przetwarzanie po zatwierdzeniu transakcji, w puli wątków
+# (poza ścieżką żądania); przy SYNC - od razu
+def cover_changed(details):
+    if get_images_settings()['SYNC']:
+        details.cover_variants = process_cover(details.pk)
+    else:
+        transaction.on_commit(lambda: get_executor().submit(process_in_background, details.pk))
+
+
+# Adresy wariantów dla API: {'thumb': {'width', 'height', 'webp': url, 'jpeg': url}, ...}
+def variant_urls(variants, request=None):
+    result = {}
+    for name in VARIANTS:
+        variant = variants.get(name)
+        if not variant:
+            continue
+        result[name] = {}
+        for key, value in variant.items():
+            if key in FORMATS:
+                url = default_storage.url(value)
+                value = request.build_absolute_uri(url) if request is not None else url
+            result[name][key] = value
+    return result
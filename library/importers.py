@@ -0,0 +1,303 @@
+import csv
+import time
+from abc import ABC, abstractmethod
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from . import autocomplete, counters, search, versions
+from .bulk import WRITE_BATCH_SIZE, prepare_borrow, set_authors
+from .models import Author, Book, BookDetails, Borrow, Category, ImportCheckpoint, Patron, Publisher
+from .signals import bulk_changes
+
+DEFAULT_CHUNK_SIZE = 1000
+MAX_REPORTED_ERRORS = 100
+
+
+class ImportFileError(Exception):
+    pass
+
+
+# Błąd pojedynczego wiersza - wiersz jest pomijany, import trwa dalej
+class RowError(Exception):
+    pass
+
+
+# Wiersze pliku CSV czytane strumieniowo (plik nie jest wczytywany do pamięci w całości)
+def read_csv(lines, columns):
+    reader = csv.DictReader(lines)
+    missing = [column for column in columns if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ImportFileError(f"Brak kolumn w pliku: {', '.join(missing)}.")
+    return reader
+
+
+def model_errors(error):
+    if hasattr(error, 'message_dict'):
+        return '; '.join(f'{field}: {" ".join(messages)}' for field, messages in error.message_dict.items())
+    return ' '.join(error.messages)
+
+
+# Postęp importu zapisywany w bazie w tej samej transakcji co paczka wierszy, więc awaria
+# w dowolnym momencie (także tuż po zatwierdzeniu paczki) nie powoduje ponownego zapisu
+# wierszy. Import wznawia się od pierwszego niezapisanego wiersza; po udanym imporcie
+# punkt kontrolny jest usuwany.
+class Checkpoint:
+    def __init__(self, source):
+        self.source = source
+
+    def load(self):
+        return ImportCheckpoint.objects.filter(source=self.source).values_list('rows', flat=True).first() or 0
+
+    def save(self, rows):
+        ImportCheckpoint.objects.update_or_create(source=self.source, defaults={'rows': rows})
+
+    def clear(self):
+        ImportCheckpoint.objects.filter(source=self.source).delete()
+
+
+class ImportReport:
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.resumed_from = 0
+        self.rows = 0
+        self.created = 0
+        self.skipped = 0
+        self.error_count = 0
+        self.errors = []    # pierwsze MAX_REPORTED_ERRORS błędów: (numer wiersza, komunikat)
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def summary(self):
+        prefix = "[próba, bez zapisu] " if self.dry_run else ""
+        resumed = f" (wznowiono od wiersza {self.resumed_from + 1})" if self.resumed_from else ""
+        return (
+            f"{prefix}Wiersze: {self.rows}{resumed}, zapisane: {self.created}, pominięte: {self.skipped}, "
+            f"błędy: {self.error_count}. Czas: {self.elapsed:.2f} s ({self.rows_per_second:.0f} wierszy/s)."
+        )
+
+
+# Import w paczkach po `chunk_size` wierszy: klucze obce całej paczki są rozwiązywane kilkoma
+# zapytaniami (resolve), wiersze zamieniane na obiekty (build), a zapis to bulk_create
+# w jednej transakcji na paczkę (write) razem z punktem kontrolnym. Przy dry_run zapis jest pomijany.
+class ChunkedImporter(ABC):
+    columns = ()
+    required_columns = ()
+
+    def __init__(self, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, checkpoint=None):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.checkpoint = checkpoint
+
+    def run(self, lines):
+        report = ImportReport(self.dry_run)
+        rows = enumerate(read_csv(lines, self.required_columns), start=1)
+        if self.checkpoint:
+            report.resumed_from = self.checkpoint.load()
+            rows = islice(rows, report.resumed_from, None)
+
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            self.import_chunk(chunk, report)
+
+        if self.checkpoint and not self.dry_run:
+            self.checkpoint.clear()
+        report.finish()
+        return report
+
+    def import_chunk(self, chunk, report):
+        lookups = self.resolve([row for _, row in chunk])
+        items = []
+        for line, row in chunk:
+            try:
+                item = self.build(row, lookups)
+            except RowError as error:
+                report.add_error(line, str(error))
+                continue
+            if item is None:
+                report.skipped += 1
+            else:
+                items.append(item)
+
+        if not self.dry_run and (items or self.checkpoint):
+            with transaction.atomic(), bulk_changes():
+                if items:
+                    self.write(items)
+                if self.checkpoint:
+                    self.checkpoint.save(chunk[-1][0])
+        report.rows += len(chunk)
+        report.created += len(items)
+
+    # Klucze obce całej paczki: słowniki przekazywane do build()
+    @abstractmethod
+    def resolve(self, rows):
+        pass
+
+    # Obiekt do zapisu, None - wiersz pominięty, RowError - błędny wiersz
+    @abstractmethod
+    def build(self, row, lookups):
+        pass
+
+    @abstractmethod
+    def write(self, items):
+        pass
+
+
+def value(row, column):
+    return (row.get(column) or '').strip()
+
+
+def required(row, column):
+    result = value(row, column)
+    if not result:
+        raise RowError(f"Brak wartości w kolumnie '{column}'.")
+    return result
+
+
+# Nazwa -> id (przy powtarzających się nazwach obiekt o najniższym id)
+def ids_by_name(model, names):
+    return dict(model.objects.filter(name__in=names).order_by('-id').values_list('name', 'id'))
+
+
+# Tworzy wydawców/kategorie, których nazwy nie zostały znalezione w resolve(), i uzupełnia
+# nimi klucze obce książek
+def create_missing(model, field, items):
+    attname = f'{field}_id'
+    pending = [item for item in items if item[field] and getattr(item['book'], attname) is None]
+    created = model.objects.bulk_create(
+        [model(name=name) for name in sorted({item[field] for item in pending})],
+        batch_size=WRITE_BATCH_SIZE,
+    )
+    ids = {obj.name: obj.pk for obj in created}
+    for item in pending:
+        setattr(item['book'], attname, ids[item[field]])
+
+
+# Książki: wydawca i kategoria po nazwie (brakujące są tworzone), autorzy po e-mailu
+# (rozdzielani ";"), szczegóły z ISBN. Książki, których ISBN już istnieje, są pomijane,
+# więc ponowny import tego samego pliku nie tworzy duplikatów.
+class BookImporter(ChunkedImporter):
+    columns = ('title', 'publication_year', 'publisher', 'category', 'authors', 'isbn', 'pages')
+    required_columns = ('title', 'publication_year', 'publisher', 'isbn')
+
+    def resolve(self, rows):
+        emails = {email.strip() for row in rows for email in value(row, 'authors').split(';') if email.strip()}
+        return {
+            'publishers': ids_by_name(Publisher, {value(row, 'publisher') for row in rows}),
+            'categories': ids_by_name(Category, {value(row, 'category') for row in rows}),
+            'authors': dict(Author.objects.filter(email__in=emails).values_list('email', 'id')),
+            'isbns': set(BookDetails.objects.filter(isbn__in={value(row, 'isbn') for row in rows})
+                         .values_list('isbn', flat=True)),
+        }
+
+    def build(self, row, lookups):
+        isbn = required(row, 'isbn')
+        if isbn in lookups['isbns']:
+            return None
+        publisher = required(row, 'publisher')
+        category = value(row, 'category')
+
+        emails = [email.strip() for email in value(row, 'authors').split(';') if email.strip()]
+        missing = [email for email in emails if email not in lookups['authors']]
+        if missing:
+            raise RowError(f"Nie znaleziono autorów: {', '.join(missing)}.")
+
+        book = Book(
+            title=required(row, 'title'),
+            publication_year=required(row, 'publication_year'),
+            publisher_id=lookups['publishers'].get(publisher),
+            category_id=lookups['categories'].get(category),
+        )
+        details = BookDetails(isbn=isbn, pages=value(row, 'pages') or None)
+        try:
+            book.clean_fields(exclude=['publisher', 'category'])
+            details.clean_fields(exclude=['book', 'cover_image'])
+        except ValidationError as error:
+            raise RowError(model_errors(error))
+
+        lookups['isbns'].add(isbn)  # kolejne wiersze z tym samym ISBN w paczce są pomijane
+        return {
+            'book': book,
+            'details': details,
+            'publisher': publisher,
+            'category': category,
+            'authors': [lookups['authors'][email] for email in emails],
+        }
+
+    def write(self, items):
+        create_missing(Publisher, 'publisher', items)
+        create_missing(Category, 'category', items)
+        books = [item['book'] for item in items]
+        Book.objects.bulk_create(books, batch_size=WRITE_BATCH_SIZE)
+
+        for item in items:
+            item['details'].book = item['book']
+        BookDetails.objects.bulk_create([item['details'] for item in items], batch_size=WRITE_BATCH_SIZE)
+        set_authors([(item['book'], item['authors']) for item in items])
+        search.index('book', [book.pk for book in books])
+        autocomplete.objects_changed('book', [book.pk for book in books])
+        versions.models_changed(Publisher, Category, Book, BookDetails, Author)
+
+
+# Wypożyczenia: czytelnik po numerze karty, książka po ISBN (BookDetails).
+# Daty w formacie RRRR-MM-DD; domyślne daty i walidacja jak w Borrow.save()/clean().
+class BorrowImporter(ChunkedImporter):
+    columns = ('library_card_number', 'isbn', 'borrow_date', 'due_date', 'return_date', 'status')
+    required_columns = ('library_card_number', 'isbn')
+
+    def resolve(self, rows):
+        cards = {value(row, 'library_card_number') for row in rows}
+        isbns = {value(row, 'isbn') for row in rows}
+        return {
+            'patrons': dict(Patron.objects.filter(library_card_number__in=cards).values_list('library_card_number', 'id')),
+            'books': dict(BookDetails.objects.filter(isbn__in=isbns).values_list('isbn', 'book_id')),
+        }
+
+    def build(self, row, lookups):
+        card = required(row, 'library_card_number')
+        isbn = required(row, 'isbn')
+        if card not in lookups['patrons']:
+            raise RowError(f"Nie znaleziono czytelnika o numerze karty {card}.")
+        if isbn not in lookups['books']:
+            raise RowError(f"Nie znaleziono książki o ISBN {isbn}.")
+
+        fields = {name: value(row, name) for name in ('borrow_date', 'due_date', 'return_date', 'status')}
+        borrow = Borrow(
+            patron_id=lookups['patrons'][card],
+            book_id=lookups['books'][isbn],
+            **{name: field_value for name, field_value in fields.items() if field_value},
+        )
+        try:
+            borrow.clean_fields(exclude=['patron', 'book'])
+        except ValidationError as error:
+            raise RowError(model_errors(error))
+        errors = prepare_borrow(borrow)
+        if errors:
+            raise RowError(' '.join(errors['non_field_errors']))
+        return borrow
+
+    def write(self, items):
+        Borrow.objects.bulk_create(items, batch_size=WRITE_BATCH_SIZE)
+        counters.apply_changes((None, borrow.counter_state()) for borrow in items)
+        versions.models_changed(Borrow)
+
+
+IMPORTERS = {
+    'books': BookImporter,
+    'borrows': BorrowImporter,
+}
@@ -0,0 +1,96 @@
+from django.db.models import prefetch_related_objects
+from graphene_django.filter import DjangoFilterConnectionField
+
+# argumenty stronicowania połączeń Relay - nie wpływają na to, które obiekty pobieramy
+CONNECTION_ARGS = {'first', 'last', 'before', 'after', 'offset'}
+
+
+# Rejestruje instancje zwrócone razem na jednym poziomie zapytania GraphQL jako "paczkę".
+# Relacja odczytywana dla jednej instancji z paczki jest ładowana od razu dla całej paczki.
+def register_batch(instances):
+    batch = []
+    for instance in instances:
+        if not hasattr(instance, '_graphql_batch'):
+            instance._graphql_batch = batch
+            batch.append(instance)
+    return batch
+
+
+# DataLoader dla jednej relacji (model + pole FK/M2M/odwrotne FK), tworzony raz na żądanie
+class RelationLoader:
+    def __init__(self, model, relation):
+        self.model = model
+        self.relation = relation
+        self.field = model._meta.get_field(relation)
+        self.many = self.field.many_to_many or self.field.one_to_many
+        self.loaded = {}    # id(paczki) -> paczka, dla której relacja jest już pobrana
+
+    def get(self, instance):
+        if self.many:
+            return list(getattr(instance, self.relation).all())
+        return getattr(instance, self.relation)
+
+    # Zwraca wartość relacji dla instancji, pobierając ją jednym zapytaniem dla całej paczki
+    def load(self, instance):
+        batch = getattr(instance, '_graphql_batch', None)
+        if batch is None:
+            batch = register_batch([instance])
+
+        if id(batch) not in self.loaded:
+            self.loaded[id(batch)] = batch
+            prefetch_related_objects(batch, self.relation)
+
+            # obiekty powiązane z całą paczką tworzą paczkę kolejnego poziomu
+            related = []
+            for item in batch:
+                value = self.get(item)
+                if self.many:
+                    related.extend(value)
+                elif value is not None:
+                    related.append(value)
+            register_batch(related)
+
+        return self.get(instance)
+
+
+# Loadery są przechowywane w kontekście żądania (HttpRequest w GraphQLView)
+def get_loader(info, model, relation):
+    context = info.context
+    loaders = getattr(context, '_relation_loaders', None)
+    if loaders is None:
+        loaders = {}
+        try:
+            context._relation_loaders = loaders
+        except AttributeError:
+            pass    # kontekst bez atrybutów (np. None w testach) - loader tylko dla tego wywołania
+    key = (model, relation)
+    if key not in loaders:
+        loaders[key] = RelationLoader(model, relation)
+    return loaders[key]
+
+
+# Resolver relacji korzystający z loadera. Przy filtrach na zagnieżdżonym połączeniu
+# zwraca zwykły queryset, który dalej filtruje DjangoFilterConnectionField.
+def batch_resolver(relation):
+    def resolver(root, info, **kwargs):
+        if any(value is not None for name, value in kwargs.items() if name not in CONNECTION_ARGS):
+            return getattr(root, relation).all()
+        return get_loader(info, type(root), relation).load(root)
+    return resolver
+
+
+# Połączenie Relay, które rejestruje zwrócone węzły jako paczkę i przyjmuje listy
+# z loadera (bez ponownego filtrowania querysetu, które zgubiłoby pobrane dane)
+class BatchedConnectionField(DjangoFilterConnectionField):
+
+    @classmethod
+    def resolve_queryset(cls, connection, iterable, info, args, filtering_args=None, filterset_class=None):
+        if isinstance(iterable, list):
+            return iterable
+        return super().resolve_queryset(connection, iterable, info, args, filtering_args, filterset_class)
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        connection = super().resolve_connection(connection, args, iterable, max_limit=max_limit)
+        register_batch([edge.node for edge in connection.edges])
+        return connection
@@ -0,0 +1,113 @@
+import json
+import os
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from library import benchmark
+from library.datagen import Config
+from library.seeding import generate
+
+SCALE = {
+    'publishers': 20,
+    'categories': 15,
+    'authors': 500,
+    'books': 2000,
+    'patrons': 1000,
+    'borrows': 20000,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark API na osobnej bazie testowej z danymi syntetycznymi: opóźnienie p50/p95, "
+        "liczba zapytań i szczytowa pamięć dla każdej trasy. Wyniki zapisuje do JSON i porównuje "
+        "z wynikami bazowymi (--baseline), kończąc się błędem przy regresji."
+    )
+
+    def add_arguments(self, parser):
+        for name, default in SCALE.items():
+            parser.add_argument(f'--{name}', type=int, default=default, help=f"Liczba rekordów (domyślnie {default})")
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--repeat', type=int, default=20, help="Liczba pomiarów na endpoint")
+        parser.add_argument('--warmup', type=int, default=2, help="Liczba żądań rozgrzewających")
+        parser.add_argument('--only', help="Tylko endpointy, których nazwa zawiera podany tekst")
+        parser.add_argument('--cold-cache', action='store_true', help="Czyści cache przed każdym żądaniem")
+        parser.add_argument('--output', default='benchmark_results.json', help="Plik wyników JSON")
+        parser.add_argument('--baseline', help="Plik JSON z wynikami bazowymi do porównania")
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help="Dopuszczalne pogorszenie względem wyników bazowych (0.2 = 20%%)")
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError("Liczba pomiarów musi być dodatnia.")
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline'], encoding='utf-8') as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as error:
+                raise CommandError(f"Nie można wczytać wyników bazowych: {error}")
+
+        config = Config(
+            **{name: options[name] for name in SCALE},
+            seed=options['seed'],
+            today=date.today(),
+            days=730,
+            zipf=0.9,
+        )
+        results = self.run_benchmark(config, options)
+        with open(options['output'], 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        self.report(results)
+        self.stdout.write(f"Wyniki zapisano w {os.path.abspath(options['output'])}.")
+
+        failed = [name for name, result in results['results'].items() if not result['ok']]
+        if failed:
+            raise CommandError(f"Endpointy zakończone błędem: {', '.join(failed)}.")
+        if baseline is not None:
+            self.check_regressions(results, baseline, options['threshold'])
+
+    # Baza testowa (jak w manage.py test) - benchmark nie dotyka danych w bazie docelowej
+    def run_benchmark(self, config, options):
+        setup_test_environment(debug=False)
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write("Generowanie danych...")
+            generate(config, workers=1)
+            endpoints = benchmark.collect_endpoints()
+            if options['only']:
+                endpoints = [endpoint for endpoint in endpoints if options['only'] in endpoint.name]
+            self.stdout.write(f"Pomiar {len(endpoints)} endpointów...")
+            return benchmark.run(
+                endpoints,
+                repeat=options['repeat'],
+                warmup=options['warmup'],
+                cold_cache=options['cold_cache'],
+                meta={'scale': {name: getattr(config, name) for name in SCALE}, 'seed': config.seed},
+            )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def report(self, results):
+        self.stdout.write(f"{'endpoint':40} {'status':>6} {'p50 ms':>9} {'p95 ms':>9} {'zapytania':>9} {'pamięć KB':>10}")
+        for name, result in results['results'].items():
+            line = (
+                f"{name:40} {result['status']:>6} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} "
+                f"{result['queries']:>9} {result['peak_kb']:>10.1f}"
+            )
+            self.stdout.write(line if result['ok'] else self.style.ERROR(line))
+
+    def check_regressions(self, results, baseline, threshold):
+        regressions = benchmark.compare(results, baseline, threshold=threshold)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"Brak regresji względem wyników bazowych (próg {threshold:.0%})."))
+            return
+        for regression in regressions:
+            self.stderr.write(
+                f"{regression.name}: {regression.metric} {regression.baseline} -> {regression.current}")
+        raise CommandError(f"Wykryto regresje wydajności: {len(regressions)}.")
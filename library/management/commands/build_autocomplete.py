@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from library import autocomplete
+
+
+class Command(BaseCommand):
+    help = "Buduje indeks podpowiedzi z bazy i zapisuje jego snapshot (start serwera bez przebudowy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', help="Ścieżka pliku snapshotu (domyślnie z LIBRARY_AUTOCOMPLETE)")
+
+    def handle(self, *args, **options):
+        index = autocomplete.build_index(autocomplete.get_autocomplete_settings()['MEMORY_BUDGET'])
+        path = options['snapshot'] or autocomplete.snapshot_path()
+        autocomplete.save_snapshot(index, path)
+        stats = index.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indeks podpowiedzi zapisany w {path}: {stats['entries']} wpisów, {stats['tokens']} słów, "
+            f"~{stats['size'] / 1024 / 1024:.1f} MB."
+        ))
+        if stats['truncated']:
+            self.stdout.write(self.style.WARNING(
+                "Część wpisów pominięto - indeks przekroczył MEMORY_BUDGET."
+            ))
@@ -0,0 +1,32 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+
+from library import recommendations
+
+
+class Command(BaseCommand):
+    help = "Buduje indeks podobnych książek (współwypożyczenia) i zapisuje go do pliku"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--snapshot', help="Ścieżka pliku indeksu (domyślnie z LIBRARY_RECOMMENDATIONS)")
+        parser.add_argument('--top-k', type=int, help="Liczba sąsiadów każdej książki")
+        parser.add_argument('--min-support', type=int, help="Minimalna liczba wspólnych czytelników")
+
+    def handle(self, *args, **options):
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = recommendations.build_index(options['top_k'], options['min_support'])
+        duration = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        path = options['snapshot'] or recommendations.snapshot_path()
+        recommendations.save_index(index, path)
+        stats = index.stats()
+        self.stdout.write(self.style.SUCCESS(
+            f"Indeks podobnych książek zapisany w {path}: {stats['books']} książek, {stats['neighbors']} sąsiadów, "
+            f"{stats['bytes'] / 1024 / 1024:.1f} MB. Budowa: {duration:.2f} s, "
+            f"szczyt pamięci {peak / 1024 / 1024:.1f} MB."
+        ))
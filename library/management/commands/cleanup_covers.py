@@ -0,0 +1,74 @@
+import os
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.images import variant_paths
+from library.media import COVERS_DIR, cover_storage
+from library.models import BookDetails
+
+
+# Liczba odwołań do plików okładek: BookDetails.cover_image i warianty z cover_variants
+def reference_counts():
+    references = Counter()
+    rows = BookDetails.objects.values_list('cover_image', 'cover_variants').iterator(chunk_size=2000)
+    for cover_image, variants in rows:
+        if cover_image:
+            references[cover_image] += 1
+        references.update(variant_paths(variants))
+    return references
+
+
+class Command(BaseCommand):
+    help = (
+        "Usuwa pliki okładek (także wariantów), do których nie odwołuje się żaden BookDetails. "
+        "Pomija pliki nowsze niż --min-age, żeby nie usunąć zapisywanych właśnie okładek."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=3600, help="Minimalny wiek pliku w sekundach")
+        parser.add_argument('--dry-run', action='store_true', help="Tylko wypisuje pliki do usunięcia")
+
+    def handle(self, *args, **options):
+        if options['min_age'] < 0:
+            raise CommandError("Minimalny wiek pliku nie może być ujemny.")
+        references = reference_counts()
+        root = cover_storage.path(COVERS_DIR)
+        cutoff = time.time() - options['min_age']
+
+        candidates = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, cover_storage.location).replace(os.sep, '/')
+                if not references[name] and os.stat(path).st_mtime <= cutoff:
+                    candidates.append((name, path))
+
+        # odwołania sprawdzane ponownie tuż przed usuwaniem - okładka mogła zostać przypisana
+        # w trakcie przeglądania katalogu (także plik już istniejący, użyty ponownie)
+        references = reference_counts() if candidates and not options['dry_run'] else references
+        deleted = freed = 0
+        for name, path in candidates:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if references[name] or stat.st_mtime > cutoff:
+                continue
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                os.remove(path)
+            deleted += 1
+            freed += stat.st_size
+
+        if not options['dry_run']:
+            for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+                if dirpath != root and not os.listdir(dirpath):
+                    os.rmdir(dirpath)
+
+        prefix = "[próba, bez usuwania] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Nieużywane pliki okładek: {deleted} ({freed / 1024 / 1024:.1f} MB)."
+        ))
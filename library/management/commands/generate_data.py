@@ -0,0 +1,74 @@
+import os
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.datagen import Config
+from library.seeding import generate
+
+DEFAULTS = {
+    'publishers': 50,
+    'categories': 30,
+    'authors': 5000,
+    'books': 20000,
+    'patrons': 5000,
+    'borrows': 100000,
+}
+MAX_PATRONS = 999999    # numer karty czytelnika ma 6 znaków
+
+
+class Command(BaseCommand):
+    help = (
+        "Usuwa dane biblioteki i generuje dane syntetyczne w zadanej skali "
+        "(np. --borrows 1000000 --books 200000 --patrons 50000). "
+        "Te same parametry i ziarno dają te same dane."
+    )
+
+    def add_arguments(self, parser):
+        for name, default in DEFAULTS.items():
+            parser.add_argument(f'--{name}', type=int, default=default, help=f"Liczba rekordów (domyślnie {default})")
+        parser.add_argument('--seed', type=int, default=42, help="Ziarno generatora losowego")
+        parser.add_argument('--today', type=date.fromisoformat, default=date.today(),
+                            help="Dzień odniesienia dla dat wypożyczeń, RRRR-MM-DD (domyślnie dzisiaj)")
+        parser.add_argument('--days', type=int, default=730, help="Długość historii wypożyczeń w dniach")
+        parser.add_argument('--zipf', type=float, default=0.9, help="Wykładnik rozkładu Zipfa popularności książek")
+        parser.add_argument('--chunk-size', type=int, default=10000, help="Liczba wierszy w paczce zapisu")
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help="Liczba procesów generujących dane")
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help="Nie pyta o potwierdzenie usunięcia danych")
+
+    def handle(self, *args, **options):
+        config = Config(
+            **{name: options[name] for name in DEFAULTS},
+            seed=options['seed'],
+            today=options['today'],
+            days=options['days'],
+            zipf=options['zipf'],
+        )
+        self.validate(config, options)
+
+        if options['interactive']:
+            answer = input("Wszystkie dane biblioteki zostaną usunięte. Wpisz 'tak', aby kontynuować: ")
+            if answer != 'tak':
+                raise CommandError("Przerwano.")
+
+        started = time.monotonic()
+        generate(config, chunk_size=options['chunk_size'], workers=options['workers'], progress=self.progress)
+        self.stdout.write(self.style.SUCCESS(f"Dane zostały wygenerowane w {time.monotonic() - started:.1f} s."))
+
+    def validate(self, config, options):
+        if min(config.publishers, config.authors, config.books, config.patrons) < 1:
+            raise CommandError("Liczba wydawców, autorów, książek i czytelników musi być dodatnia.")
+        if min(config.categories, config.borrows) < 0:
+            raise CommandError("Liczby rekordów nie mogą być ujemne.")
+        if config.patrons > MAX_PATRONS:
+            raise CommandError(f"Maksymalna liczba czytelników to {MAX_PATRONS}.")
+        if config.days < 120:
+            raise CommandError("Historia wypożyczeń musi obejmować co najmniej 120 dni.")
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError("Rozmiar paczki i liczba procesów muszą być dodatnie.")
+
+    def progress(self, table, done, total):
+        self.stdout.write(f"{table}: {done}/{total}")
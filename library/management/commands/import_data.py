@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.importers import DEFAULT_CHUNK_SIZE, IMPORTERS, Checkpoint, ImportFileError
+
+
+class Command(BaseCommand):
+    help = (
+        "Szybki import książek lub wypożyczeń z pliku CSV - plik czytany strumieniowo, "
+        "zapis paczkami (bulk_create), wznawianie od punktu kontrolnego po awarii"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=sorted(IMPORTERS), help="Rodzaj danych")
+        parser.add_argument('path', help="Ścieżka do pliku CSV (UTF-8)")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="Liczba wierszy w paczce")
+        parser.add_argument('--dry-run', action='store_true', help="Walidacja i pomiar szybkości bez zapisu do bazy")
+        parser.add_argument('--checkpoint', help="Klucz punktu kontrolnego w bazie (domyślnie <rodzaj>:<ścieżka pliku>)")
+        parser.add_argument('--restart', action='store_true', help="Zaczyna od początku, ignorując punkt kontrolny")
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1:
+            raise CommandError("Rozmiar paczki musi być dodatni.")
+        path = os.path.abspath(options['path'])
+        checkpoint = Checkpoint(options['checkpoint'] or f"{options['kind']}:{path}")
+        if options['restart']:
+            checkpoint.clear()
+
+        importer = IMPORTERS[options['kind']](
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            checkpoint=checkpoint,
+        )
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as f:
+                report = importer.run(f)
+        except (OSError, ImportFileError) as error:
+            raise CommandError(str(error))
+
+        for line, message in report.errors:
+            self.stderr.write(f"Wiersz {line}: {message}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(f"... i {report.error_count - len(report.errors)} kolejnych błędów.")
+        self.stdout.write(self.style.SUCCESS(report.summary()))
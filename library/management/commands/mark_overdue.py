@@ -0,0 +1,44 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.overdue import DEFAULT_BATCH_SIZE, mark_overdue
+
+
+class Command(BaseCommand):
+    help = (
+        "Oznacza aktywne wypożyczenia po terminie zwrotu jako przeterminowane. "
+        "Z --every działa w pętli i powtarza przebieg co zadaną liczbę sekund."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Liczba wypożyczeń zmienianych w jednej transakcji")
+        parser.add_argument('--today', type=date.fromisoformat, default=None,
+                            help="Dzień odniesienia RRRR-MM-DD (domyślnie dzisiaj w chwili przebiegu)")
+        parser.add_argument('--every', type=float, default=0,
+                            help="Odstęp między przebiegami w sekundach (0 - jeden przebieg)")
+        parser.add_argument('--max-runs', type=int, default=None, help="Maksymalna liczba przebiegów przy --every")
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("Rozmiar paczki musi być dodatni.")
+        if options['every'] < 0:
+            raise CommandError("Odstęp między przebiegami nie może być ujemny.")
+
+        runs = 0
+        try:
+            while True:
+                started = time.monotonic()
+                run = mark_overdue(today=options['today'], batch_size=options['batch_size'])
+                runs += 1
+                self.stdout.write(self.style.SUCCESS(
+                    f"Oznaczono jako przeterminowane: {run.rows_changed} "
+                    f"(paczki: {run.batches}, czas: {run.duration:.2f} s)."
+                ))
+                if not options['every'] or (options['max_runs'] and runs >= options['max_runs']):
+                    break
+                time.sleep(max(0.0, options['every'] - (time.monotonic() - started)))
+        except KeyboardInterrupt:
+            self.stdout.write("Zatrzymano.")
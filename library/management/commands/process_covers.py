@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from library.images import process_cover
+from library.models import BookDetails
+
+
+class Command(BaseCommand):
+    help = "Generuje brakujące lub nieaktualne warianty okładek (miniatury, WebP/AVIF)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Generuje warianty wszystkich okładek od nowa")
+
+    def handle(self, *args, **options):
+        processed = 0
+        details = BookDetails.objects.exclude(cover_image='').exclude(cover_image__isnull=True)
+        for pk, cover_image, variants in details.values_list('pk', 'cover_image', 'cover_variants').iterator():
+            if options['force'] or variants.get('source') != cover_image:
+                process_cover(pk, force=options['force'])
+                processed += 1
+        self.stdout.write(self.style.SUCCESS(f"Przetworzone okładki: {processed}."))
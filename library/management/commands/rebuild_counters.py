@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from library.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = "Przelicza od zera liczniki wypożyczeń książek, czytelników i wydawców"
+
+    def handle(self, *args, **options):
+        rebuild_counters()
+        self.stdout.write(self.style.SUCCESS("Liczniki wypożyczeń zostały przeliczone."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from library import rollups
+
+
+class Command(BaseCommand):
+    help = "Przelicza od zera dzienne i miesięczne agregaty wypożyczeń (szeregi czasowe)"
+
+    def handle(self, *args, **options):
+        count = rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Agregaty wypożyczeń zostały przeliczone ({count} wierszy)."))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from library import search
+
+
+class Command(BaseCommand):
+    help = "Buduje od zera indeks wyszukiwania pełnotekstowego (książki, autorzy, czytelnicy)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=search.REBUILD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        count = search.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Indeks wyszukiwania został przebudowany ({count} dokumentów, backend: {search.backend() or 'brak indeksu'})."
+        ))
@@ -0,0 +1,212 @@
+import hashlib
+import mimetypes
+import os
+import re
+from functools import lru_cache
+from pathlib import PurePosixPath
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.utils import validate_file_name
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.deconstruct import deconstructible
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.views.decorators.http import require_http_methods
+
+DEFAULT_MEDIA = {
+    'SENDFILE': None,                       # None, 'x-accel-redirect' (nginx) albo 'x-sendfile' (Apache)
+    'ACCEL_PREFIX': '/protected-media/',    # lokalizacja "internal" nginx wskazująca na MEDIA_ROOT
+    'MAX_AGE': 365 * 24 * 60 * 60,          # dla plików z hashem treści w nazwie
+}
+
+HASH_LENGTH = 32
+COVERS_DIR = 'covers'
+# nazwa pliku kończąca się hashem treści (np. covers/<hash>.jpg, <...>-thumb-<hash>.webp)
+HASHED_NAME = re.compile(r'(?:^|-)([0-9a-f]{12,64})$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def get_media_settings():
+    return {**DEFAULT_MEDIA, **getattr(settings, 'LIBRARY_MEDIA', {})}
+
+
+def content_hash(file):
+    digest = hashlib.sha256()
+    for chunk in file.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hashed_name(digest, filename):
+    return f'{COVERS_DIR}/{digest[:HASH_LENGTH]}{PurePosixPath(filename).suffix.lower()}'
+
+
+def name_hash(path):
+    match = HASHED_NAME.search(PurePosixPath(path).stem)
+    return match.group(1) if match else None
+
+
+# upload_to okładek: nazwa z hashu treści - adres pliku nigdy nie zmienia zawartości,
+# więc może być cache'owany bez końca (Cache-Control: immutable)
+def cover_upload_to(instance, filename):
+    return hashed_name(content_hash(instance.cover_image.file), filename)
+
+
+# Storage adresowany treścią: plik o nazwie z hashem, który już istnieje, ma tę samą
+# zawartość - zapis jest pomijany i wszystkie obiekty wskazują jeden plik.
+# Nieużywane pliki usuwa komenda cleanup_covers; ponownie użyty plik dostaje bieżący czas
+# modyfikacji, żeby --min-age chroniło go tak jak nowo zapisany.
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def save(self, name, content, max_length=None):
+        if name is not None and name_hash(name) and self.exists(name):
+            validate_file_name(name, allow_relative_path=True)
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:
+                return super().save(name, content, max_length)
+            return name
+        return super().save(name, content, max_length)
+
+
+cover_storage = ContentAddressedStorage()
+
+
+# Plik wskazany względem MEDIA_ROOT (np. uploads/okladka.jpg); None - poza MEDIA_ROOT lub brak pliku
+def media_file(relative_path):
+    try:
+        path = safe_join(settings.MEDIA_ROOT, relative_path)
+    except SuspiciousFileOperation:
+        return None
+    return path if os.path.isfile(path) else None
+
+
+# Okładka z pliku leżącego już w MEDIA_ROOT: istniejący plik o tym samym hashu jest używany
+# ponownie, nowy powstaje jako kopia strumieniowa. Bez twardego linku - nadpisanie pliku
+# w uploads/ nie może zmienić okładki serwowanej jako immutable.
+# Zwraca nazwę pliku okładki do przypisania do BookDetails.cover_image.
+def store_cover(path):
+    with open(path, 'rb') as f:
+        file = File(f)
+        name = hashed_name(content_hash(file), path)
+        file.seek(0)
+        return cover_storage.save(name, file)
+
+
+# Hash treści pliku bez hashu w nazwie - liczony raz dla danej wersji pliku (mtime, rozmiar)
+@lru_cache(maxsize=4096)
+def file_digest(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+# Fragment pliku [start, start + length) - z fileno(), więc serwer WSGI nadal może użyć
+# sendfile (gunicorn wysyła od bieżącej pozycji do Content-Length)
+class FileRange:
+    def __init__(self, file, start, length):
+        self.file = file
+        self.file.seek(start)
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+# Zakres z nagłówka Range: (start, koniec włącznie), None - cały plik,
+# False - zakres niemożliwy do spełnienia. Obsługiwany jest jeden zakres.
+def parse_range(header, size):
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        length = int(end)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+# Pliki z MEDIA_ROOT (okładki): ETag z hashu treści, długi cache dla nazw z hashem,
+# zapytania warunkowe (304) i Range (206). Przy SENDFILE wysyłkę przejmuje serwer
+# proxy (X-Accel-Redirect / X-Sendfile), a Django zwraca tylko nagłówki.
+@require_http_methods(['GET', 'HEAD'])
+def media_view(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404
+    try:
+        stat = os.stat(full_path)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(full_path):
+        raise Http404
+
+    config = get_media_settings()
+    hashed = name_hash(path)
+    etag = '"%s"' % (hashed or file_digest(full_path, stat.st_mtime_ns, stat.st_size))
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is None:
+        response = file_response(request, full_path, path, stat.st_size, etag, config)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = (
+        f"public, max-age={config['MAX_AGE']}, immutable" if hashed else 'public, no-cache'
+    )
+    return response
+
+
+def file_response(request, full_path, path, size, etag, config):
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    if config['SENDFILE'] == 'x-accel-redirect':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = config['ACCEL_PREFIX'] + quote(path)
+        return response
+    if config['SENDFILE'] == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return response
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if 'Range' in request.headers and (if_range is None or if_range == etag):
+        byte_range = parse_range(request.headers['Range'], size)
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+    elif byte_range is None:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        response = FileResponse(FileRange(open(full_path, 'rb'), start, length), content_type=content_type, status=206)
+        response['Content-Length'] = length
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Accept-Ranges'] = 'bytes'
+    return response
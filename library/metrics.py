@@ -0,0 +1,216 @@
+import bisect
+import glob
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+from . import cache
+from .models import Borrow
+
+DEFAULT_METRICS = {
+    'ENABLED': False,           # MetricsMiddleware - pomiar żądań i zapytań SQL
+    'DIRECTORY': None,          # katalog plików procesów (domyślnie <tmp>/library-metrics)
+    'FLUSH_INTERVAL': 1.0,      # jak często (s) proces zapisuje swój plik
+    'BUCKETS': (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# limit różnych nazw operacji GraphQL w etykietach (nazwy nadaje klient)
+MAX_GRAPHQL_OPERATIONS = 100
+
+HELP = {
+    'library_http_requests_total': ('counter', 'Liczba obsłużonych żądań.'),
+    'library_http_request_duration_seconds': ('histogram', 'Czas obsługi żądania w sekundach.'),
+    'library_db_queries_total': ('counter', 'Liczba zapytań SQL wykonanych przy obsłudze żądań.'),
+    'library_db_query_duration_seconds_total': ('counter', 'Łączny czas zapytań SQL w sekundach.'),
+    'library_borrows': ('gauge', 'Liczba wypożyczeń według statusu.'),
+    'library_cache_hits_total': ('counter', 'Trafienia cache odpowiedzi.'),
+    'library_cache_misses_total': ('counter', 'Chybienia cache odpowiedzi.'),
+    'library_cache_hit_ratio': ('gauge', 'Udział trafień cache odpowiedzi.'),
+}
+
+
+def get_metrics_settings():
+    return {**DEFAULT_METRICS, **getattr(settings, 'LIBRARY_METRICS', {})}
+
+
+def metrics_directory():
+    return get_metrics_settings()['DIRECTORY'] or os.path.join(tempfile.gettempdir(), 'library-metrics')
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+# Metryki bieżącego procesu. Każdy proces (np. worker gunicorna) okresowo zapisuje je do
+# własnego pliku <pid>.json, a /metrics sumuje pliki wszystkich procesów - liczniki
+# nie zależą od tego, który worker obsłużył scrape.
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)     # (nazwa, etykiety) -> wartość
+        self._histograms = {}                   # (nazwa, etykiety) -> [liczności kubełków..., suma]
+        self._graphql_operations = set()
+        self._last_flush = 0.0
+
+    def inc(self, name, labels, amount=1):
+        with self._lock:
+            self._counters[(name, label_key(labels))] += amount
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, label_key(labels))
+        with self._lock:
+            counts = self._histograms.get(key)
+            if counts is None:
+                counts = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            counts[bisect.bisect_left(buckets, value)] += 1
+            counts[-1] += value
+
+    # Etykieta trasy dla operacji GraphQL z ograniczeniem liczby różnych nazw
+    def graphql_route(self, operation):
+        with self._lock:
+            if operation not in self._graphql_operations:
+                if len(self._graphql_operations) >= MAX_GRAPHQL_OPERATIONS:
+                    return 'graphql:other'
+                self._graphql_operations.add(operation)
+        return f'graphql:{operation}'
+
+    def snapshot(self):
+        with self._lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self._counters.items()]
+            histograms = [[name, list(labels), list(counts)] for (name, labels), counts in self._histograms.items()]
+        cache_counts = cache.stats.snapshot()['by_name']
+        return {
+            'counters': counters,
+            'histograms': histograms,
+            'cache': {name: {'hits': counts['hits'], 'misses': counts['misses']} for name, counts in cache_counts.items()},
+        }
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < get_metrics_settings()['FLUSH_INTERVAL']:
+            return
+        self._last_flush = now
+        directory = metrics_directory()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._graphql_operations.clear()
+            self._last_flush = 0.0
+
+
+registry = MetricsRegistry()
+
+
+# Usuwa pliki procesów - do wywołania przy starcie serwera, zanim wystartują workery
+def clear_files():
+    for path in glob.glob(os.path.join(metrics_directory(), '*.json')):
+        os.remove(path)
+
+
+def observe_request(route, method, status, duration, queries, db_duration):
+    config = get_metrics_settings()
+    registry.inc('library_http_requests_total', {'route': route, 'method': method, 'status': str(status)})
+    registry.observe('library_http_request_duration_seconds', {'route': route}, duration, config['BUCKETS'])
+    registry.inc('library_db_queries_total', {'route': route}, queries)
+    registry.inc('library_db_query_duration_seconds_total', {'route': route}, db_duration)
+    registry.flush()
+
+
+# Suma plików wszystkich procesów (przy wyłączonym middleware - tylko bieżący proces)
+def aggregate():
+    if get_metrics_settings()['ENABLED']:
+        registry.flush(force=True)
+        snapshots = []
+        for path in glob.glob(os.path.join(metrics_directory(), '*.json')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue    # plik usunięty lub zapisywany w tej chwili
+    else:
+        snapshots = [registry.snapshot()]
+
+    counters, histograms, cache_counts = defaultdict(float), {}, defaultdict(lambda: {'hits': 0, 'misses': 0})
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, counts in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key not in histograms:
+                histograms[key] = list(counts)
+            else:
+                histograms[key] = [a + b for a, b in zip(histograms[key], counts)]
+        for name, counts in snapshot['cache'].items():
+            cache_counts[name]['hits'] += counts['hits']
+            cache_counts[name]['misses'] += counts['misses']
+    return counters, histograms, cache_counts
+
+
+# Liczby wypożyczeń według statusu - jedno zapytanie, wynik w cache do zmiany wypożyczeń
+def borrow_counts():
+    return cache.cached('metrics-borrows', [Borrow], lambda: Borrow.objects.status_counts())
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+# Format tekstowy Prometheusa (text/plain; version=0.0.4)
+def render():
+    counters, histograms, cache_counts = aggregate()
+    buckets = get_metrics_settings()['BUCKETS']
+    samples = defaultdict(list)     # nazwa metryki -> linie próbek
+
+    for (name, labels), value in sorted(counters.items()):
+        samples[name].append(f'{name}{format_labels(labels)} {format_value(value)}')
+
+    for (name, labels), counts in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip((*buckets, '+Inf'), counts):
+            cumulative += count
+            samples[name].append(f'{name}_bucket{format_labels((*labels, ("le", bound)))} {cumulative}')
+        samples[name].append(f'{name}_sum{format_labels(labels)} {format_value(counts[-1])}')
+        samples[name].append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+    counts = borrow_counts()
+    for status, _ in Borrow.STATUS_CHOICES:
+        samples['library_borrows'].append(f'library_borrows{format_labels([("status", status)])} {counts[status]}')
+
+    for name, values in sorted(cache_counts.items()):
+        labels = format_labels([('name', name)])
+        samples['library_cache_hits_total'].append(f'library_cache_hits_total{labels} {values["hits"]}')
+        samples['library_cache_misses_total'].append(f'library_cache_misses_total{labels} {values["misses"]}')
+        ratio = cache.hit_ratio(values['hits'], values['misses'])
+        if ratio is not None:
+            samples['library_cache_hit_ratio'].append(f'library_cache_hit_ratio{labels} {ratio}')
+
+    lines = []
+    for name, (kind, help_text) in HELP.items():
+        if name in samples:
+            lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', *samples[name]]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,260 @@
+import json
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import get_metrics_settings, observe_request, registry
+
+logger = logging.getLogger('library.instrumentation')
+
+DEFAULT_INSTRUMENTATION = {
+    'ENABLED': False,           # przy False Django pomija middleware (zero narzutu)
+    'SERVER_TIMING': True,      # nagłówek Server-Timing w odpowiedzi
+    'N_PLUS_ONE_THRESHOLD': 5,  # od tylu powtórzeń jednego kształtu zapytania zgłaszane jest N+1
+}
+
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+WHITESPACE = re.compile(r'\s+')
+GRAPHQL_NAME = re.compile(r'[_A-Za-z]\w*')
+GRAPHQL_OPERATION = re.compile(r'\s*(?:query|mutation|subscription)\s+([_A-Za-z]\w*)')
+ANONYMOUS_OPERATION = 'anonymous'
+
+
+def get_instrumentation_settings():
+    return {**DEFAULT_INSTRUMENTATION, **getattr(settings, 'LIBRARY_INSTRUMENTATION', {})}
+
+
+# "Kształt" zapytania: SQL bez wartości (literały i listy IN zwinięte), więc zapytania
+# różniące się tylko parametrami - typowe N+1 - mają ten sam kształt
+def query_shape(sql):
+    sql = STRING_LITERAL.sub('%s', sql)
+    sql = NUMBER_LITERAL.sub('%s', sql)
+    sql = IN_LIST.sub('(...)', sql)
+    return WHITESPACE.sub(' ', sql).strip()
+
+
+# Najbliższa na stosie ramka z kodu projektu (poza bibliotekami i tym modułem)
+def code_location():
+    root = str(settings.BASE_DIR) + os.sep
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and 'site-packages' not in filename and filename != __file__:
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno} ({frame.f_code.co_name})'
+        frame = frame.f_back
+    return None
+
+
+# Nazwa widoku: ViewSet z akcją (np. BookViewSet.list), klasa widoku albo funkcja
+def view_label(request, view_func):
+    cls = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if cls is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    action = (getattr(view_func, 'actions', None) or {}).get(request.method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+def milliseconds(seconds):
+    return round(seconds * 1000, 3)
+
+
+# Pomiary jednego żądania; obiekt jest też wrapperem wykonywania zapytań
+# (connection.execute_wrapper) - zlicza zapytania, czas bazy i kształty SQL
+class RequestMetrics:
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes = Counter()
+        self.origins = {}           # kształt -> źródło pierwszego powtórzenia
+        self.view = None
+        self.resolver = None        # aktualny resolver GraphQL (Typ.pole)
+        self.operation = None       # nazwa operacji GraphQL
+        self.view_started = None
+        self.render_started = None
+        self.view_time = 0.0
+        self.serialize_time = 0.0
+        self.total_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            shape = query_shape(sql)
+            self.shapes[shape] += 1
+            if self.shapes[shape] == 2:
+                self.origins[shape] = {'view': self.view, 'resolver': self.resolver, 'location': code_location()}
+
+    # Widok bez czasu serializacji; odpowiedzi DRF (TemplateResponse) są renderowane
+    # po wyjściu z widoku, JSON GraphQL - w widoku (LibraryGraphQLView.json_encode)
+    def finish(self):
+        finished = time.perf_counter()
+        if self.view_started is not None:
+            self.view_time = (self.render_started or finished) - self.view_started - self.serialize_time
+        if self.render_started is not None:
+            self.serialize_time += finished - self.render_started
+        self.total_time = finished - self.started
+
+    def n_plus_one(self):
+        return [
+            {'sql': shape, 'count': count, **self.origins[shape]}
+            for shape, count in self.shapes.most_common()
+            if count >= self.threshold
+        ]
+
+    def server_timing(self):
+        parts = [
+            f'db;dur={milliseconds(self.db_time)};desc="SQL: {self.queries}"',
+            f'view;dur={milliseconds(self.view_time)}',
+            f'serialize;dur={milliseconds(self.serialize_time)}',
+            f'total;dur={milliseconds(self.total_time)}',
+        ]
+        if self.operation:
+            parts.append(f'graphql;desc="{self.operation}"')
+        return ', '.join(parts)
+
+    def as_dict(self, request, response):
+        return {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': self.view,
+            'graphql_operation': self.operation,
+            'queries': self.queries,
+            'db_ms': milliseconds(self.db_time),
+            'view_ms': milliseconds(self.view_time),
+            'serialize_ms': milliseconds(self.serialize_time),
+            'total_ms': milliseconds(self.total_time),
+            'n_plus_one': self.n_plus_one(),
+        }
+
+
+def get_instrumentation(request):
+    return getattr(request, 'instrumentation', None)
+
+
+# Nazwa operacji GraphQL z operationName albo z treści zapytania (query Nazwa { ... }),
+# zapisywana w request.graphql_operation na potrzeby instrumentacji i metryk
+def record_operation(request, operation_name, query=None):
+    if not operation_name and query:
+        match = GRAPHQL_OPERATION.match(query)
+        operation_name = match.group(1) if match else None
+    if operation_name and GRAPHQL_NAME.fullmatch(operation_name):
+        request.graphql_operation = operation_name
+    elif not hasattr(request, 'graphql_operation'):
+        request.graphql_operation = ANONYMOUS_OPERATION
+
+
+# Middleware GraphQL zapamiętujące aktualnie wykonywany resolver - zapytania SQL
+# powtórzone w resolverze są przypisywane do pola, które je wywołało
+def track_resolver(next_, root, info, **kwargs):
+    metrics = get_instrumentation(info.context)
+    if metrics is None:
+        return next_(root, info, **kwargs)
+    previous = metrics.resolver
+    metrics.resolver = f'{info.parent_type.name}.{info.field_name}'
+    try:
+        return next_(root, info, **kwargs)
+    finally:
+        metrics.resolver = previous
+
+
+# Instrumentacja żądań (settings.LIBRARY_INSTRUMENTATION, domyślnie wyłączona): liczba zapytań,
+# czas bazy, widoku, serializacji i całkowity w nagłówku Server-Timing oraz w logu
+# "library.instrumentation" (jedna linia JSON na żądanie). Powtarzające się kształty zapytań
+# (N+1) są logowane jako ostrzeżenie razem z widokiem/resolverem i miejscem w kodzie.
+# Odpowiedzi strumieniowe są generowane po wyjściu z middleware - ich treść nie jest mierzona.
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        config = get_instrumentation_settings()
+        if not config['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.server_timing = config['SERVER_TIMING']
+        self.threshold = config['N_PLUS_ONE_THRESHOLD']
+
+    def __call__(self, request):
+        metrics = request.instrumentation = RequestMetrics(self.threshold)
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(metrics))
+            response = self.get_response(request)
+        metrics.finish()
+        metrics.operation = getattr(request, 'graphql_operation', None)
+
+        if self.server_timing:
+            response['Server-Timing'] = metrics.server_timing()
+        record = metrics.as_dict(request, response)
+        level = logging.WARNING if record['n_plus_one'] else logging.INFO
+        logger.log(level, json.dumps(record, ensure_ascii=False), extra={'instrumentation': record})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = request.instrumentation
+        metrics.view = view_label(request, view_func)
+        metrics.view_started = time.perf_counter()
+
+    def process_template_response(self, request, response):
+        request.instrumentation.render_started = time.perf_counter()
+        return response
+
+
+# Zlicza zapytania SQL i ich łączny czas (connection.execute_wrapper)
+class QueryTimer:
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.queries += 1
+
+
+# Metryki Prometheusa (settings.LIBRARY_METRICS, library.metrics): czas obsługi, liczba zapytań
+# i czas bazy dla każdej trasy - akcji ViewSetu (BookViewSet.list) albo operacji GraphQL
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        if not get_metrics_settings()['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        timer = QueryTimer()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+
+        observe_request(
+            self.route(request), request.method, response.status_code,
+            time.perf_counter() - started, timer.queries, timer.duration,
+        )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.metrics_route = view_label(request, view_func)
+
+    def route(self, request):
+        operation = getattr(request, 'graphql_operation', None)
+        if operation is not None:
+            return registry.graphql_route(operation)
+        return getattr(request, 'metrics_route', 'unmatched')
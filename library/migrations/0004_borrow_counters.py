@@ -0,0 +1,68 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:49
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Book = apps.get_model("library", "Book")
+    Patron = apps.get_model("library", "Patron")
+    Publisher = apps.get_model("library", "Publisher")
+    Borrow = apps.get_model("library", "Borrow")
+
+    def borrow_count(lookup, **filters):
+        borrows = (
+            Borrow.objects.filter(**{lookup: OuterRef("pk")}, **filters)
+            .order_by()
+            .values(lookup)
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return Coalesce(Subquery(borrows), 0)
+
+    Book.objects.update(
+        borrow_count=borrow_count("book"),
+        active_borrow_count=borrow_count("book", status="active"),
+    )
+    Patron.objects.update(
+        borrow_count=borrow_count("patron"),
+        active_borrow_count=borrow_count("patron", status="active"),
+    )
+    Publisher.objects.update(total_borrows=borrow_count("book__publisher"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0003_remove_bookdetails_cover_image_url"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="book",
+            name="active_borrow_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="book",
+            name="borrow_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="patron",
+            name="active_borrow_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="patron",
+            name="borrow_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="publisher",
+            name="total_borrows",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
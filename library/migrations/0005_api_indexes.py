@@ -0,0 +1,55 @@
+# Generated by Django 5.1.7 on 2026-10-18 15:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0004_borrow_counters"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="author",
+            index=models.Index(fields=["last_name"], name="author_last_name_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(fields=["title"], name="book_title_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="book",
+            index=models.Index(
+                fields=["publication_year"], name="book_publication_year_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(
+                fields=["status", "due_date"], name="borrow_status_due_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(
+                fields=["patron", "status"], name="borrow_patron_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(fields=["borrow_date"], name="borrow_borrow_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(fields=["due_date"], name="borrow_due_date_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="borrow",
+            index=models.Index(
+                condition=models.Q(("status", "active")),
+                fields=["due_date"],
+                name="borrow_active_due_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0006_table_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="JobRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("job", models.CharField(max_length=50)),
+                ("started_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("duration", models.FloatField(default=0)),
+                ("rows_changed", models.PositiveIntegerField(default=0)),
+                ("batches", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["job", "-started_at"], name="jobrun_job_started_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0007_job_run"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="bookdetails",
+            name="cover_variants",
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
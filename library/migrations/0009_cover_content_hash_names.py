@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:19
+
+import library.media
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0008_bookdetails_cover_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bookdetails",
+            name="cover_image",
+            field=models.ImageField(
+                blank=True, null=True, upload_to=library.media.cover_upload_to
+            ),
+        ),
+    ]
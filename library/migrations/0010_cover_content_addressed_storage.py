@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:21
+
+import library.media
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0009_cover_content_hash_names"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="bookdetails",
+            name="cover_image",
+            field=models.ImageField(
+                blank=True,
+                null=True,
+                storage=library.media.ContentAddressedStorage(),
+                upload_to=library.media.cover_upload_to,
+            ),
+        ),
+    ]
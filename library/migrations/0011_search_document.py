@@ -0,0 +1,121 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:23
+
+from django.db import migrations, models
+
+FTS_TABLE = "library_search_fts"
+
+SQLITE_CREATE = [
+    f"""CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        kind, title, body,
+        content='library_searchdocument', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON library_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, kind, title, body)
+        VALUES (new.id, new.kind, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON library_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, kind, title, body)
+        VALUES ('delete', old.id, old.kind, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE ON library_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, kind, title, body)
+        VALUES ('delete', old.id, old.kind, old.title, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, kind, title, body)
+        VALUES (new.id, new.kind, new.title, new.body);
+    END""",
+]
+
+SQLITE_DROP = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+POSTGRESQL_CREATE = [
+    """ALTER TABLE library_searchdocument ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('simple', title), 'A') || setweight(to_tsvector('simple', body), 'B')
+        ) STORED""",
+    "CREATE INDEX searchdocument_vector_idx ON library_searchdocument USING GIN (search_vector)",
+]
+
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS searchdocument_vector_idx",
+    "ALTER TABLE library_searchdocument DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def has_fts5(schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("PRAGMA compile_options")
+        return any(option == "ENABLE_FTS5" for option, in cursor.fetchall())
+
+
+# Indeks pełnotekstowy zależny od bazy (library.search); SQLite bez FTS5 i inne bazy
+# korzystają z wyszukiwania bez indeksu
+def create_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite" and has_fts5(schema_editor):
+        statements = SQLITE_CREATE
+    elif vendor == "postgresql":
+        statements = POSTGRESQL_CREATE
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    statements = {"sqlite": SQLITE_DROP, "postgresql": POSTGRESQL_DROP}.get(vendor, [])
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0010_cover_content_addressed_storage"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchDocument",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("book", "Book"),
+                            ("author", "Author"),
+                            ("patron", "Patron"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("object_id", models.PositiveIntegerField()),
+                ("title", models.CharField(max_length=250)),
+                ("body", models.TextField(blank=True)),
+            ],
+            options={
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("kind", "object_id"),
+                        name="searchdocument_kind_object_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
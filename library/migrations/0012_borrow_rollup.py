@@ -0,0 +1,131 @@
+# Generated by Django 5.1.7 on 2026-10-18 16:41
+
+from django.db import migrations, models
+from django.db.models import Count, F, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+# Agregaty z istniejących wypożyczeń (jak library.rollups.rebuild): patron_id = 0 to suma
+# dla wszystkich czytelników, category_id = 0 - książki bez kategorii
+def populate_rollups(apps, schema_editor):
+    Borrow = apps.get_model("library", "Borrow")
+    BorrowRollup = apps.get_model("library", "BorrowRollup")
+    quote = schema_editor.connection.ops.quote_name
+    columns = ", ".join(
+        quote(field)
+        for field in (
+            "period",
+            "period_start",
+            "category_id",
+            "publisher_id",
+            "patron_id",
+            "status",
+            "count",
+        )
+    )
+
+    starts = {"day": F("borrow_date"), "month": TruncMonth("borrow_date")}
+    for period, start in starts.items():
+        for patron in (F("patron_id"), Value(0)):
+            rows = (
+                Borrow.objects.order_by()
+                .annotate(
+                    rollup_period=Value(period),
+                    start=start,
+                    category=Coalesce("book__category_id", Value(0)),
+                    publisher=F("book__publisher_id"),
+                    rollup_patron=patron,
+                    rollup_status=F("status"),
+                )
+                .values(
+                    "rollup_period",
+                    "start",
+                    "category",
+                    "publisher",
+                    "rollup_patron",
+                    "rollup_status",
+                )
+                .annotate(total=Count("id"))
+            )
+            sql, params = rows.query.sql_with_params()
+            schema_editor.execute(
+                f"INSERT INTO {quote(BorrowRollup._meta.db_table)} ({columns}) {sql}",
+                params,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("library", "0011_search_document"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BorrowRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "period",
+                    models.CharField(
+                        choices=[("day", "Day"), ("month", "Month")], max_length=5
+                    ),
+                ),
+                ("period_start", models.DateField()),
+                ("category_id", models.PositiveIntegerField(default=0)),
+                ("publisher_id", models.PositiveIntegerField()),
+                ("patron_id", models.PositiveIntegerField()),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("active", "Active"),
+                            ("overdue", "Overdue"),
+                            ("returned", "Returned"),
+                            ("lost", "Lost"),
+                        ],
+                        max_length=10,
+                    ),
+                ),
+                ("count", models.IntegerField(default=0)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["period", "category_id", "period_start"],
+                        name="borrowrollup_category_idx",
+                    ),
+                    models.Index(
+                        fields=["period", "publisher_id", "period_start"],
+                        name="borrowrollup_publisher_idx",
+                    ),
+                    models.Index(
+                        fields=["patron_id", "period", "period_start"],
+                        name="borrowrollup_patron_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=(
+                            "period",
+                            "period_start",
+                            "category_id",
+                            "publisher_id",
+                            "patron_id",
+                            "status",
+                        ),
+                        name="borrowrollup_key_uniq",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -2,12 +2,32 @@ from django.db import models
 from django.utils import timezone
 from datetime import date, timedelta
 from django.core.exceptions import ValidationError
+from .media import cover_storage, cover_upload_to
+
+# Modele z licznikami utrzymywanymi przez library.counters (wyrażeniami F) - zwykły zapis
+# istniejącego wiersza pomija kolumny liczników, żeby nie nadpisać ich wartościami z chwili
+# odczytu obiektu
+class CounterFieldsMixin:
+    counter_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            deferred = self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields and field.attname not in deferred
+            ]
+        return super().save(*args, **kwargs)
 
 # Wydawca
-class Publisher(models.Model):
+class Publisher(CounterFieldsMixin, models.Model):
     name = models.CharField(max_length=100, blank=False, null=False)
     email = models.CharField(max_length=100, blank=True, null=True)
     location = models.CharField(max_length=100, blank=True, null=True)
+    # licznik wypożyczeń książek wydawcy, utrzymywany przez library.counters
+    total_borrows = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('total_borrows',)
 
     def __str__(self):
         return self.name
@@ -31,6 +51,11 @@ class Author(models.Model):
     email = models.EmailField(unique=True, blank=True, null=True)
     nationality = models.CharField(max_length=100, blank=False, null=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['last_name'], name='author_last_name_idx'),
+        ]
+
     # full_name -> pełne imię i nazwisko
     @property
     def full_name(self):
@@ -41,12 +66,24 @@ class Author(models.Model):
 
 
 # Książka, relacje: N:M z Autor, 1:N z Kategoria, 1:N z Wydawca
-class Book(models.Model):
+class Book(CounterFieldsMixin, models.Model):
     title = models.CharField(max_length=250, blank=False, null=False)
     publisher = models.ForeignKey(Publisher, on_delete=models.CASCADE, related_name='books')
     publication_year = models.IntegerField(blank=False, null=False)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null = True ,related_name='books')
     authors = models.ManyToManyField(Author, related_name='books')
+    # liczniki wypożyczeń, utrzymywane przez library.counters
+    borrow_count = models.PositiveIntegerField(default=0, editable=False)
+    active_borrow_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('borrow_count', 'active_borrow_count')
+
+    # indeksy pod filtrowanie/sortowanie w API (ordering_fields, filter_fields w GraphQL)
+    class Meta:
+        indexes = [
+            models.Index(fields=['title'], name='book_title_idx'),
+            models.Index(fields=['publication_year'], name='book_publication_year_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -56,17 +93,26 @@ class BookDetails(models.Model):
     book = models.OneToOneField(Book, on_delete=models.CASCADE, related_name='detail')
     isbn = models.CharField(max_length=13, blank=False, null=False, unique=True)
     pages = models.IntegerField(blank=True, null=True)
-    cover_image = models.ImageField(upload_to='covers/', blank=True, null=True)
+    # nazwa pliku z hashu treści (library.media) - adresy okładek można cache'ować bez końca,
+    # a okładki o tej samej treści współdzielą jeden plik
+    cover_image = models.ImageField(upload_to=cover_upload_to, storage=cover_storage, blank=True, null=True)
+    # warianty okładki generowane w tle (library.images): {'source': ..., 'thumb': {...}, 'medium': {...}}
+    cover_variants = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"Szczegóły książki: {self.book.title}"
 
 # Czytelnik
-class Patron(models.Model):
+class Patron(CounterFieldsMixin, models.Model):
     library_card_number = models.CharField(max_length=6, blank=False, null=False, unique=True)
     first_name = models.CharField(max_length=100, blank=False, null=False)
     last_name = models.CharField(max_length=100, blank=False, null=False)
     email = models.EmailField(unique=True, blank=True, null=True)
+    # liczniki wypożyczeń, utrzymywane przez library.counters
+    borrow_count = models.PositiveIntegerField(default=0, editable=False)
+    active_borrow_count = models.PositiveIntegerField(default=0, editable=False)
+
+    counter_fields = ('borrow_count', 'active_borrow_count')
 
     @property
     def full_name(self):
@@ -101,6 +147,15 @@ class StatusBorrowManager(models.Manager):
     def by_status(self, status):
         return self.get_queryset().filter(status=status)
 
+# QuerySet wypożyczeń
+class BorrowQuerySet(models.QuerySet):
+    # liczba wypożyczeń ogółem i w podziale na statusy, policzona jednym zapytaniem
+    def status_counts(self, statuses=('active', 'overdue', 'returned', 'lost')):
+        aggregates = {'total_borrows': models.Count('id')}
+        for status in statuses:
+            aggregates[status] = models.Count('id', filter=models.Q(status=status))
+        return self.order_by().aggregate(**aggregates)
+
 # Wypożyczenie, relacje: 1:1 z Książka, 1:1 z Czytelnik
 class Borrow(models.Model):
     STATUS_CHOICES = (
@@ -118,13 +173,36 @@ class Borrow(models.Model):
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
 
     # Ustawienie managerów
-    objects = models.Manager()
+    objects = BorrowQuerySet.as_manager()
     active_borrows = ActiveBorrowManager()
     overdue_borrows = OverdueBorrowManager()
     returned_borrows = ReturnedBorrowManager()
     lost_borrows = LostBorrowManager()
     status_borrows = StatusBorrowManager()
 
+    # Indeksy pod zapytania managerów, filtry (status, patron) i sortowanie (borrow_date, due_date)
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'due_date'], name='borrow_status_due_idx'),
+            models.Index(fields=['patron', 'status'], name='borrow_patron_status_idx'),
+            models.Index(fields=['borrow_date'], name='borrow_borrow_date_idx'),
+            models.Index(fields=['due_date'], name='borrow_due_date_idx'),
+            # indeks częściowy - tylko aktywne wypożyczenia (na bazach bez wsparcia jest pomijany)
+            models.Index(fields=['due_date'], condition=models.Q(status='active'), name='borrow_active_due_idx'),
+        ]
+
+    # Zapamiętanie stanu odczytanego z bazy - na jego podstawie aktualizowane są liczniki
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = instance.counter_state()
+        return instance
+
+    # (book_id, patron_id, status, borrow_date) - pola, od których zależą liczniki wypożyczeń
+    # i agregaty (library.rollups)
+    def counter_state(self):
+        return tuple(self.__dict__.get(field) for field in ('book_id', 'patron_id', 'status', 'borrow_date'))
+
     # Walidacja danych
     def clean(self):
         if self.status in ['returned', 'lost']:
@@ -133,19 +211,126 @@ class Borrow(models.Model):
             if self.return_date > timezone.now().date():
                 raise ValidationError("Return date cannot be in the future")
 
-    # Zapis wypożyczenia
-    def save(self, *args, **kwargs):
+    # Domyślne daty (wspólne dla save() i zapisu zbiorczego w library.bulk)
+    def apply_defaults(self):
         if not self.borrow_date:
             self.borrow_date = date.today()
         if self.status == 'active' and not self.due_date:
             self.due_date = self.borrow_date + timedelta(days=30)
+
+    # Zapis wypożyczenia
+    def save(self, *args, **kwargs):
+        self.apply_defaults()
         return super().save(*args, **kwargs)
 
-    # Sprawdzenie, czy wypożyczenie jest przeterminowane
+    # Sprawdzenie, czy wypożyczenie jest przeterminowane (status ustawia okresowo
+    # komenda mark_overdue; aktywne po terminie, jeszcze nieoznaczone, też się liczą)
     def is_overdue(self):
-        return self.status == 'active' and self.due_date and self.due_date < timezone.now().date()
+        if self.status == 'overdue':
+            return True
+        return self.status == 'active' and bool(self.due_date) and self.due_date < timezone.localdate()
 
     def __str__(self):
         return f"{self.patron.full_name} borrows {self.book.title}"
 
 
+
+# Wersja tabeli - podbijana przy każdej zmianie danych, źródło ETag/Last-Modified w API
+class TableVersion(models.Model):
+    table = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.table} v{self.version}"
+
+
+# Przebieg zadania okresowego (np. mark_overdue): czas trwania i liczba zmienionych wierszy
+class JobRun(models.Model):
+    job = models.CharField(max_length=50)
+    started_at = models.DateTimeField(default=timezone.now)
+    duration = models.FloatField(default=0)     # sekundy
+    rows_changed = models.PositiveIntegerField(default=0)
+    batches = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', '-started_at'], name='jobrun_job_started_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.job} {self.started_at:%Y-%m-%d %H:%M} ({self.rows_changed})"
+
+
+# Punkt kontrolny importu CSV (library.importers) - liczba przetworzonych wierszy źródła,
+# zapisywana w tej samej transakcji co paczka wierszy
+class ImportCheckpoint(models.Model):
+    source = models.CharField(max_length=500, unique=True)     # "<rodzaj>:<ścieżka pliku>"
+    rows = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.source} ({self.rows})"
+
+
+# Dokument indeksu wyszukiwania pełnotekstowego (library.search) - książka, autor albo czytelnik.
+# Na SQLite indeksowany przez tabelę FTS5 aktualizowaną triggerami, na PostgreSQL przez kolumnę
+# tsvector (obie spoza ORM, z migracji 0011). Zmiana pól tego modelu wymaga ponownego utworzenia
+# triggerów - SQLite przebudowuje tabelę przy ALTER.
+class SearchDocument(models.Model):
+    KIND_CHOICES = (
+        ('book', 'Book'),
+        ('author', 'Author'),
+        ('patron', 'Patron'),
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.PositiveIntegerField()
+    title = models.CharField(max_length=250)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='searchdocument_kind_object_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
+
+
+# Agregat wypożyczeń (library.rollups): liczba wypożyczeń rozpoczętych w danym dniu/miesiącu
+# dla kombinacji (kategoria, wydawca, czytelnik, status). Utrzymywany przyrostowo przy zmianach
+# wypożyczeń, przebudowywany komendą rebuild_rollups. Wymiary to zwykłe liczby (nie klucze obce) -
+# wiersze zerują się razem z usuwanymi wypożyczeniami; category_id = 0 oznacza brak kategorii,
+# a patron_id = 0 - sumę dla wszystkich czytelników.
+class BorrowRollup(models.Model):
+    PERIOD_CHOICES = (
+        ('day', 'Day'),
+        ('month', 'Month'),
+    )
+
+    period = models.CharField(max_length=5, choices=PERIOD_CHOICES)
+    period_start = models.DateField()
+    category_id = models.PositiveIntegerField(default=0)
+    publisher_id = models.PositiveIntegerField()
+    patron_id = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=Borrow.STATUS_CHOICES)
+    count = models.IntegerField(default=0)
+
+    # indeks czytelnika obsługuje też szeregi z wierszy "wszyscy czytelnicy" (patron_id = 0);
+    # pozostałe indeksy - szeregi dla jednej kategorii albo wydawcy
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['period', 'period_start', 'category_id', 'publisher_id', 'patron_id', 'status'],
+                name='borrowrollup_key_uniq',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'category_id', 'period_start'], name='borrowrollup_category_idx'),
+            models.Index(fields=['period', 'publisher_id', 'period_start'], name='borrowrollup_publisher_idx'),
+            models.Index(fields=['patron_id', 'period', 'period_start'], name='borrowrollup_patron_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.period} {self.period_start}: {self.count}"
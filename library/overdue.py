@@ -0,0 +1,40 @@
+import time
+
+from django.db import transaction
+from django.utils import timezone
+
+from .counters import update_borrows
+from .models import Borrow, JobRun
+
+JOB_NAME = 'mark_overdue'
+DEFAULT_BATCH_SIZE = 1000
+
+
+# Przenosi aktywne wypożyczenia z terminem zwrotu przed `today` do statusu "overdue".
+# Każda paczka to osobna krótka transakcja: wybór id po indeksie (status, due_date)
+# i jeden UPDATE ... WHERE id IN (...) AND status = 'active' z korektą liczników.
+# Ponowne uruchomienie niczego nie zmienia (idempotentne); przebieg zapisywany jest w JobRun.
+def mark_overdue(today=None, batch_size=DEFAULT_BATCH_SIZE):
+    today = today or timezone.localdate()
+    started_at = timezone.now()
+    started = time.monotonic()
+    pending = Borrow.active_borrows.filter(due_date__lt=today)
+
+    changed = batches = 0
+    while True:
+        with transaction.atomic():
+            ids = list(pending.order_by('due_date').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            changed += update_borrows(pending.filter(pk__in=ids), status='overdue')
+            batches += 1
+        if len(ids) < batch_size:
+            break
+
+    return JobRun.objects.create(
+        job=JOB_NAME,
+        started_at=started_at,
+        duration=time.monotonic() - started,
+        rows_changed=changed,
+        batches=batches,
+    )
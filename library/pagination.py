@@ -0,0 +1,193 @@
+import base64
+import json
+from collections import OrderedDict, namedtuple
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+# pozycja w zbiorze wyników: wartość pola sortowania i klucz główny ostatniego/pierwszego wiersza
+Cursor = namedtuple('Cursor', ['value', 'pk', 'reverse'])
+
+
+# Stronicowanie kluczem (keyset / seek) po parze (pole sortowania, id).
+# Zamiast OFFSET kolejna strona to warunek WHERE względem ostatniego wiersza poprzedniej,
+# więc czas odpowiedzi nie rośnie przy przechodzeniu w głąb tabeli.
+# Pole sortowania pochodzi z OrderingFilter (?ordering=-due_date), a bez niego z Meta.ordering lub id;
+# liczy się tylko pierwsze pole sortowania, remisy rozstrzyga id.
+# Rozmiar strony: ?page_size=, atrybut `page_size` ViewSetu albo REST_FRAMEWORK['PAGE_SIZE'].
+class KeysetPagination(BasePagination):
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Nieprawidłowy kursor.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request, view)
+        if not self.page_size:
+            return None
+
+        self.field, self.ascending = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request)
+        reverse = cursor.reverse if cursor else False
+
+        queryset = queryset.order_by(*self.get_order_by(reverse))
+        if cursor:
+            queryset = queryset.filter(self.get_cursor_filter(cursor))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        if cursor is None:
+            has_next, has_previous = has_more, False
+        elif reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, True
+
+        self.next_cursor = self.get_position(results[-1], reverse=False) if has_next and results else None
+        self.previous_cursor = self.get_position(results[0], reverse=True) if has_previous and results else None
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_link(self.next_cursor)),
+            ('previous', self.get_link(self.previous_cursor)),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Kursor strony (z pól next/previous).',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Liczba wyników na stronie.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    def get_page_size(self, request, view):
+        value = request.query_params.get(self.page_size_query_param)
+        if value is not None:
+            try:
+                page_size = int(value)
+            except ValueError:
+                page_size = 0
+            if page_size > 0:
+                return min(page_size, self.max_page_size)
+        return getattr(view, 'page_size', self.page_size)
+
+    # (pole modelu, rosnąco?) - pierwszy element sortowania querysetu albo klucz główny
+    def get_ordering(self, queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        pk = queryset.model._meta.pk
+        if not ordering or not isinstance(ordering[0], str):
+            return pk, True
+
+        name = ordering[0]
+        ascending = not name.startswith('-')
+        name = name.lstrip('-')
+        if name == 'pk':
+            return pk, ascending
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return pk, True
+        if not field.concrete or field.is_relation:
+            return pk, True
+        return field, ascending
+
+    # Kierunek przeglądania: do przodu (next) albo wstecz (previous) - wtedy sortowanie jest odwrócone
+    def get_order_by(self, reverse):
+        ascending = self.ascending != reverse
+        pk_ordering = 'pk' if ascending else '-pk'
+        if self.field.primary_key:
+            return [pk_ordering]
+
+        nulls = {}
+        if self.field.null:
+            # NULL-e zawsze na końcu listy, niezależnie od bazy danych
+            nulls = {'nulls_first': True} if reverse else {'nulls_last': True}
+        expression = F(self.field.attname)
+        expression = expression.asc(**nulls) if ascending else expression.desc(**nulls)
+        return [expression, pk_ordering]
+
+    # Warunek "wiersze za pozycją kursora" w bieżącym kierunku przeglądania
+    def get_cursor_filter(self, cursor):
+        op = 'gt' if self.ascending != cursor.reverse else 'lt'
+        if self.field.primary_key:
+            return Q(**{f'pk__{op}': cursor.pk})
+
+        name = self.field.attname
+        if cursor.value is None:
+            condition = Q(**{f'{name}__isnull': True, f'pk__{op}': cursor.pk})
+            if cursor.reverse:
+                condition |= Q(**{f'{name}__isnull': False})
+            return condition
+
+        value = cursor.value
+        condition = Q(**{f'{name}__{op}': value}) | Q(**{name: value, f'pk__{op}': cursor.pk})
+        if self.field.null and not cursor.reverse:
+            condition |= Q(**{f'{name}__isnull': True})
+        return condition
+
+    def get_position(self, instance, reverse):
+        value = None
+        if not self.field.primary_key and getattr(instance, self.field.attname) is not None:
+            value = self.field.value_to_string(instance)
+        return Cursor(value=value, pk=instance.pk, reverse=reverse)
+
+    # Kursor z parametru zapytania; wartość pola sortowania od razu w typie pola - kursor
+    # z poprawnym formatem, ale złą wartością (np. pk="abc") to też 404, nie błąd serwera
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            pk, value = data['pk'], data['v']
+            if not isinstance(pk, int) or isinstance(pk, bool):
+                raise ValueError(pk)
+            if value is not None and not self.field.primary_key:
+                value = self.field.to_python(value)
+            return Cursor(value=value, pk=pk, reverse=bool(data['r']))
+        except (TypeError, ValueError, KeyError, UnicodeEncodeError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, cursor):
+        data = json.dumps({'v': cursor.value, 'pk': cursor.pk, 'r': int(cursor.reverse)}, separators=(',', ':'))
+        return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+    def get_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(cursor))
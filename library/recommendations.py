@@ -0,0 +1,231 @@
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from . import versions
+from .models import Borrow
+
+# Rekomendacje "czytelnicy, którzy wypożyczyli tę książkę, wypożyczali też..." (GET
+# /api/books/{id}/similar/, pole GraphQL similarBooks). Macierz współwystąpień książek liczona
+# z par (czytelnik, książka) - dla każdej pary książek liczba wspólnych czytelników - a z niej
+# K najbliższych sąsiadów każdej książki (podobieństwo kosinusowe). Indeks to tablice w układzie
+# CSR zapisane w pliku .npz: buduje go komenda build_recommendations (np. z crona), procesy
+# serwera wczytują nową wersję pliku same. Odpowiedź to odczyt K kolejnych elementów tablic.
+
+DEFAULT_RECOMMENDATIONS = {
+    'SNAPSHOT': None,           # plik indeksu (domyślnie <tmp>/library-recommendations.npz)
+    'TOP_K': 20,                # sąsiedzi zapamiętani dla każdej książki
+    'MIN_SUPPORT': 1,           # minimalna liczba wspólnych czytelników pary książek
+    'CHECK_INTERVAL': 5.0,      # jak często (s) sprawdzać, czy plik indeksu się zmienił
+}
+
+DEFAULT_LIMIT = 10
+CHUNK_SIZE = 20000
+# czytelnicy z większą liczbą różnych książek są pomijani - liczba par rośnie z kwadratem
+# liczby książek czytelnika, a takie konta (np. zbiorcze) niewiele mówią o podobieństwie
+MAX_BOOKS_PER_PATRON = 500
+# liczba par książek liczona naraz - ogranicza pamięć budowania
+PAIR_BATCH_SIZE = 2_000_000
+
+
+def get_recommendations_settings():
+    return {**DEFAULT_RECOMMENDATIONS, **getattr(settings, 'LIBRARY_RECOMMENDATIONS', {})}
+
+
+def snapshot_path():
+    return get_recommendations_settings()['SNAPSHOT'] or os.path.join(tempfile.gettempdir(), 'library-recommendations.npz')
+
+
+def borrow_version():
+    return versions.get_versions([Borrow])[Borrow][0]
+
+
+# Sąsiedzi książek w układzie CSR: sąsiedzi książki book_ids[i] to
+# neighbors[indptr[i]:indptr[i + 1]] (od najbardziej podobnych), z wynikami w scores
+# i liczbą wspólnych czytelników w patrons
+class SimilarityIndex:
+    def __init__(self, book_ids, indptr, neighbors, scores, patrons, version=0, built_at=0.0):
+        self.book_ids = book_ids
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.scores = scores
+        self.patrons = patrons
+        self.version = version
+        self.built_at = built_at
+
+    def similar(self, book_id, limit=DEFAULT_LIMIT):
+        position = np.searchsorted(self.book_ids, book_id)
+        if position == len(self.book_ids) or self.book_ids[position] != book_id:
+            return []
+        start = self.indptr[position]
+        end = min(self.indptr[position + 1], start + max(limit, 0))
+        return [
+            (int(neighbor), round(float(score), 4), int(patrons))
+            for neighbor, score, patrons in zip(
+                self.neighbors[start:end], self.scores[start:end], self.patrons[start:end])
+        ]
+
+    def arrays(self):
+        return {
+            'book_ids': self.book_ids, 'indptr': self.indptr, 'neighbors': self.neighbors,
+            'scores': self.scores, 'patrons': self.patrons,
+        }
+
+    def stats(self):
+        return {
+            'books': len(self.book_ids),
+            'neighbors': len(self.neighbors),
+            'bytes': sum(array.nbytes for array in self.arrays().values()),
+            'version': self.version,
+            'built_at': self.built_at,
+        }
+
+
+# Pary (czytelnik, książka) bez powtórzeń, posortowane po czytelniku
+def load_pairs(chunk_size=CHUNK_SIZE):
+    rows = Borrow.objects.order_by().values_list('patron_id', 'book_id').distinct()
+    pairs = np.fromiter(rows.iterator(chunk_size=chunk_size), dtype=[('patron', 'i8'), ('book', 'i8')])
+    return pairs[np.lexsort((pairs['book'], pairs['patron']))]
+
+
+# Wiersze macierzy współwystąpień dla książek (na gęstych indeksach) first..last-1: wszystkie pary
+# (książka, inna książka tego samego czytelnika) i ich liczby - liczba wspólnych czytelników.
+# entries - pozycje par (czytelnik, książka) tych książek, entry_start/entry_size - grupa
+# czytelnika każdej pozycji. Wynik posortowany po (książka, sąsiad).
+def co_occurrences(book_index, entries, entry_start, entry_size, book_count):
+    sizes = entry_size[entries]
+    offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    source = np.repeat(book_index[entries], sizes)
+    target = book_index[np.repeat(entry_start[entries], sizes) + offsets]
+    different = source != target
+    keys, counts = np.unique(source[different] * book_count + target[different], return_counts=True)
+    source, target = np.divmod(keys, book_count)
+    return source, target, counts
+
+
+# Indeks budowany paczkami książek: dla każdej paczki liczone są tylko jej wiersze macierzy
+# współwystąpień (najwyżej batch_size par), z których zostaje K najlepszych sąsiadów każdej
+# książki - pełna macierz nigdy nie jest w pamięci
+def build_index(top_k=None, min_support=None, batch_size=PAIR_BATCH_SIZE):
+    config = get_recommendations_settings()
+    top_k = top_k or config['TOP_K']
+    min_support = min_support or config['MIN_SUPPORT']
+    version = borrow_version()
+
+    pairs = load_pairs()
+    patron_start = np.flatnonzero(np.diff(pairs['patron'], prepend=-1))
+    group_size = np.diff(np.r_[patron_start, len(pairs)])
+    small = np.repeat(group_size <= MAX_BOOKS_PER_PATRON, group_size)
+    group_size = group_size[group_size <= MAX_BOOKS_PER_PATRON]
+    books, book_index = np.unique(pairs['book'][small], return_inverse=True)
+    del pairs, small
+    popularity = np.bincount(book_index, minlength=len(books))
+
+    entry_size = np.repeat(group_size, group_size)
+    entry_start = np.repeat(np.cumsum(group_size) - group_size, group_size)
+    by_book = np.argsort(book_index, kind='stable')
+    book_entries = np.r_[0, np.cumsum(popularity)]
+    book_pairs = np.cumsum(np.bincount(book_index, weights=entry_size, minlength=len(books)))
+
+    parts = []
+    first = 0
+    while first < len(books):
+        # książki, których wiersze mieszczą się w paczce (co najmniej jedna książka)
+        done = book_pairs[first - 1] if first else 0
+        last = max(first + 1, int(np.searchsorted(book_pairs, done + batch_size, side='right')))
+        entries = by_book[book_entries[first]:book_entries[last]]
+        source, target, counts = co_occurrences(book_index, entries, entry_start, entry_size, len(books))
+        supported = counts >= min_support
+        source, target, counts = source[supported], target[supported], counts[supported]
+
+        # podobieństwo kosinusowe wektorów czytelników książek; K najlepszych dla każdej książki -
+        # stabilne sortowanie (wiersze są już po sąsiedzie) po jednym kluczu (książka, -wynik):
+        # bity nieujemnego float32 rosną razem z jego wartością
+        scores = (counts / np.sqrt(popularity[source].astype('f8') * popularity[target])).astype('f4')
+        order = np.argsort(((source - first) << 31) | (0x7FFFFFFF - scores.view('i4')), kind='stable')
+        source, target, scores, counts = source[order], target[order], scores[order], counts[order]
+        per_book = np.bincount(source - first, minlength=last - first)
+        rank = np.arange(len(source)) - np.repeat(np.cumsum(per_book) - per_book, per_book)
+        keep = rank < top_k
+        parts.append((source[keep], target[keep], scores[keep], counts[keep]))
+        first = last
+
+    empty = np.array([], dtype='i8')
+    source, target, scores, counts = [np.concatenate(column) for column in zip(*parts)] if parts else [empty] * 4
+    indptr = np.zeros(len(books) + 1, dtype='i8')
+    np.cumsum(np.bincount(source, minlength=len(books)), out=indptr[1:])
+    return SimilarityIndex(
+        book_ids=books.astype('i8'),
+        indptr=indptr,
+        neighbors=books[target].astype('i4'),
+        scores=scores,
+        patrons=counts.astype('i4'),
+        version=version,
+        built_at=time.time(),
+    )
+
+
+def save_index(index, path=None):
+    path = path or snapshot_path()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp.npz'
+    np.savez(tmp_path, **index.arrays(), version=index.version, built_at=index.built_at)
+    os.replace(tmp_path, path)
+
+
+def load_index(path=None):
+    try:
+        with np.load(path or snapshot_path()) as data:
+            return SimilarityIndex(
+                data['book_ids'], data['indptr'], data['neighbors'], data['scores'], data['patrons'],
+                int(data['version']), float(data['built_at']),
+            )
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+# Indeks procesu: wczytywany z pliku (ponownie, gdy plik się zmieni); bez pliku - budowany
+# przy pierwszym użyciu i zapisywany dla pozostałych procesów
+class RecommendationService:
+    def __init__(self):
+        self.index = None
+        self.mtime = None
+        self.lock = threading.Lock()
+        self.last_check = 0.0
+
+    def reset(self):
+        with self.lock:
+            self.index = None
+            self.mtime = None
+            self.last_check = 0.0
+
+    def get_index(self):
+        config = get_recommendations_settings()
+        now = time.monotonic()
+        if self.index is not None and now - self.last_check < config['CHECK_INTERVAL']:
+            return self.index
+        path = snapshot_path()
+        with self.lock:
+            self.last_check = now
+            mtime = os.path.getmtime(path) if os.path.exists(path) else None
+            if mtime is not None and mtime != self.mtime:
+                index = load_index(path)
+                if index is not None:
+                    self.index, self.mtime = index, mtime
+            if self.index is None:
+                self.index = build_index()
+                save_index(self.index, path)
+                self.mtime = os.path.getmtime(path)
+            return self.index
+
+
+service = RecommendationService()
+
+
+# Podobne książki: [(book_id, wynik, liczba wspólnych czytelników)] od najbardziej podobnych
+def similar_books(book_id, limit=DEFAULT_LIMIT):
+    return service.get_index().similar(book_id, limit)
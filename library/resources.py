@@ -4,6 +4,7 @@ from .models import Publisher, Category, Author, Book, BookDetails, Patron, Borr
 class PublisherResource(resources.ModelResource):
     class Meta:
         model = Publisher
+        exclude = ('total_borrows',)
 
 class CategoryResource(resources.ModelResource):
     class Meta:
@@ -26,6 +27,7 @@ class BookDetailsResource(resources.ModelResource):
 class PatronResource(resources.ModelResource):
     class Meta:
         model = Patron
+        exclude = ('borrow_count', 'active_borrow_count')
 
 class BorrowResource(resources.ModelResource):
     class Meta:
@@ -0,0 +1,218 @@
+from collections import defaultdict
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import Coalesce, TruncMonth
+
+from .models import Book, BorrowRollup, Borrow, Category, Patron, Publisher
+
+# Agregaty wypożyczeń w czasie (BorrowRollup): liczba wypożyczeń rozpoczętych w danym dniu
+# i miesiącu (borrow_date) według kategorii i wydawcy książki, czytelnika i statusu.
+# Utrzymywane przyrostowo razem z licznikami (library.counters) - zmiana wypożyczenia to
+# przeniesienie jednostki między wierszami - a przebudowywane od zera komendą rebuild_rollups.
+# Szeregi czasowe (GET /api/borrows/timeseries/, pole GraphQL borrowTimeseries) czytają tylko
+# tę tabelę, bez przeglądania wypożyczeń.
+# Wymiar czytelnika prawie nie zmniejsza liczby wierszy względem wypożyczeń, dlatego każda zmiana
+# trafia też do wiersza "wszyscy czytelnicy" (patron_id = ALL_PATRONS) - zapytania bez filtra
+# i grupowania po czytelniku czytają tylko te wiersze.
+
+PERIODS = ('day', 'month')
+GROUPS = ('category', 'publisher', 'patron', 'status')
+NO_CATEGORY = 0
+ALL_PATRONS = 0
+WRITE_BATCH_SIZE = 2000
+KEY_FIELDS = ('period', 'period_start', 'category_id', 'publisher_id', 'patron_id', 'status')
+
+
+def period_start(period, day):
+    return day.replace(day=1) if period == 'month' else day
+
+
+def as_date(value):
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+
+# Wymiary książek: {book_id: (category_id, publisher_id)}
+def book_dimensions(book_ids):
+    rows = Book.objects.filter(pk__in=list(book_ids)).values_list('pk', 'category_id', 'publisher_id')
+    return {pk: (category_id or NO_CATEGORY, publisher_id) for pk, category_id, publisher_id in rows}
+
+
+def add(deltas, dimensions, patron_id, status, day, count):
+    category_id, publisher_id = dimensions
+    for period in PERIODS:
+        start = period_start(period, day)
+        deltas[(period, start, category_id, publisher_id, patron_id, status)] += count
+        deltas[(period, start, category_id, publisher_id, ALL_PATRONS, status)] += count
+
+
+# Zmiany agregatów dla przejść wypożyczeń między stanami (Borrow.counter_state()):
+# changes = [(old_state, new_state), ...] albo [(old_state, new_state, liczba wypożyczeń), ...]
+def collect_deltas(changes):
+    changes = list(changes)
+    dimensions = book_dimensions({
+        state[0] for old_state, new_state, *_ in changes for state in (old_state, new_state) if state
+    })
+
+    deltas = defaultdict(int)
+    for old_state, new_state, *count in changes:
+        weight = count[0] if count else 1
+        for state, sign in ((old_state, -1), (new_state, 1)):
+            if state is None:
+                continue
+            book_id, patron_id, status, borrow_date = state
+            # książka już usunięta albo stan bez daty (obiekt z odroczonymi polami)
+            if book_id not in dimensions or not borrow_date:
+                continue
+            add(deltas, dimensions[book_id], patron_id, status, as_date(borrow_date), sign * weight)
+    return deltas
+
+
+# Istniejące wiersze agregatów dla kluczy zmian: {klucz: BorrowRollup}
+def existing_rows(deltas):
+    periods, starts, _, publishers, patrons, _ = (set(column) for column in zip(*deltas))
+    candidates = BorrowRollup.objects.filter(
+        period__in=periods, period_start__in=starts, publisher_id__in=publishers, patron_id__in=patrons,
+    ).only(*KEY_FIELDS)
+    rows = {}
+    for rollup in candidates:
+        key = tuple(getattr(rollup, field) for field in KEY_FIELDS)
+        if key in deltas:
+            rows[key] = rollup
+    return rows
+
+
+# Nanosi zmiany na agregaty. Brakujące wiersze są najpierw wstawiane z count=0 (z pominięciem
+# konfliktów - ten sam wiersz mogła właśnie wstawić równoległa transakcja), potem wszystkie
+# zmiany idą przyrostem przez wyrażenie F, więc równoległe zmiany się nie nadpisują. Liczba
+# zapytań nie zależy od liczby zmienionych wierszy.
+def apply_deltas(deltas):
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    with transaction.atomic():
+        rows = existing_rows(deltas)
+        missing = [key for key in deltas if key not in rows]
+        if missing:
+            BorrowRollup.objects.bulk_create(
+                [BorrowRollup(**dict(zip(KEY_FIELDS, key)), count=0) for key in missing],
+                batch_size=WRITE_BATCH_SIZE, ignore_conflicts=True,
+            )
+            rows = existing_rows(deltas)
+        for key, rollup in rows.items():
+            rollup.count = F('count') + deltas[key]
+        BorrowRollup.objects.bulk_update(rows.values(), ['count'], batch_size=WRITE_BATCH_SIZE)
+
+
+def apply_changes(changes):
+    apply_deltas(collect_deltas(changes))
+
+
+# Zmiana kategorii lub wydawcy książek (także usunięcie kategorii) - ich wypożyczenia są
+# przenoszone do wierszy nowych wymiarów. old_dimensions = {book_id: (category_id, publisher_id)}
+def move_books(old_dimensions):
+    old_dimensions = {pk: (category_id or NO_CATEGORY, publisher_id) for pk, (category_id, publisher_id) in old_dimensions.items()}
+    new_dimensions = book_dimensions(old_dimensions)
+    moved = [pk for pk, dimensions in new_dimensions.items() if old_dimensions[pk] != dimensions]
+    if not moved:
+        return
+
+    rows = (
+        Borrow.objects
+        .filter(book_id__in=moved)
+        .order_by()
+        .values('book_id', 'patron_id', 'status', 'borrow_date')
+        .annotate(count=Count('id'))
+        .values_list('book_id', 'patron_id', 'status', 'borrow_date', 'count')
+    )
+    deltas = defaultdict(int)
+    for book_id, patron_id, status, borrow_date, count in rows:
+        add(deltas, old_dimensions[book_id], patron_id, status, borrow_date, -count)
+        add(deltas, new_dimensions[book_id], patron_id, status, borrow_date, count)
+    apply_deltas(deltas)
+
+
+# kolumny SELECT przy przebudowie - adnotacje w kolejności KEY_FIELDS (liczba wypożyczeń na końcu)
+ROLLUP_COLUMNS = ('rollup_period', 'start', 'category', 'publisher', 'rollup_patron', 'rollup_status')
+
+
+# Przelicza agregaty od zera: INSERT ... SELECT z GROUP BY po wypożyczeniach (po jednym
+# zapytaniu na okres i poziom czytelnika) - wiersze nie przechodzą przez Pythona
+def rebuild():
+    starts = {'day': F('borrow_date'), 'month': TruncMonth('borrow_date')}
+    table = connection.ops.quote_name(BorrowRollup._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field) for field in (*KEY_FIELDS, 'count'))
+    with transaction.atomic(), connection.cursor() as cursor:
+        BorrowRollup.objects.all().delete()
+        for period in PERIODS:
+            for patron in (F('patron_id'), Value(ALL_PATRONS)):
+                rows = (
+                    Borrow.objects
+                    .order_by()
+                    .annotate(
+                        rollup_period=Value(period),
+                        start=starts[period],
+                        category=Coalesce('book__category_id', Value(NO_CATEGORY)),
+                        publisher=F('book__publisher_id'),
+                        rollup_patron=patron,
+                        rollup_status=F('status'),
+                    )
+                    .values(*ROLLUP_COLUMNS)
+                    .annotate(total=Count('id'))
+                )
+                sql, params = rows.query.sql_with_params()
+                cursor.execute(f'INSERT INTO {table} ({columns}) {sql}', params)
+    return BorrowRollup.objects.count()
+
+
+def group_names(group_by, keys):
+    if group_by == 'category':
+        names = dict(Category.objects.filter(pk__in=keys).values_list('pk', 'name'))
+        names[NO_CATEGORY] = None
+        return names
+    if group_by == 'publisher':
+        return dict(Publisher.objects.filter(pk__in=keys).values_list('pk', 'name'))
+    if group_by == 'patron':
+        return {patron.pk: patron.full_name for patron in Patron.objects.filter(pk__in=keys).only('first_name', 'last_name')}
+    return {key: key for key in keys}
+
+
+# Szereg czasowy liczby wypożyczeń: [{'period': początek okresu, 'count'}] albo, przy group_by,
+# [{'period', 'key', 'name', 'count'}] - w kolejności okresów. Okresy bez wypożyczeń są pomijane.
+def timeseries(period='month', group_by=None, start=None, end=None,
+               category=None, publisher=None, patron=None, status=None):
+    queryset = BorrowRollup.objects.filter(period=period)
+    if start:
+        queryset = queryset.filter(period_start__gte=period_start(period, start))
+    if end:
+        queryset = queryset.filter(period_start__lte=end)
+    if patron is not None:
+        queryset = queryset.filter(patron_id=patron)
+    elif group_by == 'patron':
+        queryset = queryset.exclude(patron_id=ALL_PATRONS)
+    else:
+        queryset = queryset.filter(patron_id=ALL_PATRONS)
+    for field, value in (('category_id', category), ('publisher_id', publisher), ('status', status)):
+        if value is not None:
+            queryset = queryset.filter(**{field: value})
+
+    columns = ['period_start'] + ([f'{group_by}_id' if group_by != 'status' else 'status'] if group_by else [])
+    rows = (
+        queryset
+        .order_by()
+        .values(*columns)
+        .annotate(total=Sum('count'))
+        .filter(total__gt=0)
+        .order_by(*columns)
+        .values_list(*columns, 'total')
+    )
+    if not group_by:
+        return [{'period': day, 'count': count} for day, count in rows]
+
+    rows = list(rows)
+    names = group_names(group_by, {key for _, key, _ in rows})
+    return [
+        {'period': day, 'key': key, 'name': names.get(key), 'count': count}
+        for day, key, count in rows
+    ]
@@ -4,10 +4,15 @@ from django.db.models import Count, Avg, Max, Min, Sum
 from library.models import Category
 from django.db.models import Count
 from graphql import GraphQLError
-from graphene_django.filter import DjangoFilterConnectionField
 from library.models import Book, Author, Publisher, Category, Borrow, Patron
+from library.loaders import BatchedConnectionField, batch_resolver
+from library.cache import cached
+from library import recommendations, rollups, search as search_index
+from library.serializers import BorrowTimeseriesQuerySerializer
 
 class PublisherType(DjangoObjectType):
+    books = BatchedConnectionField(lambda: BookType)
+
     class Meta:
         model = Publisher
         filter_fields = {
@@ -16,8 +21,12 @@ class PublisherType(DjangoObjectType):
         }
         interfaces = (graphene.relay.Node,)
 
+    resolve_books = batch_resolver('books')
+
 
 class CategoryType(DjangoObjectType):
+    books = BatchedConnectionField(lambda: BookType)
+
     class Meta:
         model = Category
         filter_fields = {
@@ -25,9 +34,12 @@ class CategoryType(DjangoObjectType):
         }
         interfaces = (graphene.relay.Node,)
 
+    resolve_books = batch_resolver('books')
+
 
 class AuthorType(DjangoObjectType):
     full_name = graphene.String()
+    books = BatchedConnectionField(lambda: BookType)
 
     class Meta:
         model = Author
@@ -41,9 +53,12 @@ class AuthorType(DjangoObjectType):
     def resolve_full_name(self, info):
         return f"{self.first_name} {self.last_name}"
 
+    resolve_books = batch_resolver('books')
+
 
 class PatronType(DjangoObjectType):
     full_name = graphene.String()
+    borrows = BatchedConnectionField(lambda: BorrowType)
 
     class Meta:
         model = Patron
@@ -58,8 +73,14 @@ class PatronType(DjangoObjectType):
     def resolve_full_name(self, info):
         return f"{self.first_name} {self.last_name}"
 
+    resolve_borrows = batch_resolver('borrows')
+
 
+# Relacje typów ładowane są paczkami przez library.loaders (jedno zapytanie na poziom relacji)
 class BookType(DjangoObjectType):
+    authors = BatchedConnectionField(AuthorType)
+    borrows = BatchedConnectionField(lambda: BorrowType)
+
     class Meta:
         model = Book
         filter_fields = {
@@ -72,6 +93,10 @@ class BookType(DjangoObjectType):
         }
         interfaces = (graphene.relay.Node,)
 
+    resolve_publisher = batch_resolver('publisher')
+    resolve_category = batch_resolver('category')
+    resolve_authors = batch_resolver('authors')
+    resolve_borrows = batch_resolver('borrows')
 
 
 class BorrowType(DjangoObjectType):
@@ -86,6 +111,9 @@ class BorrowType(DjangoObjectType):
         }
         interfaces = (graphene.relay.Node,)
 
+    resolve_book = batch_resolver('book')
+    resolve_patron = batch_resolver('patron')
+
 
 
 # Mutacje
@@ -194,15 +222,35 @@ class BorrowStatusStat(graphene.ObjectType):
     status = graphene.String()
     count = graphene.Int()
 
+# wynik wyszukiwania pełnotekstowego (library.search); id - id obiektu w bazie
+class SearchResultType(graphene.ObjectType):
+    type = graphene.String()
+    id = graphene.ID()
+    title = graphene.String()
+    score = graphene.Float()
+
+# podobna książka (library.recommendations): wynik podobieństwa i liczba wspólnych czytelników
+class SimilarBookType(graphene.ObjectType):
+    book = graphene.Field(lambda: BookType)
+    score = graphene.Float()
+    patrons = graphene.Int()
+
+# punkt szeregu czasowego wypożyczeń (library.rollups); key/name - wartość grupowania (groupBy)
+class BorrowTimeseriesPoint(graphene.ObjectType):
+    period = graphene.Date()
+    key = graphene.String()
+    name = graphene.String()
+    count = graphene.Int()
+
 
 
 class Query(graphene.ObjectType):
-    all_books = DjangoFilterConnectionField(BookType)
-    all_authors = DjangoFilterConnectionField(AuthorType)
-    all_publishers = DjangoFilterConnectionField(PublisherType)
-    all_categories = DjangoFilterConnectionField(CategoryType)
-    all_patrons = DjangoFilterConnectionField(PatronType)
-    all_borrows = DjangoFilterConnectionField(BorrowType)
+    all_books = BatchedConnectionField(BookType)
+    all_authors = BatchedConnectionField(AuthorType)
+    all_publishers = BatchedConnectionField(PublisherType)
+    all_categories = BatchedConnectionField(CategoryType)
+    all_patrons = BatchedConnectionField(PatronType)
+    all_borrows = BatchedConnectionField(BorrowType)
 
     # pobranie pojedynczego obiektu po Node ID
     book = graphene.relay.Node.Field(BookType)
@@ -222,6 +270,31 @@ class Query(graphene.ObjectType):
     publication_year_stats = graphene.Field(PublicationYearStats)
     # pobranie statystyk wypożyczeń
     borrow_status_stats = graphene.List(BorrowStatusStat)
+    # wyszukiwanie pełnotekstowe w książkach, autorach i czytelnikach
+    search = graphene.List(
+        SearchResultType,
+        query=graphene.String(required=True),
+        types=graphene.List(graphene.String),
+        first=graphene.Int(default_value=search_index.DEFAULT_LIMIT),
+    )
+    # "czytelnicy tej książki wypożyczali też" - najbardziej podobne książki
+    similar_books = graphene.List(
+        SimilarBookType,
+        book_id=graphene.ID(required=True),
+        first=graphene.Int(default_value=recommendations.DEFAULT_LIMIT),
+    )
+    # szereg czasowy liczby wypożyczeń z agregatów (dzień/miesiąc), opcjonalnie grupowany
+    borrow_timeseries = graphene.List(
+        BorrowTimeseriesPoint,
+        period=graphene.String(default_value='month'),
+        group_by=graphene.String(),
+        start=graphene.Date(),
+        end=graphene.Date(),
+        category=graphene.Int(),
+        publisher=graphene.Int(),
+        patron=graphene.Int(),
+        status=graphene.String(),
+    )
 
     def resolve_book_count(self, info):
         queryset = Book.objects.all()
@@ -231,12 +304,12 @@ class Query(graphene.ObjectType):
         return BookCount(count=total)
 
     def resolve_category_stats(self, info):
-        # słownik z danymi
-        qs = (
+        # słownik z danymi (z cache'u, unieważnianego przy zmianach kategorii i książek)
+        qs = cached('graphql_category_stats', (Category, Book), lambda: list(
             Category.objects
             .annotate(book_count=Count('books'))
             .values('id', 'name', 'book_count')
-        )
+        ))
 
         # zamieniamy słownik na listę obiektów
         stats_list = []
@@ -252,12 +325,10 @@ class Query(graphene.ObjectType):
 
 
     def resolve_book_stats(self, info):
-        # słownik z danymi
-        qs = (
-            Book.objects
-            .annotate(borrow_count=Count('borrows'))
-            .values('id', 'title', 'publication_year', 'borrow_count')
-        )
+        # słownik z danymi (borrow_count zmienia się razem z wypożyczeniami)
+        qs = cached('graphql_book_stats', (Book, Borrow), lambda: list(
+            Book.objects.values('id', 'title', 'publication_year', 'borrow_count')
+        ))
 
         # zamieniamy słownik na listę obiektów
         stats_list = []
@@ -290,15 +361,40 @@ class Query(graphene.ObjectType):
         )
 
     def resolve_publication_year_stats(self, info):
-        stats = Book.objects.aggregate(
+        stats = cached('graphql_publication_year_stats', (Book,), lambda: Book.objects.aggregate(
             min_year=Min("publication_year"),
             max_year=Max("publication_year")
-        )
+        ))
         return PublicationYearStats(
             min_year=stats["min_year"],
             max_year=stats["max_year"]
         )
 
+    def resolve_search(self, info, query, types=None, first=search_index.DEFAULT_LIMIT):
+        unknown = [kind for kind in types or () if kind not in search_index.KINDS]
+        if unknown:
+            raise GraphQLError(f"Nieznany typ: {', '.join(unknown)}. Dozwolone: {', '.join(search_index.KINDS)}.")
+        return [SearchResultType(**result) for result in search_index.search(query, types, first)]
+
+    def resolve_similar_books(self, info, book_id, first=recommendations.DEFAULT_LIMIT):
+        try:
+            book_id = int(book_id)
+        except ValueError:
+            raise GraphQLError("bookId musi być liczbą całkowitą.")
+        neighbors = recommendations.similar_books(book_id, first)
+        books = Book.objects.in_bulk([pk for pk, _, _ in neighbors])
+        return [
+            SimilarBookType(book=books[pk], score=score, patrons=patrons)
+            for pk, score, patrons in neighbors
+            if pk in books
+        ]
+
+    def resolve_borrow_timeseries(self, info, **kwargs):
+        params = BorrowTimeseriesQuerySerializer(data={name: value for name, value in kwargs.items() if value is not None})
+        if not params.is_valid():
+            raise GraphQLError(' '.join(f"{field}: {' '.join(map(str, errors))}" for field, errors in params.errors.items()))
+        return [BorrowTimeseriesPoint(**point) for point in rollups.timeseries(**params.validated_data)]
+
     def resolve_borrow_status_stats(self, info):
         stats = (
             Borrow.objects
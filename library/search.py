@@ -0,0 +1,192 @@
+import re
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import Q
+
+from .models import Author, Book, Patron, SearchDocument
+
+# Wyszukiwanie pełnotekstowe (GET /api/search/, pole GraphQL search). Dokumenty indeksu
+# (SearchDocument) są aktualizowane przez sygnały i operacje zbiorcze, a przeszukiwane przez:
+# - SQLite: tabelę FTS5 (external content) aktualizowaną triggerami, ranking bm25,
+# - PostgreSQL: kolumnę tsvector z indeksem GIN, ranking ts_rank,
+# - inne bazy (albo SQLite bez FTS5): zwykłe filtrowanie icontains bez rankingu.
+# Tabela FTS, triggery i kolumna tsvector powstają w migracji 0011_search_document.
+
+FTS_TABLE = 'library_search_fts'
+
+KINDS = ('book', 'author', 'patron')
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+MAX_TERMS = 8
+# krótszy prefiks (np. "a*") nie ma indeksu prefiksów - ostatnie słowo jest wtedy szukane w całości
+MIN_PREFIX = 2
+REBUILD_BATCH_SIZE = 2000
+
+# waga tytułu względem pozostałej treści dokumentu w rankingu
+TITLE_WEIGHT = 10.0
+
+TERM = re.compile(r'\w+')
+ISBN_HYPHEN = re.compile(r'(?<=\d)-(?=\d)')
+
+_fts_tables = {}
+
+
+# Słowa zapytania; ISBN z myślnikami (978-83-...) jest jednym słowem
+def terms(query):
+    return TERM.findall(ISBN_HYPHEN.sub('', query.lower()))[:MAX_TERMS]
+
+
+# Dokumenty książek z kolumn (bez obiektów modeli) - dwa zapytania na paczkę
+def book_documents(ids):
+    authors = defaultdict(list)
+    rows = Book.authors.through.objects.filter(book_id__in=ids).values_list(
+        'book_id', 'author__first_name', 'author__last_name').order_by('pk')
+    for book_id, first_name, last_name in rows:
+        authors[book_id].append(f'{first_name} {last_name}')
+
+    books = Book.objects.filter(pk__in=ids).values_list(
+        'pk', 'title', 'publisher__name', 'category__name', 'detail__isbn')
+    return [
+        SearchDocument(
+            kind='book', object_id=pk, title=title,
+            body=' '.join(filter(None, [*authors[pk], publisher, category, isbn])),
+        )
+        for pk, title, publisher, category, isbn in books
+    ]
+
+
+def author_documents(ids):
+    return [
+        SearchDocument(kind='author', object_id=author.pk, title=author.full_name, body=author.nationality)
+        for author in Author.objects.filter(pk__in=ids)
+    ]
+
+
+def patron_documents(ids):
+    return [
+        SearchDocument(kind='patron', object_id=patron.pk, title=patron.full_name, body=patron.library_card_number)
+        for patron in Patron.objects.filter(pk__in=ids)
+    ]
+
+
+DOCUMENTS = {'book': book_documents, 'author': author_documents, 'patron': patron_documents}
+MODELS = {'book': Book, 'author': Author, 'patron': Patron}
+
+
+# Odświeża dokumenty obiektów o podanych id (usunięte obiekty znikają z indeksu)
+def index(kind, ids):
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        return
+    with transaction.atomic():
+        remove(kind, ids)
+        SearchDocument.objects.bulk_create(DOCUMENTS[kind](ids), batch_size=REBUILD_BATCH_SIZE)
+
+
+def remove(kind, ids):
+    SearchDocument.objects.filter(kind=kind, object_id__in=list(ids)).delete()
+
+
+# Buduje indeks od zera (komenda rebuild_search_index, po generate_data)
+def rebuild(batch_size=REBUILD_BATCH_SIZE):
+    with transaction.atomic():
+        SearchDocument.objects.all().delete()
+        for kind, model in MODELS.items():
+            ids = list(model.objects.order_by('pk').values_list('pk', flat=True))
+            for start in range(0, len(ids), batch_size):
+                SearchDocument.objects.bulk_create(DOCUMENTS[kind](ids[start:start + batch_size]))
+        if backend() == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+    return SearchDocument.objects.count()
+
+
+def backend():
+    if connection.vendor == 'postgresql':
+        return 'postgresql'
+    if connection.vendor == 'sqlite':
+        name = connection.settings_dict['NAME']
+        if name not in _fts_tables:
+            _fts_tables[name] = FTS_TABLE in connection.introspection.table_names()
+        if _fts_tables[name]:
+            return 'sqlite'
+    return None
+
+
+def prefix(words):
+    return len(words[-1]) >= MIN_PREFIX
+
+
+# Słowa muszą wystąpić w tytule lub treści dokumentu; ostatnie jako prefiks (wyszukiwanie
+# w trakcie pisania). Typy filtrowane w samym MATCH.
+def fts_query(words, kinds=None):
+    query = '{title body}: (' + ' '.join(f'"{word}"' for word in words) + ('*' if prefix(words) else '') + ')'
+    if kinds:
+        query = '{kind}: (' + ' OR '.join(f'"{kind}"' for kind in kinds) + ') AND ' + query
+    return query
+
+
+def tsquery(words):
+    return ' & '.join(f"'{word}'" for word in words) + (':*' if prefix(words) else '')
+
+
+def kinds_filter(kinds, column):
+    if not kinds:
+        return '', []
+    return f' AND {column} IN ({", ".join(["%s"] * len(kinds))})', list(kinds)
+
+
+# Ranking wszystkich trafień; ORDER BY ... LIMIT w zapytaniu do tabeli FTS pozwala SQLite
+# trzymać tylko `limit` najlepszych wierszy (sortowanie top-N), a dokumenty są czytane
+# tylko dla wyników. ORDER BY rank (z wagami w konfiguracji rank tabeli) był w pomiarach
+# na 1 mln wypożyczeń (255 tys. dokumentów) o 20-35% wolniejszy - FTS5 sortuje wtedy
+# wszystkie trafienia.
+def search_sqlite(words, kinds, limit):
+    sql = (
+        f'SELECT kind, object_id, title, score FROM ('
+        f'SELECT rowid, -bm25({FTS_TABLE}, 0.0, %s, 1.0) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+        f'ORDER BY score DESC LIMIT %s'
+        f') ranked JOIN {SearchDocument._meta.db_table} ON id = ranked.rowid '
+        f'ORDER BY score DESC'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [TITLE_WEIGHT, fts_query(words, kinds), limit])
+        return cursor.fetchall()
+
+
+# Ranking wszystkich trafień (sortowanie top-N po ts_rank)
+def search_postgresql(words, kinds, limit):
+    condition, params = kinds_filter(kinds, 'kind')
+    sql = (
+        f'SELECT kind, object_id, title, ts_rank(search_vector, query) AS score '
+        f"FROM {SearchDocument._meta.db_table}, to_tsquery('simple', %s) query "
+        f'WHERE search_vector @@ query{condition} ORDER BY score DESC LIMIT %s'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [tsquery(words), *params, limit])
+        return cursor.fetchall()
+
+
+def search_fallback(words, kinds, limit):
+    queryset = SearchDocument.objects.all()
+    for word in words:
+        queryset = queryset.filter(Q(title__icontains=word) | Q(body__icontains=word))
+    if kinds:
+        queryset = queryset.filter(kind__in=kinds)
+    return [(*row, 0.0) for row in queryset.order_by('title').values_list('kind', 'object_id', 'title')[:limit]]
+
+
+SEARCHES = {'sqlite': search_sqlite, 'postgresql': search_postgresql, None: search_fallback}
+
+
+# Wyniki od najlepiej dopasowanych: [{'type', 'id', 'title', 'score'}]
+def search(query, kinds=None, limit=DEFAULT_LIMIT):
+    words = terms(query)
+    if not words:
+        return []
+    rows = SEARCHES[backend()](words, kinds, max(1, min(limit, MAX_LIMIT)))
+    return [
+        {'type': kind, 'id': object_id, 'title': title, 'score': round(score, 4)}
+        for kind, object_id, title, score in rows
+    ]
@@ -0,0 +1,100 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from . import autocomplete, datagen, rollups, search, versions
+from .counters import rebuild_counters
+from .models import Author, Book, BookDetails, Borrow, BorrowRollup, Category, Patron, Publisher, SearchDocument
+
+# Modele danych biblioteki w kolejności zapisu (tabele wskazywane kluczami obce najpierw)
+MODELS = {
+    'publisher': Publisher,
+    'category': Category,
+    'author': Author,
+    'patron': Patron,
+    'book': Book,
+    'bookdetails': BookDetails,
+    'book_authors': Book.authors.through,
+    'borrow': Borrow,
+}
+
+DATA_MODELS = (Publisher, Category, Author, Patron, Book, BookDetails, Borrow)
+
+
+# Usuwa dane biblioteki i zeruje liczniki id - SQL z connection.ops.sql_flush,
+# więc działa na każdej bazie (TRUNCATE na PostgreSQL/MySQL, DELETE + sqlite_sequence na SQLite)
+def flush_library_data():
+    tables = [model._meta.db_table for model in (*MODELS.values(), SearchDocument, BorrowRollup)]
+    sql_list = connection.ops.sql_flush(no_style(), tables, reset_sequences=True, allow_cascade=True)
+    connection.ops.execute_sql_flush(sql_list)
+    versions.models_changed(*DATA_MODELS)
+    autocomplete.invalidate()
+
+
+# Ustawia sekwencje id za największym wstawionym id (po zapisie z jawnymi id)
+def reset_sequences():
+    sql_list = connection.ops.sequence_reset_sql(no_style(), list(MODELS.values()))
+    if sql_list:
+        with connection.cursor() as cursor:
+            for sql in sql_list:
+                cursor.execute(sql)
+
+
+def insert_rows(rows):
+    with transaction.atomic():
+        for key, items in rows.items():
+            model = MODELS[key]
+            model.objects.bulk_create([model(**item) for item in items])
+
+
+# Paczki id [start, stop) dla tabeli - rozmiar paczki zaokrąglony do wielokrotności bloku generatora
+def chunk_ranges(total, chunk_size):
+    chunk_size = max(datagen.BLOCK_SIZE, chunk_size // datagen.BLOCK_SIZE * datagen.BLOCK_SIZE)
+    return [(start, min(start + chunk_size, total + 1)) for start in range(1, total + 1, chunk_size)]
+
+
+# Wyniki paczek w kolejności; w toku jest najwyżej 2 * workers paczek, więc pamięć procesu
+# głównego nie rośnie, gdy generowanie jest szybsze od zapisu do bazy
+def generated_chunks(pool, table, ranges, workers):
+    if pool is None:
+        for start, stop in ranges:
+            yield datagen.generate_chunk(table, start, stop)
+        return
+    pending = deque()
+    for start, stop in ranges:
+        pending.append(pool.submit(datagen.generate_chunk, table, start, stop))
+        if len(pending) >= 2 * workers:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+# Generuje i zapisuje dane wg konfiguracji datagen.Config. Procesy robocze tylko generują
+# wiersze; zapis (bulk_create) wykonuje proces główny, paczka w jednej transakcji.
+def generate(config, chunk_size=10000, workers=1, progress=None):
+    flush_library_data()
+    datagen.init_worker(config)
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(workers, initializer=datagen.init_worker, initargs=(config,))
+    try:
+        for table in datagen.TABLES:
+            total = getattr(config, table)
+            done = 0
+            for rows in generated_chunks(pool, table, chunk_ranges(total, chunk_size), workers):
+                insert_rows(rows)
+                done += len(next(iter(rows.values())))
+                if progress:
+                    progress(table, done, total)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    reset_sequences()
+    rebuild_counters()
+    rollups.rebuild()
+    search.rebuild()
+    versions.models_changed(*DATA_MODELS)
+    autocomplete.invalidate()
@@ -1,9 +1,7 @@
 from rest_framework import serializers
-from django.core.files import File
-from pathlib import Path
 
-from django.conf import settings
 from .models import Publisher, Category, Author, Book, BookDetails, Patron, Borrow
+from . import images, media, rollups
 
 
 # --------------------
@@ -42,6 +40,12 @@ class BookSerializer(serializers.ModelSerializer):
         write_only=True)
     borrow_count = serializers.IntegerField(read_only=True)
 
+    # relacje pobierane razem z książką (patrz views.mixins.optimize_queryset)
+    required_relations = {
+        'select_related': ['category', 'publisher'],
+        'prefetch_related': ['authors'],
+    }
+
     class Meta:
         model = Book
         fields = [
@@ -50,6 +54,12 @@ class BookSerializer(serializers.ModelSerializer):
 
 class BookDetailsSerializer(serializers.ModelSerializer):
     book = BookSerializer(read_only=True)
+    cover_variants = serializers.SerializerMethodField()
+
+    required_relations = {
+        'select_related': ['book__category', 'book__publisher'],
+        'prefetch_related': ['book__authors'],
+    }
 
     class Meta:
         model = BookDetails
@@ -58,12 +68,17 @@ class BookDetailsSerializer(serializers.ModelSerializer):
             'book',
             'isbn',
             'pages',
-            'cover_image'
+            'cover_image',
+            'cover_variants',
         ]
         extra_kwargs = {
             'cover_image': {'required': False}
         }
 
+    # adresy miniatur/WebP - klient wybiera najmniejszy wystarczający wariant
+    def get_cover_variants(self, obj):
+        return images.variant_urls(obj.cover_variants, self.context.get('request'))
+
 class PatronSerializer(serializers.ModelSerializer):
     full_name = serializers.ReadOnlyField()
     class Meta:
@@ -82,6 +97,11 @@ class BorrowSerializer(serializers.ModelSerializer):
         source='patron',
         write_only=True)
 
+    required_relations = {
+        'select_related': ['book__category', 'book__publisher', 'patron'],
+        'prefetch_related': ['book__authors'],
+    }
+
     class Meta:
         model = Borrow
         fields = ['id', 'book', 'book_id', 'patron', 'patron_id',
@@ -128,20 +148,22 @@ class BookDetailsCreateUpdateSerializer(serializers.ModelSerializer):
             'cover_image': {'required': False}
         }
 
+    # ścieżka względem MEDIA_ROOT -> ścieżka pliku (bez wychodzenia poza MEDIA_ROOT)
+    def validate_cover_image_from_upload(self, value):
+        path = media.media_file(value)
+        if path is None:
+            raise serializers.ValidationError("Nie znaleziono pliku w katalogu mediów.")
+        return path
+
+    # plik z uploads/ nie jest kopiowany przez File(...) - okładka o tej samej treści
+    # jest używana ponownie, nowa powstaje jako kopia strumieniowa (library.media.store_cover)
     def create(self, validated_data):
         image_path = validated_data.pop('cover_image_from_upload', None)
         instance = BookDetails(**validated_data)
-
         if image_path:
-            file_path = Path(settings.MEDIA_ROOT) / image_path
-            with open(file_path, 'rb') as f:
-                instance.cover_image = File(f, name=Path(image_path).name)
-                instance.save()
-
-            return instance
-        else:
-            instance.save()
-            return instance
+            instance.cover_image = media.store_cover(image_path)
+        instance.save()
+        return instance
 
     def update(self, instance, validated_data):
         image_path = validated_data.pop('cover_image_from_upload', None)
@@ -153,14 +175,9 @@ class BookDetailsCreateUpdateSerializer(serializers.ModelSerializer):
         instance.cover_image = validated_data.get('cover_image', instance.cover_image)
 
         if image_path:
-            file_path = Path(settings.MEDIA_ROOT) / image_path
-            with open(file_path, 'rb') as f:
-                instance.cover_image = File(f, name=Path(image_path).name)
-                instance.save()
-            return instance
-        else:
-            instance.save()
-            return instance
+            instance.cover_image = media.store_cover(image_path)
+        instance.save()
+        return instance
 
 class PatronCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -171,3 +188,44 @@ class BorrowCreateUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Borrow
         fields = ['id', 'patron', 'book', 'borrow_date', 'due_date', 'return_date', 'status']
+
+
+# Serializery pojedynczej pozycji zapisu zbiorczego (library.bulk).
+# Klucze obce przyjmowane są jako liczby - ich istnienie sprawdza library.bulk jednym
+# zapytaniem na model dla całej paczki, zamiast zapytania na każdą pozycję.
+class BorrowBulkItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+    patron = serializers.IntegerField(source='patron_id')
+    book = serializers.IntegerField(source='book_id')
+
+    class Meta:
+        model = Borrow
+        fields = ['id', 'patron', 'book', 'borrow_date', 'due_date', 'return_date', 'status']
+
+
+class BookBulkItemSerializer(serializers.ModelSerializer):
+    id = serializers.IntegerField(required=False)
+    publisher = serializers.IntegerField(source='publisher_id')
+    category = serializers.IntegerField(source='category_id', required=False, allow_null=True)
+    authors = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    class Meta:
+        model = Book
+        fields = ['id', 'title', 'publisher', 'publication_year', 'category', 'authors']
+
+
+# Parametry szeregu czasowego wypożyczeń (library.rollups) - REST i GraphQL
+class BorrowTimeseriesQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=rollups.PERIODS, default='month')
+    group_by = serializers.ChoiceField(choices=rollups.GROUPS, required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    category = serializers.IntegerField(required=False, min_value=0)
+    publisher = serializers.IntegerField(required=False, min_value=1)
+    patron = serializers.IntegerField(required=False, min_value=1)
+    status = serializers.ChoiceField(choices=Borrow.STATUS_CHOICES, required=False)
+
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'end': ["Koniec zakresu nie może być wcześniejszy niż początek."]})
+        return attrs
@@ -0,0 +1,257 @@
+import threading
+from contextlib import contextmanager
+
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Publisher, Category, Author, Book, BookDetails, Patron, Borrow
+from . import autocomplete, counters, images, rollups, search, versions
+
+# modele śledzone przez cache odpowiedzi (library.cache) i wersje tabel (library.versions)
+TRACKED_MODELS = (Publisher, Category, Author, Book, BookDetails, Patron, Borrow)
+
+_state = threading.local()
+
+
+# Operacje zbiorcze (library.bulk) same aktualizują liczniki i wersje tabel -
+# na czas ich trwania obsługa sygnałów per wiersz jest wyłączona
+@contextmanager
+def bulk_changes():
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def suspended():
+    return getattr(_state, 'suspended', False)
+
+
+# Wypożyczenie zapisywane bez wcześniejszego odczytu z bazy (np. Borrow(id=...).save())
+# - pobieramy jego poprzedni stan, żeby poprawnie policzyć zmiany liczników
+@receiver(pre_save, sender=Borrow)
+def borrow_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or suspended() or instance.pk is None or hasattr(instance, '_loaded_state'):
+        return
+    instance._loaded_state = (
+        Borrow.objects
+        .filter(pk=instance.pk)
+        .values_list('book_id', 'patron_id', 'status', 'borrow_date')
+        .first()
+    )
+
+
+@receiver(post_save, sender=Borrow)
+def borrow_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or suspended():
+        return
+    old_state = None if created else getattr(instance, '_loaded_state', None)
+    new_state = instance.counter_state()
+    counters.apply_changes([(old_state, new_state)])
+    instance._loaded_state = new_state
+
+
+@receiver(post_delete, sender=Borrow)
+def borrow_deleted(sender, instance, **kwargs):
+    if suspended():
+        return
+    old_state = getattr(instance, '_loaded_state', None) or instance.counter_state()
+    counters.apply_changes([(old_state, None)])
+    instance._loaded_state = None
+
+
+# Agregaty wypożyczeń (library.rollups) są liczone według kategorii i wydawcy książki,
+# a licznik total_borrows według wydawcy - po ich zmianie wypożyczenia książki przechodzą
+# do innych wierszy agregatów i do licznika nowego wydawcy
+@receiver(pre_save, sender=Book)
+def book_pre_save_rollups(sender, instance, raw=False, **kwargs):
+    if raw or suspended() or instance.pk is None:
+        return
+    instance._rollup_dimensions = Book.objects.filter(pk=instance.pk).values_list('category_id', 'publisher_id').first()
+
+
+@receiver(post_save, sender=Book)
+def book_saved_rollups(sender, instance, created, raw=False, **kwargs):
+    if raw or suspended():
+        return
+    dimensions = instance.__dict__.pop('_rollup_dimensions', None)
+    if dimensions is not None and dimensions != (instance.category_id, instance.publisher_id):
+        rollups.move_books({instance.pk: dimensions})
+        counters.move_books({instance.pk: dimensions})
+
+
+# Usunięcie kategorii ustawia category = NULL bez sygnałów dla książek
+@receiver(pre_delete, sender=Category)
+def category_pre_delete_rollups(sender, instance, **kwargs):
+    if not suspended():
+        instance._rollup_books = {
+            pk: (instance.pk, publisher_id)
+            for pk, publisher_id in instance.books.values_list('pk', 'publisher_id')
+        }
+
+
+@receiver(post_delete, sender=Category)
+def category_deleted_rollups(sender, instance, **kwargs):
+    if not suspended():
+        rollups.move_books(instance.__dict__.pop('_rollup_books', {}))
+
+
+def model_changed(sender, raw=False, **kwargs):
+    if not raw and not suspended():
+        versions.models_changed(sender)
+
+
+for model in TRACKED_MODELS:
+    post_save.connect(model_changed, sender=model, dispatch_uid=f'cache-save-{model._meta.label_lower}')
+    post_delete.connect(model_changed, sender=model, dispatch_uid=f'cache-delete-{model._meta.label_lower}')
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def book_authors_changed(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and not suspended():
+        versions.models_changed(Book, Author)
+
+
+# Nowa lub usunięta okładka - warianty (miniatury, WebP) generowane w tle (library.images)
+@receiver(post_save, sender=BookDetails)
+def cover_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    source = instance.cover_image.name if instance.cover_image else ''
+    if instance.cover_variants.get('source', '') != source:
+        images.cover_changed(instance)
+
+
+# Indeks wyszukiwania (library.search). Operacje zbiorcze odświeżają go same.
+@receiver(post_save, sender=Book)
+def book_saved_search(sender, instance, raw=False, **kwargs):
+    if not raw and not suspended():
+        search.index('book', [instance.pk])
+
+
+@receiver(post_delete, sender=Book)
+def book_deleted_search(sender, instance, **kwargs):
+    if not suspended():
+        search.remove('book', [instance.pk])
+
+
+@receiver(post_save, sender=BookDetails)
+@receiver(post_delete, sender=BookDetails)
+def details_changed_search(sender, instance, raw=False, **kwargs):
+    if not raw and not suspended():
+        search.index('book', [instance.book_id])
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def book_authors_changed_search(sender, instance, action, reverse, pk_set, **kwargs):
+    if suspended():
+        return
+    if action == 'pre_clear' and reverse:
+        instance._search_books = list(instance.books.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            search.index('book', [instance.pk])
+        else:
+            search.index('book', pk_set if action != 'post_clear' else instance.__dict__.pop('_search_books', []))
+
+
+# Nazwy autorów, wydawców i kategorii są częścią dokumentów książek - po zmianie nazwy
+# (porównanie ze stanem w bazie przed zapisem) odświeżane są dokumenty ich książek
+SEARCH_NAME_FIELDS = {
+    Author: ('first_name', 'last_name'),
+    Publisher: ('name',),
+    Category: ('name',),
+}
+
+
+def name_pre_save_search(sender, instance, raw=False, **kwargs):
+    if raw or suspended() or instance.pk is None:
+        return
+    fields = SEARCH_NAME_FIELDS[sender]
+    instance._search_names = sender.objects.filter(pk=instance.pk).values_list(*fields).first()
+
+
+def name_saved_search(sender, instance, created, raw=False, **kwargs):
+    if raw or suspended():
+        return
+    if sender is Author:
+        search.index('author', [instance.pk])
+    names = tuple(getattr(instance, field) for field in SEARCH_NAME_FIELDS[sender])
+    if not created and instance.__dict__.pop('_search_names', names) != names:
+        search.index('book', instance.books.values_list('pk', flat=True))
+
+
+# Usunięcie autora/kategorii nie wywołuje sygnałów dla książek (CASCADE w tabeli
+# pośredniej, SET_NULL) - id książek są zapamiętywane przed usunięciem
+def name_pre_delete_search(sender, instance, **kwargs):
+    if not suspended():
+        instance._search_books = list(instance.books.values_list('pk', flat=True))
+
+
+def name_deleted_search(sender, instance, **kwargs):
+    if suspended():
+        return
+    if sender is Author:
+        search.remove('author', [instance.pk])
+    search.index('book', instance.__dict__.pop('_search_books', []))
+
+
+for model in SEARCH_NAME_FIELDS:
+    label = model._meta.label_lower
+    pre_save.connect(name_pre_save_search, sender=model, dispatch_uid=f'search-pre-save-{label}')
+    post_save.connect(name_saved_search, sender=model, dispatch_uid=f'search-save-{label}')
+    pre_delete.connect(name_pre_delete_search, sender=model, dispatch_uid=f'search-pre-delete-{label}')
+    post_delete.connect(name_deleted_search, sender=model, dispatch_uid=f'search-delete-{label}')
+
+
+@receiver(post_save, sender=Patron)
+def patron_saved_search(sender, instance, raw=False, **kwargs):
+    if not raw and not suspended():
+        search.index('patron', [instance.pk])
+
+
+@receiver(post_delete, sender=Patron)
+def patron_deleted_search(sender, instance, **kwargs):
+    if not suspended():
+        search.remove('patron', [instance.pk])
+
+
+# Podpowiedzi (library.autocomplete): tytuły książek, imiona i nazwiska autorów, numery kart.
+# Indeks procesu jest aktualizowany od razu, pozostałe procesy wykrywają zmianę wersji -
+# tylko gdy etykieta różni się od stanu w bazie przed zapisem (np. zmiana samego roku
+# wydania nie wymusza przebudowy indeksów w innych procesach).
+AUTOCOMPLETE_LABELS = {
+    Book: ('book', lambda book: book.title),
+    Author: ('author', lambda author: author.full_name),
+    Patron: ('patron', lambda patron: patron.library_card_number),
+}
+
+
+def autocomplete_pre_save(sender, instance, raw=False, **kwargs):
+    if raw or suspended() or instance.pk is None:
+        return
+    kind = AUTOCOMPLETE_LABELS[sender][0]
+    instance._autocomplete_label = autocomplete.current_labels(kind, [instance.pk]).get(instance.pk)
+
+
+def autocomplete_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or suspended():
+        return
+    kind, label = AUTOCOMPLETE_LABELS[sender]
+    previous = instance.__dict__.pop('_autocomplete_label', None)
+    if created or previous != label(instance):
+        autocomplete.object_changed(kind, instance.pk, label(instance))
+
+
+def autocomplete_deleted(sender, instance, **kwargs):
+    if not suspended():
+        autocomplete.object_deleted(AUTOCOMPLETE_LABELS[sender][0], instance.pk)
+
+
+for model in AUTOCOMPLETE_LABELS:
+    label = model._meta.label_lower
+    pre_save.connect(autocomplete_pre_save, sender=model, dispatch_uid=f'autocomplete-pre-save-{label}')
+    post_save.connect(autocomplete_saved, sender=model, dispatch_uid=f'autocomplete-save-{label}')
+    post_delete.connect(autocomplete_deleted, sender=model, dispatch_uid=f'autocomplete-delete-{label}')
@@ -1,12 +1,44 @@
 # library/tests.py
 
-from django.test import TestCase
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from PIL import Image
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import F, Sum
+from rest_framework.test import APIClient
 from django.core.exceptions import ValidationError
 from django.utils import timezone
-from datetime import timedelta, date
+from datetime import date, datetime, timedelta, timezone as dt_timezone
 
+from library import benchmark
+from library import metrics
+from library import cache as library_cache
+from library.cache import get_cache
+from library.counters import update_borrows
+from library.graphql_view import persisted_queries
+from library.importers import ChunkedImporter
+from library.middleware import RequestMetrics, query_shape
+from library.management.commands import cleanup_covers
+from library.overdue import mark_overdue
+from library import analytics, autocomplete, recommendations, rollups, search
+from library import images
+from library.schema import schema
 from library.models import (
-    Publisher, Category, Author, Book, Patron, Borrow
+    Publisher, Category, Author, Book, BookDetails, Patron, Borrow, BorrowRollup, ImportCheckpoint, JobRun,
+    SearchDocument,
 )
 
 
@@ -99,3 +131,1710 @@ class ModelTests(TestCase):
             due_date=date.today() - timedelta(days=10),     # spóźnione o 10 dni
         )
         self.assertTrue(borrow.is_overdue())
+
+
+class QueryCountTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = Publisher.objects.create(name="Helion")
+        self.category = Category.objects.create(name="Programowanie")
+        self.patron = Patron.objects.create(library_card_number="000001", first_name="Jan", last_name="Kowalski")
+
+    # dodaje `count` książek (każda z dwoma autorami i jednym wypożyczeniem)
+    def add_books(self, count):
+        start = Book.objects.count()
+        for i in range(start, start + count):
+            book = Book.objects.create(title=f"Książka {i}", publisher=self.publisher,
+                                       publication_year=2000 + i, category=self.category)
+            book.authors.add(
+                Author.objects.create(first_name="A", last_name=f"Autor {i}", nationality="PL"),
+                Author.objects.create(first_name="B", last_name=f"Autor {i}", nationality="PL"),
+            )
+            Borrow.objects.create(patron=self.patron, book=book)
+
+    # zwraca liczbę zapytań wykonanych przy obsłudze żądania GET
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    # liczba zapytań nie może zależeć od liczby zwracanych wierszy
+    def assert_constant_queries(self, url):
+        self.add_books(2)
+        few = self.count_queries(url)
+        self.add_books(10)
+        many = self.count_queries(url)
+        self.assertEqual(few, many)
+
+    def test_book_list_query_count_is_constant(self):
+        self.assert_constant_queries("/api/books/")
+
+    def test_borrow_list_query_count_is_constant(self):
+        self.assert_constant_queries("/api/borrows/")
+
+    def test_bookdetails_list_query_count_is_constant(self):
+        self.add_books(2)
+        for book in Book.objects.all():
+            BookDetails.objects.create(book=book, isbn=f"978{book.id:010d}")
+        few = self.count_queries("/api/bookdetails/")
+        self.add_books(10)
+        for book in Book.objects.filter(detail__isnull=True):
+            BookDetails.objects.create(book=book, isbn=f"978{book.id:010d}")
+        self.assertEqual(few, self.count_queries("/api/bookdetails/"))
+
+    def test_publisher_books_query_count_is_constant(self):
+        self.assert_constant_queries(f"/api/publishers/{self.publisher.id}/books/")
+
+    def test_patron_borrows_query_count_is_constant(self):
+        self.assert_constant_queries(f"/api/patrons/{self.patron.id}/borrows/")
+
+
+class BorrowStatsTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        publisher = Publisher.objects.create(name="PWN")
+        book = Book.objects.create(title="Pan Tadeusz", publisher=publisher, publication_year=1834)
+        patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+        for status in ['active', 'active', 'overdue', 'returned', 'lost']:
+            Borrow.objects.create(patron=patron, book=book, status=status, return_date=date.today())
+
+    def test_stats_endpoint_uses_single_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/borrows/stats/")
+        self.assertEqual(response.json()["stats"], {
+            "total_borrows": 5, "active": 2, "overdue": 1, "returned": 1, "lost": 1,
+        })
+
+    def test_list_includes_stats(self):
+        data = self.client.get("/api/borrows/").json()
+        self.assertEqual(data["stats"], {"total_borrows": 5, "active": 2, "overdue": 1, "returned": 1})
+        self.assertEqual(len(data["results"]), 5)
+
+    def test_list_without_stats(self):
+        data = self.client.get("/api/borrows/?stats=false").json()
+        self.assertNotIn("stats", data)
+        self.assertEqual(len(data["results"]), 5)
+
+    def test_list_stats_only(self):
+        # wersje tabel (ETag) + jedno zapytanie agregujące
+        with self.assertNumQueries(2):
+            data = self.client.get("/api/borrows/?stats_only=true&status=active").json()
+        self.assertEqual(data, {"stats": {"total_borrows": 2, "active": 2, "overdue": 0, "returned": 0}})
+
+
+class BorrowCounterTests(TestCase):
+
+    def setUp(self):
+        self.publisher = Publisher.objects.create(name="PWN")
+        self.book = Book.objects.create(title="Pan Tadeusz", publisher=self.publisher, publication_year=1834)
+        self.other_book = Book.objects.create(title="Dziady", publisher=self.publisher, publication_year=1823)
+        self.patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+
+    # sprawdza liczniki (wszystkie, aktywne) książki, czytelnika i łączną liczbę u wydawcy
+    def assert_counters(self, book, patron, publisher_total):
+        self.book.refresh_from_db()
+        self.patron.refresh_from_db()
+        self.publisher.refresh_from_db()
+        self.assertEqual((self.book.borrow_count, self.book.active_borrow_count), book)
+        self.assertEqual((self.patron.borrow_count, self.patron.active_borrow_count), patron)
+        self.assertEqual(self.publisher.total_borrows, publisher_total)
+
+    def test_counters_follow_create_status_change_and_delete(self):
+        borrow = Borrow.objects.create(patron=self.patron, book=self.book)
+        self.assert_counters(book=(1, 1), patron=(1, 1), publisher_total=1)
+
+        borrow = Borrow.objects.get(pk=borrow.pk)
+        borrow.status = 'returned'
+        borrow.return_date = date.today()
+        borrow.save()
+        self.assert_counters(book=(1, 0), patron=(1, 0), publisher_total=1)
+
+        borrow.delete()
+        self.assert_counters(book=(0, 0), patron=(0, 0), publisher_total=0)
+
+    def test_counters_follow_book_change(self):
+        borrow = Borrow.objects.create(patron=self.patron, book=self.book)
+        borrow.book = self.other_book
+        borrow.save()
+        self.assert_counters(book=(0, 0), patron=(1, 1), publisher_total=1)
+        self.other_book.refresh_from_db()
+        self.assertEqual(self.other_book.active_borrow_count, 1)
+
+    def test_counters_follow_publisher_change(self):
+        other_publisher = Publisher.objects.create(name="Znak")
+        Borrow.objects.create(patron=self.patron, book=self.book)
+        client = APIClient()
+
+        response = client.patch(f'/api/books/{self.book.pk}/', {"publisher": other_publisher.pk}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_counters(book=(1, 1), patron=(1, 1), publisher_total=0)
+        other_publisher.refresh_from_db()
+        self.assertEqual(other_publisher.total_borrows, 1)
+
+        response = client.patch('/api/books/bulk/', [{"id": self.book.pk, "publisher": self.publisher.pk}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assert_counters(book=(1, 1), patron=(1, 1), publisher_total=1)
+        other_publisher.refresh_from_db()
+        self.assertEqual(other_publisher.total_borrows, 0)
+
+    def test_saving_stale_instances_keeps_counters(self):
+        borrow = Borrow.objects.create(patron=self.patron, book=self.book)
+        # obiekty odczytane przed wypożyczeniem (liczniki 0 w pamięci)
+        self.book.title = "Pan Tadeusz, czyli ostatni zajazd na Litwie"
+        self.book.save()
+        self.patron.save()
+        self.publisher.save()
+        self.assert_counters(book=(1, 1), patron=(1, 1), publisher_total=1)
+        self.assertEqual(self.book.title, "Pan Tadeusz, czyli ostatni zajazd na Litwie")
+
+        response = APIClient().delete(f'/api/borrows/{borrow.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assert_counters(book=(0, 0), patron=(0, 0), publisher_total=0)
+
+    def test_admin_mark_as_returned_updates_counters(self):
+        from library.admin import mark_as_returned
+
+        Borrow.objects.create(patron=self.patron, book=self.book)
+        Borrow.objects.create(patron=self.patron, book=self.book)
+        mark_as_returned(None, None, Borrow.objects.all())
+        self.assert_counters(book=(2, 0), patron=(2, 0), publisher_total=2)
+
+    def test_rebuild_counters_repairs_drift(self):
+        Borrow.objects.create(patron=self.patron, book=self.book)
+        Book.objects.update(borrow_count=10, active_borrow_count=7)
+        Publisher.objects.update(total_borrows=0)
+
+        call_command("rebuild_counters", stdout=StringIO())
+        self.assert_counters(book=(1, 1), patron=(1, 1), publisher_total=1)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        publisher = Publisher.objects.create(name="PWN")
+        book = Book.objects.create(title="Pan Tadeusz", publisher=publisher, publication_year=1834)
+        patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+        today = date.today()
+        # powtarzające się daty i NULL-e w due_date sprawdzają rozstrzyganie remisów po id
+        for days in [5, 3, 3, 3, 1, 8, 2]:
+            Borrow.objects.create(patron=patron, book=book, borrow_date=today - timedelta(days=40),
+                                  due_date=today + timedelta(days=days))
+        for _ in range(2):
+            Borrow.objects.create(patron=patron, book=book, status='returned', return_date=today)
+
+    # przechodzi po wszystkich stronach (next) i zwraca listę id
+    def collect_ids(self, url):
+        ids, pages = [], []
+        while url:
+            data = self.client.get(url).json()
+            pages.append(data)
+            ids.extend(row["id"] for row in data["results"])
+            url = data["next"]
+        return ids, pages
+
+    def expected_ids(self, *ordering):
+        return list(Borrow.objects.order_by(*ordering).values_list("id", flat=True))
+
+    def test_pages_follow_ordering_without_duplicates(self):
+        ids, pages = self.collect_ids("/api/borrows/?ordering=due_date&page_size=3")
+        self.assertEqual(len(pages), 3)
+        self.assertEqual(ids, self.expected_ids(F("due_date").asc(nulls_last=True), "id"))
+
+    def test_descending_ordering(self):
+        ids, _ = self.collect_ids("/api/borrows/?ordering=-due_date&page_size=2")
+        self.assertEqual(ids, self.expected_ids(F("due_date").desc(nulls_last=True), "-id"))
+
+    def test_previous_link_returns_previous_page(self):
+        first = self.client.get("/api/borrows/?ordering=due_date&page_size=3").json()
+        second = self.client.get(first["next"]).json()
+        back = self.client.get(second["previous"]).json()
+        self.assertEqual(back["results"], first["results"])
+        self.assertIsNone(back["previous"])
+
+    def test_list_keeps_stats(self):
+        data = self.client.get("/api/borrows/?page_size=2").json()
+        self.assertEqual(data["stats"]["total_borrows"], 9)
+        self.assertEqual(len(data["results"]), 2)
+        self.assertIsNotNone(data["next"])
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/api/borrows/?cursor=nieprawidlowy")
+        self.assertEqual(response.status_code, 404)
+
+    # kursor o poprawnym formacie, ale ze złą wartością
+    def get_with_cursor(self, data):
+        cursor = base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+        return self.client.get("/api/borrows/", {"ordering": "due_date", "cursor": cursor})
+
+    def test_cursor_with_invalid_pk(self):
+        self.assertEqual(self.get_with_cursor({"v": "2024-01-01", "pk": "abc", "r": 0}).status_code, 404)
+
+    def test_cursor_with_invalid_value(self):
+        self.assertEqual(self.get_with_cursor({"v": "nie-data", "pk": 1, "r": 0}).status_code, 404)
+
+
+class GraphQLBatchingTests(TestCase):
+
+    BOOKS_QUERY = """
+        query {
+          allBooks {
+            edges { node {
+              title
+              publisher { name }
+              category { name }
+              authors { edges { node { fullName books { edges { node { title } } } } } }
+            } }
+          }
+        }
+    """
+
+    PATRONS_QUERY = """
+        query {
+          allPatrons {
+            edges { node {
+              fullName
+              borrows { edges { node { status book { title publisher { name } } } } }
+            } }
+          }
+        }
+    """
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.category = Category.objects.create(name="Programowanie")
+
+    # dodaje `count` książek, każda z innym wydawcą, dwoma autorami i wypożyczeniem innego czytelnika
+    def add_books(self, count):
+        start = Book.objects.count()
+        for i in range(start, start + count):
+            publisher = Publisher.objects.create(name=f"Wydawca {i}")
+            book = Book.objects.create(title=f"Książka {i}", publisher=publisher,
+                                       publication_year=2000, category=self.category)
+            book.authors.add(
+                Author.objects.create(first_name="A", last_name=f"Autor {i}", nationality="PL"),
+                Author.objects.create(first_name="B", last_name=f"Autor {i}", nationality="PL"),
+            )
+            patron = Patron.objects.create(library_card_number=f"{i:06d}", first_name="Jan", last_name=f"K{i}")
+            Borrow.objects.create(patron=patron, book=book)
+
+    def count_queries(self, query):
+        with CaptureQueriesContext(connection) as ctx:
+            result = schema.execute(query, context_value=self.factory.get("/graphql/"))
+        self.assertIsNone(result.errors)
+        return len(ctx.captured_queries), result.data
+
+    def assert_constant_queries(self, query):
+        self.add_books(2)
+        few, _ = self.count_queries(query)
+        self.add_books(8)
+        many, data = self.count_queries(query)
+        self.assertEqual(few, many)
+        return many, data
+
+    def test_nested_book_query_is_batched(self):
+        queries, data = self.assert_constant_queries(self.BOOKS_QUERY)
+        # count + książki, wydawcy, kategorie, autorzy, książki autorów
+        self.assertEqual(queries, 6)
+        node = data["allBooks"]["edges"][0]["node"]
+        self.assertEqual(len(node["authors"]["edges"]), 2)
+        self.assertEqual(node["authors"]["edges"][0]["node"]["books"]["edges"][0]["node"]["title"], node["title"])
+
+    def test_nested_patron_borrows_query_is_batched(self):
+        queries, data = self.assert_constant_queries(self.PATRONS_QUERY)
+        # count + czytelnicy, wypożyczenia, książki, wydawcy
+        self.assertEqual(queries, 5)
+        self.assertEqual(len(data["allPatrons"]["edges"]), 10)
+
+    def test_filtered_nested_connection_still_filters(self):
+        self.add_books(2)
+        result = schema.execute(
+            '{ allBooks { edges { node { authors(lastName_Icontains: "Autor 0") { edges { node { lastName } } } } } } }',
+            context_value=self.factory.get("/graphql/"),
+        )
+        self.assertIsNone(result.errors)
+        counts = [len(edge["node"]["authors"]["edges"]) for edge in result.data["allBooks"]["edges"]]
+        self.assertEqual(sorted(counts), [0, 2])
+
+
+class GraphQLLimitsTests(TestCase):
+
+    def setUp(self):
+        persisted_queries.clear()
+
+    def post(self, payload):
+        return self.client.post("/graphql/", json.dumps(payload), content_type="application/json")
+
+    def test_simple_query_is_allowed(self):
+        response = self.post({"query": "{ allBooks(first: 10) { edges { node { title } } } }"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("errors", response.json())
+
+    @override_settings(GRAPHQL_QUERY_LIMITS={"MAX_DEPTH": 3})
+    def test_too_deep_query_is_rejected(self):
+        query = """{ allPatrons { edges { node { borrows { edges { node {
+            book { authors { edges { node { lastName } } } } } } } } } } }"""
+        response = self.post({"query": query})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("zbyt głębokie", response.json()["errors"][0]["message"])
+
+    @override_settings(GRAPHQL_QUERY_LIMITS={"MAX_COST": 1000})
+    def test_connection_multipliers_count_towards_cost(self):
+        cheap = "{ allBooks(first: 10) { edges { node { authors(first: 10) { edges { node { lastName } } } } } } }"
+        expensive = "{ allBooks(first: 100) { edges { node { authors(first: 100) { edges { node { lastName } } } } } } }"
+        self.assertEqual(self.post({"query": cheap}).status_code, 200)
+        response = self.post({"query": expensive})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("zbyt kosztowne", response.json()["errors"][0]["message"])
+
+    def test_persisted_query_flow(self):
+        query = "{ bookCount { count } }"
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": hashlib.sha256(query.encode()).hexdigest()}}
+
+        response = self.post({"extensions": extensions})
+        self.assertEqual(response.json()["errors"][0]["message"], "PersistedQueryNotFound")
+
+        response = self.post({"query": query, "extensions": extensions})
+        self.assertEqual(response.json()["data"], {"bookCount": {"count": 0}})
+
+        # znany hash - bez parsowania i walidacji
+        with mock.patch("library.graphql_view.parse") as parse, mock.patch("library.graphql_view.validate") as validate:
+            response = self.post({"extensions": extensions})
+        self.assertEqual(response.json()["data"], {"bookCount": {"count": 0}})
+        parse.assert_not_called()
+        validate.assert_not_called()
+
+    def test_registered_queries_are_bounded_and_file_queries_pinned(self):
+        pinned = "{ bookCount { count } }"
+        queries = [f"{{ allBooks(first: {first}) {{ edges {{ node {{ title }} }} }} }}" for first in (1, 2, 3)]
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        path = os.path.join(directory, "queries.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({hashlib.sha256(pinned.encode()).hexdigest(): pinned}, f)
+
+        graphql_schema = schema.graphql_schema
+        with override_settings(GRAPHQL_PERSISTED_QUERIES={"FILE": path, "MAX_REGISTERED": 2}):
+            for query in queries:
+                persisted_queries.register(graphql_schema, query)
+            stored = [persisted_queries.get(graphql_schema, hashlib.sha256(query.encode()).hexdigest())
+                      for query in (pinned, *queries)]
+        self.assertEqual([document is not None for document in stored], [True, False, True, True])
+
+    def test_persisted_query_hash_mismatch(self):
+        extensions = {"persistedQuery": {"version": 1, "sha256Hash": "0" * 64}}
+        response = self.post({"query": "{ bookCount { count } }", "extensions": extensions})
+        self.assertIn("errors", response.json())
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        library_cache.stats.reset()
+        self.client = APIClient()
+        self.publisher = Publisher.objects.create(name="PWN")
+        self.category = Category.objects.create(name="Poezja")
+        self.book = Book.objects.create(title="Pan Tadeusz", publisher=self.publisher,
+                                        publication_year=1834, category=self.category)
+        self.patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+
+    def test_cached_response_is_served_without_queries(self):
+        first = self.client.get("/api/borrows/status-stats/").json()
+        with self.assertNumQueries(0):
+            second = self.client.get("/api/borrows/status-stats/").json()
+        self.assertEqual(first, second)
+
+    def test_borrow_changes_invalidate_stats(self):
+        self.assertEqual(self.client.get("/api/borrows/status-stats/").json(), {"results": []})
+        borrow = Borrow.objects.create(patron=self.patron, book=self.book)
+        self.assertEqual(self.client.get("/api/borrows/status-stats/").json(),
+                         {"results": [{"status": "active", "count": 1}]})
+
+        most_borrowed = self.client.get("/api/books/most-borrowed/").json()
+        self.assertEqual(most_borrowed[0]["borrow_count"], 1)
+        borrow.delete()
+        self.assertEqual(self.client.get("/api/books/most-borrowed/").json()[0]["borrow_count"], 0)
+
+    def test_bulk_update_invalidates_stats(self):
+        Borrow.objects.create(patron=self.patron, book=self.book)
+        self.client.get("/api/borrows/status-stats/")
+        update_borrows(Borrow.objects.all(), status='returned', return_date=date.today())
+        self.assertEqual(self.client.get("/api/borrows/status-stats/").json(),
+                         {"results": [{"status": "returned", "count": 1}]})
+
+    def test_m2m_change_invalidates_book_dependent_entries(self):
+        self.client.get("/api/books/most-borrowed/")
+        author = Author.objects.create(first_name="Adam", last_name="Mickiewicz", nationality="PL")
+        self.book.authors.add(author)
+        data = self.client.get("/api/books/most-borrowed/").json()
+        self.assertEqual(data[0]["authors"][0]["last_name"], "Mickiewicz")
+
+    def test_graphql_resolver_is_cached_and_invalidated(self):
+        query = "{ categoryStats { name bookCount } }"
+        self.assertEqual(schema.execute(query).data["categoryStats"][0]["bookCount"], 1)
+        with self.assertNumQueries(0):
+            schema.execute(query)
+        Book.objects.create(title="Dziady", publisher=self.publisher, publication_year=1823, category=self.category)
+        self.assertEqual(schema.execute(query).data["categoryStats"][0]["bookCount"], 2)
+
+    def test_entry_cached_before_commit_is_invalidated_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Borrow.objects.create(patron=self.patron, book=self.book)
+            # odczyt przed zatwierdzeniem zapisu (tu: zapisu jeszcze nie widać) - stary wynik pod nową wersją
+            with mock.patch.object(Borrow.objects, 'values', return_value=Borrow.objects.none().values('status')):
+                self.assertEqual(self.client.get("/api/borrows/status-stats/").json(), {"results": []})
+        self.assertEqual(self.client.get("/api/borrows/status-stats/").json(),
+                         {"results": [{"status": "active", "count": 1}]})
+
+    def test_hit_miss_metrics(self):
+        self.client.get("/api/books/category-stats/")
+        self.client.get("/api/books/category-stats/")
+        data = self.client.get("/api/cache-stats/").json()
+        self.assertEqual(data["by_name"]["category_stats"], {"hits": 1, "misses": 1, "hit_ratio": 0.5})
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = Publisher.objects.create(name="PWN")
+        self.book = Book.objects.create(title="Pan Tadeusz", publisher=self.publisher, publication_year=1834)
+
+    def test_list_returns_validators(self):
+        response = self.client.get("/api/books/")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", response)
+
+    def test_matching_etag_short_circuits_before_serialization(self):
+        etag = self.client.get("/api/books/")["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/books/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+    def test_etag_changes_with_dependent_tables(self):
+        etag = self.client.get(f"/api/books/{self.book.id}/")["ETag"]
+        self.publisher.name = "Wydawnictwo PWN"
+        self.publisher.save()
+        response = self.client.get(f"/api/books/{self.book.id}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_borrow_changes_book_etag(self):
+        etag = self.client.get("/api/books/")["ETag"]
+        patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+        Borrow.objects.create(patron=patron, book=self.book)
+        response = self.client.get("/api/books/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"][0]["borrow_count"], 1)
+
+    def test_etag_depends_on_query_string(self):
+        etag = self.client.get("/api/books/")["ETag"]
+        response = self.client.get("/api/books/?ordering=title", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get("/api/books/")["Last-Modified"]
+        response = self.client.get("/api/books/", HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+
+class BulkEndpointTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = Publisher.objects.create(name="PWN")
+        self.author = Author.objects.create(first_name="Adam", last_name="Mickiewicz", email="adam@example.com")
+        self.book = Book.objects.create(title="Pan Tadeusz", publisher=self.publisher, publication_year=1834)
+        self.patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+
+    def test_bulk_create_borrows(self):
+        items = [{"patron": self.patron.id, "book": self.book.id} for _ in range(20)]
+        # walidacja czytelników i książek, INSERT, liczniki, agregaty i wersje tabel - niezależnie od rozmiaru paczki
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/borrows/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertLess(len(queries), 25)
+        self.assertEqual(len(response.data["data"]), 20)
+
+        borrow = Borrow.objects.first()
+        self.assertEqual(borrow.due_date, borrow.borrow_date + timedelta(days=30))
+        self.book.refresh_from_db()
+        self.patron.refresh_from_db()
+        self.assertEqual((self.book.borrow_count, self.book.active_borrow_count), (20, 20))
+        self.assertEqual(self.patron.active_borrow_count, 20)
+
+    def test_bulk_create_counter_queries_do_not_grow_with_rows(self):
+        publishers = [Publisher.objects.create(name=f"Wydawca {i}") for i in range(3)]
+        books = [Book.objects.create(title=f"Tom {i}", publisher=publishers[i % 3], publication_year=2000) for i in range(40)]
+        patrons = [Patron.objects.create(library_card_number=f"9000{i:02d}", first_name="Jan", last_name=str(i)) for i in range(40)]
+
+        def post(count):
+            items = [{"patron": patrons[i].id, "book": books[i].id} for i in range(count)]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/borrows/bulk/', items, format='json')
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        post(40)    # pierwsze zapisy: wersje tabel i wiersze agregatów
+        self.assertEqual(post(2), post(40))
+        self.assertEqual(Publisher.objects.get(pk=publishers[0].pk).total_borrows, 14 + 1 + 14)
+        self.assertEqual(Book.objects.get(pk=books[0].pk).borrow_count, 3)
+        self.assertEqual(Patron.objects.get(pk=patrons[39].pk).active_borrow_count, 2)
+
+    def test_bulk_errors_reject_whole_batch(self):
+        items = [
+            {"patron": self.patron.id, "book": self.book.id},
+            {"patron": self.patron.id, "book": 999},
+            {"patron": self.patron.id, "book": self.book.id, "status": "returned"},
+        ]
+        response = self.client.post('/api/borrows/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error["index"] for error in response.data["errors"]], [1, 2])
+        self.assertFalse(Borrow.objects.exists())
+
+    def test_bulk_partial_success(self):
+        items = [
+            {"patron": self.patron.id, "book": self.book.id},
+            {"patron": self.patron.id, "book": 999},
+        ]
+        response = self.client.post('/api/borrows/bulk/?atomic=false', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Borrow.objects.count(), 1)
+        self.assertEqual(response.data["errors"][0]["index"], 1)
+
+    def test_bulk_update_and_delete_borrows(self):
+        borrows = [Borrow.objects.create(patron=self.patron, book=self.book) for _ in range(3)]
+        items = [
+            {"id": borrow.id, "status": "returned", "return_date": str(date.today())}
+            for borrow in borrows[:2]
+        ]
+        response = self.client.patch('/api/borrows/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Borrow.objects.filter(status='returned').count(), 2)
+        self.book.refresh_from_db()
+        self.assertEqual((self.book.borrow_count, self.book.active_borrow_count), (3, 1))
+
+        response = self.client.delete('/api/borrows/bulk/', [borrow.id for borrow in borrows], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Borrow.objects.exists())
+        self.patron.refresh_from_db()
+        self.assertEqual((self.patron.borrow_count, self.patron.active_borrow_count), (0, 0))
+
+    def test_bulk_books(self):
+        items = [
+            {"title": f"Tom {i}", "publisher": self.publisher.id, "publication_year": 2000, "authors": [self.author.id]}
+            for i in range(5)
+        ]
+        response = self.client.post('/api/books/bulk/', items, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.author.books.count(), 5)
+        self.assertEqual(response.data["data"][0]["authors"], [self.author.id])
+
+        ids = [book["id"] for book in response.data["data"]]
+        response = self.client.patch('/api/books/bulk/', [{"id": ids[0], "authors": []}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.author.books.count(), 4)
+
+        Borrow.objects.create(patron=self.patron, book_id=ids[1])
+        response = self.client.delete('/api/books/bulk/', ids, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.patron.refresh_from_db()
+        self.assertEqual(self.patron.borrow_count, 0)
+        self.assertEqual(Book.objects.count(), 1)
+
+
+class StreamingExportTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        publisher = Publisher.objects.create(name="PWN")
+        self.author = Author.objects.create(first_name="Adam", last_name="Mickiewicz", nationality="polska")
+        self.book = Book.objects.create(title="Pan Tadeusz", publisher=publisher, publication_year=1834)
+        self.book.authors.add(self.author)
+        patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+        Borrow.objects.create(patron=patron, book=self.book)
+        Borrow.objects.create(patron=patron, book=self.book, status='returned', return_date=date.today())
+
+    def read(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode('utf-8')
+
+    def test_ndjson_export_applies_filters(self):
+        response = self.client.get('/api/borrows/export/ndjson/?status=returned')
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in self.read(response).splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["status"], "returned")
+        self.assertEqual(rows[0]["book"], self.book.id)
+
+    def test_csv_export(self):
+        response = self.client.get('/api/books/export/csv/', HTTP_ACCEPT='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0], 'id,title,publisher,publication_year,category,authors')
+        self.assertEqual(lines[1], f'{self.book.id},Pan Tadeusz,{self.book.publisher_id},1834,,{self.author.id}')
+
+    def test_unknown_format(self):
+        response = self.client.get('/api/patrons/export/xml/')
+        self.assertEqual(response.status_code, 404)
+
+
+class ChunkedImportTests(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.author = Author.objects.create(
+            first_name="Adam", last_name="Mickiewicz", email="adam@example.com", nationality="polska")
+        self.patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+
+    def write_csv(self, name, lines):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return path
+
+    def import_books(self):
+        path = self.write_csv('books.csv', [
+            'title,publication_year,publisher,category,authors,isbn,pages',
+            'Pan Tadeusz,1834,PWN,Epopeja,adam@example.com,9788300000001,340',
+            'Dziady,1823,PWN,,adam@example.com,9788300000002,',
+            'Nieznany,1900,PWN,,nobody@example.com,9788300000003,',
+        ])
+        call_command('import_data', 'books', path, '--chunk-size', '2', stdout=StringIO(), stderr=StringIO())
+
+    def test_import_books(self):
+        self.import_books()
+        self.assertEqual(Book.objects.count(), 2)
+        self.assertEqual(Publisher.objects.filter(name="PWN").count(), 1)
+        book = BookDetails.objects.get(isbn='9788300000001').book
+        self.assertEqual(book.category.name, "Epopeja")
+        self.assertEqual(list(book.authors.all()), [self.author])
+
+        # ponowny import pomija książki o istniejących ISBN
+        self.import_books()
+        self.assertEqual(Book.objects.count(), 2)
+
+    def test_import_borrows_resumes_from_checkpoint(self):
+        self.import_books()
+        path = self.write_csv('borrows.csv', [
+            'library_card_number,isbn,borrow_date,due_date,return_date,status',
+            '123456,9788300000001,2024-01-10,,,active',
+            '123456,9788300000002,2024-01-10,,2024-02-01,returned',
+            '123456,9788300000001,2024-03-01,,,active',
+        ])
+        ImportCheckpoint.objects.create(source=f'borrows:{path}', rows=1)
+
+        out = StringIO()
+        call_command('import_data', 'borrows', path, stdout=out, stderr=StringIO())
+        self.assertIn('wznowiono od wiersza 2', out.getvalue())
+        self.assertEqual(Borrow.objects.count(), 2)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+        self.assertEqual(Borrow.objects.get(status='active').due_date, date(2024, 3, 31))
+        self.patron.refresh_from_db()
+        self.assertEqual((self.patron.borrow_count, self.patron.active_borrow_count), (2, 1))
+
+    def test_crash_after_commit_does_not_duplicate_rows(self):
+        self.import_books()
+        path = self.write_csv('borrows.csv', [
+            'library_card_number,isbn,borrow_date,due_date,return_date,status',
+            '123456,9788300000001,2024-01-10,,2024-01-20,returned',
+            '123456,9788300000002,2024-01-10,,2024-02-01,returned',
+            '123456,9788300000001,2024-03-01,,,active',
+        ])
+        import_chunk = ChunkedImporter.import_chunk
+
+        def crash_after_first_chunk(importer, chunk, report):
+            import_chunk(importer, chunk, report)
+            raise RuntimeError("awaria po zatwierdzeniu paczki")
+
+        with mock.patch.object(ChunkedImporter, 'import_chunk', crash_after_first_chunk):
+            with self.assertRaises(RuntimeError):
+                call_command('import_data', 'borrows', path, '--chunk-size', '2', stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(Borrow.objects.count(), 2)
+
+        out = StringIO()
+        call_command('import_data', 'borrows', path, '--chunk-size', '2', stdout=out, stderr=StringIO())
+        self.assertIn('wznowiono od wiersza 3', out.getvalue())
+        self.assertEqual(Borrow.objects.count(), 3)
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_dry_run_reports_throughput(self):
+        path = self.write_csv('borrows.csv', [
+            'library_card_number,isbn,borrow_date,due_date,return_date,status',
+            '999999,9788300000001,2024-01-10,,,active',
+        ])
+        out, err = StringIO(), StringIO()
+        call_command('import_data', 'borrows', path, '--dry-run', stdout=out, stderr=err)
+        self.assertIn('wierszy/s', out.getvalue())
+        self.assertIn('Nie znaleziono czytelnika', err.getvalue())
+        self.assertFalse(Borrow.objects.exists())
+
+    def test_admin_fast_import(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'haslo'))
+        self.assertContains(self.client.get('/admin/library/book/'), 'fast-import/')
+        self.assertEqual(self.client.get('/admin/library/book/fast-import/').status_code, 200)
+
+        upload = SimpleUploadedFile('books.csv', (
+            'title,publication_year,publisher,category,authors,isbn,pages\n'
+            'Pan Tadeusz,1834,PWN,,adam@example.com,9788300000001,340\n'
+        ).encode('utf-8'))
+        response = self.client.post('/admin/library/book/fast-import/', {'file': upload, 'chunk_size': 100})
+        self.assertRedirects(response, '/admin/library/book/')
+        self.assertEqual(Book.objects.count(), 1)
+
+
+class GenerateDataTests(TestCase):
+
+    def generate(self, seed=7):
+        call_command(
+            'generate_data', '--noinput', '--workers', '1', '--seed', str(seed), '--today', '2025-06-30',
+            '--publishers', '3', '--categories', '4', '--authors', '20', '--books', '50',
+            '--patrons', '30', '--borrows', '1200', stdout=StringIO(),
+        )
+        return list(Borrow.objects.order_by('id').values_list())
+
+    def test_same_seed_gives_same_data(self):
+        first = self.generate()
+        self.assertEqual(len(first), 1200)
+        self.assertEqual(self.generate(), first)
+        self.assertNotEqual(self.generate(seed=8), first)
+
+    def test_generated_data_is_consistent(self):
+        self.generate()
+        self.assertEqual(BookDetails.objects.count(), 50)
+        self.assertTrue(all(book.authors.exists() for book in Book.objects.all()))
+        self.assertFalse(Borrow.objects.filter(status__in=['returned', 'lost'], return_date__isnull=True).exists())
+        self.assertEqual(Book.objects.aggregate(total=Sum('borrow_count'))['total'], 1200)
+        # po zapisie z jawnymi id kolejne rekordy dostają następne id
+        self.assertEqual(Publisher.objects.create(name="Nowy").id, 4)
+
+
+class BenchmarkTests(TestCase):
+
+    def test_all_endpoints_respond(self):
+        publisher = Publisher.objects.create(name="PWN")
+        book = Book.objects.create(title="Pan Tadeusz", publisher=publisher, publication_year=1834)
+        patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+        Borrow.objects.create(patron=patron, book=book)
+        Category.objects.create(name="Epopeja")
+        Author.objects.create(first_name="Adam", last_name="Mickiewicz", nationality="polska")
+        BookDetails.objects.create(book=book, isbn="9788300000001")
+
+        endpoints = benchmark.collect_endpoints()
+        names = {endpoint.name for endpoint in endpoints}
+        self.assertTrue({'book-full-info', 'book-most-borrowed', 'book-category-stats',
+                         'borrow-patron-stats', 'borrow-borrow-stats', 'graphql-books',
+                         'autocomplete-broad-prefix', 'autocomplete-typo',
+                         'book-similar', 'book-similar-popular', 'graphql-similar_books'} <= names)
+
+        results = benchmark.run(endpoints, repeat=1, warmup=0)['results']
+        self.assertEqual([name for name, result in results.items() if not result['ok']], [])
+        self.assertGreater(results['book-list']['queries'], 0)
+
+    def test_compare_detects_regressions(self):
+        baseline = {'results': {
+            'book-list': {'p50_ms': 10.0, 'p95_ms': 20.0, 'queries': 3, 'peak_kb': 500.0},
+            'book-detail': {'p50_ms': 0.2, 'p95_ms': 0.3, 'queries': 2, 'peak_kb': 50.0},
+        }}
+        current = {'results': {
+            'book-list': {'p50_ms': 11.0, 'p95_ms': 30.0, 'queries': 4, 'peak_kb': 520.0},
+            # czasy poniżej progu szumu (1 ms) nie są regresją mimo wzrostu o 100%
+            'book-detail': {'p50_ms': 0.4, 'p95_ms': 0.6, 'queries': 2, 'peak_kb': 50.0},
+        }}
+        regressions = benchmark.compare(current, baseline, threshold=0.2)
+        self.assertEqual(
+            [(regression.name, regression.metric) for regression in regressions],
+            [('book-list', 'p95_ms'), ('book-list', 'queries')],
+        )
+
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        publisher = Publisher.objects.create(name="PWN")
+        Book.objects.create(title="Pan Tadeusz", publisher=publisher, publication_year=1834)
+
+    def test_disabled_by_default(self):
+        response = self.client.get("/api/books/")
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(LIBRARY_INSTRUMENTATION={"ENABLED": True})
+    def test_server_timing_and_log(self):
+        with self.assertLogs("library.instrumentation", "INFO") as logs:
+            response = self.client.get("/api/books/")
+        self.assertEqual(response.status_code, 200)
+        timing = response["Server-Timing"]
+        for metric in ("db;dur=", "view;dur=", "serialize;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["view"], "BookViewSet.list")
+        self.assertGreater(record["queries"], 0)
+        self.assertEqual(record["n_plus_one"], [])
+
+    @override_settings(LIBRARY_INSTRUMENTATION={"ENABLED": True})
+    def test_graphql_operation_name(self):
+        query = "query BookTitles { allBooks(first: 5) { edges { node { title } } } }"
+        with self.assertLogs("library.instrumentation", "INFO") as logs:
+            response = self.client.post("/graphql/", json.dumps({"query": query}), content_type="application/json")
+        self.assertIn('graphql;desc="BookTitles"', response["Server-Timing"])
+        record = logs.records[-1].instrumentation
+        self.assertEqual(record["graphql_operation"], "BookTitles")
+        self.assertEqual(record["view"], "LibraryGraphQLView")
+
+    def test_query_shape_ignores_values(self):
+        self.assertEqual(
+            query_shape('SELECT * FROM "book" WHERE "id" IN (%s, %s, %s) AND "title" = \'x\' LIMIT 21'),
+            query_shape('SELECT  * FROM "book" WHERE "id" IN (%s) AND "title" = \'y\' LIMIT 5'),
+        )
+
+    def test_repeated_shapes_are_reported(self):
+        metrics = RequestMetrics(threshold=3)
+        metrics.view = "BookViewSet.list"
+        metrics.resolver = "BookType.publisher"
+        execute = lambda sql, params, many, context: None
+        for pk in range(4):
+            metrics(execute, f'SELECT * FROM "publisher" WHERE "id" = {pk}', None, False, {})
+        metrics(execute, 'SELECT COUNT(*) FROM "book"', None, False, {})
+
+        [report] = metrics.n_plus_one()
+        self.assertEqual(report["count"], 4)
+        self.assertEqual(report["view"], "BookViewSet.list")
+        self.assertEqual(report["resolver"], "BookType.publisher")
+        self.assertTrue(report["location"].startswith("library/tests.py:"))
+        self.assertEqual(metrics.queries, 5)
+
+
+class MetricsEndpointTests(TestCase):
+
+    def setUp(self):
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(
+            LIBRARY_METRICS={"ENABLED": True, "DIRECTORY": self.directory, "FLUSH_INTERVAL": 0}))
+        metrics.registry.reset()
+        library_cache.stats.reset()
+        get_cache().clear()
+
+        publisher = Publisher.objects.create(name="PWN")
+        book = Book.objects.create(title="Pan Tadeusz", publisher=publisher, publication_year=1834)
+        patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+        Borrow.objects.create(patron=patron, book=book)
+        Borrow.objects.create(patron=patron, book=book, status="returned", return_date=date.today())
+
+    def scrape(self):
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Content-Type"].startswith("text/plain; version=0.0.4"))
+        return response.content.decode().splitlines()
+
+    def test_request_and_db_metrics(self):
+        self.client.get("/api/books/")
+        self.client.get("/api/books/")
+        query = "query BookTitles { allBooks(first: 5) { edges { node { title } } } }"
+        self.client.post("/graphql/", json.dumps({"query": query}), content_type="application/json")
+        lines = self.scrape()
+
+        self.assertIn('library_http_requests_total{method="GET",route="BookViewSet.list",status="200"} 2', lines)
+        self.assertIn('library_http_request_duration_seconds_count{route="BookViewSet.list"} 2', lines)
+        self.assertIn('library_http_request_duration_seconds_bucket{route="BookViewSet.list",le="+Inf"} 2', lines)
+        self.assertIn('library_http_requests_total{method="POST",route="graphql:BookTitles",status="200"} 1', lines)
+        self.assertTrue(any(line.startswith('library_db_queries_total{route="BookViewSet.list"}') for line in lines))
+        self.assertIn("# TYPE library_http_request_duration_seconds histogram", lines)
+
+    def test_borrow_gauges_and_cache_ratio(self):
+        self.client.get("/api/borrows/status-stats/")
+        self.client.get("/api/borrows/status-stats/")
+        lines = self.scrape()
+        self.assertIn('library_borrows{status="active"} 1', lines)
+        self.assertIn('library_borrows{status="returned"} 1', lines)
+        self.assertIn('library_borrows{status="overdue"} 0', lines)
+        self.assertIn('library_cache_hit_ratio{name="status_stats"} 0.5', lines)
+
+    def test_metrics_of_other_processes_are_summed(self):
+        other = {
+            "counters": [["library_http_requests_total", [["method", "GET"], ["route", "BookViewSet.list"], ["status", "200"]], 3]],
+            "histograms": [],
+            "cache": {},
+        }
+        with open(os.path.join(self.directory, "999999.json"), "w", encoding="utf-8") as f:
+            json.dump(other, f)
+        self.client.get("/api/books/")
+        self.assertIn('library_http_requests_total{method="GET",route="BookViewSet.list",status="200"} 4', self.scrape())
+
+
+class MarkOverdueTests(TestCase):
+
+    def setUp(self):
+        publisher = Publisher.objects.create(name="PWN")
+        self.book = Book.objects.create(title="Pan Tadeusz", publisher=publisher, publication_year=1834)
+        self.patron = Patron.objects.create(library_card_number="123456", first_name="Jan", last_name="Kowalski")
+        past = date.today() - timedelta(days=40)
+        self.overdue = [
+            Borrow.objects.create(patron=self.patron, book=self.book, borrow_date=past, due_date=past + timedelta(days=i))
+            for i in range(3)
+        ]
+        self.current = Borrow.objects.create(patron=self.patron, book=self.book)
+        Borrow.objects.create(patron=self.patron, book=self.book, status="returned",
+                              borrow_date=past, due_date=past, return_date=date.today())
+
+    def test_marks_active_borrows_past_due_date(self):
+        run = mark_overdue(batch_size=2)
+        self.assertEqual((run.rows_changed, run.batches), (3, 2))
+        self.assertEqual(
+            set(Borrow.overdue_borrows.values_list("id", flat=True)),
+            {borrow.id for borrow in self.overdue},
+        )
+        self.assertEqual(Borrow.objects.get(pk=self.current.pk).status, "active")
+        self.book.refresh_from_db()
+        self.patron.refresh_from_db()
+        self.assertEqual((self.book.active_borrow_count, self.patron.active_borrow_count), (1, 1))
+        self.assertTrue(Borrow.objects.get(pk=self.overdue[0].pk).is_overdue())
+
+        # drugi przebieg niczego nie zmienia
+        self.assertEqual(mark_overdue().rows_changed, 0)
+        self.assertEqual(JobRun.objects.filter(job="mark_overdue").count(), 2)
+
+    def test_overdue_borrow_can_be_returned(self):
+        mark_overdue()
+        borrow = self.overdue[0]
+        response = APIClient().post(f"/api/borrows/{borrow.pk}/return-book/")
+        self.assertEqual(response.status_code, 200)
+        borrow.refresh_from_db()
+        self.assertEqual((borrow.status, borrow.return_date), ("returned", timezone.localdate()))
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.active_borrow_count, 1)
+
+    def test_extending_overdue_borrow(self):
+        mark_overdue()
+        client = APIClient()
+        # nowy termin w przyszłości - wypożyczenie znów aktywne
+        recent = Borrow.objects.create(patron=self.patron, book=self.book, status="overdue",
+                                       borrow_date=date.today() - timedelta(days=35), due_date=date.today() - timedelta(days=5))
+        self.assertEqual(client.post(f"/api/borrows/{recent.pk}/extend-date/").status_code, 200)
+        recent.refresh_from_db()
+        self.assertEqual((recent.status, recent.due_date), ("active", date.today() + timedelta(days=25)))
+
+        # nowy termin też już minął - zostaje przeterminowane
+        old = self.overdue[0]
+        self.assertEqual(client.post(f"/api/borrows/{old.pk}/extend-date/").status_code, 200)
+        old.refresh_from_db()
+        self.assertEqual(old.status, "overdue")
+        self.assertEqual(client.post(f"/api/borrows/{self.current.pk}/return-book/").status_code, 200)
+        self.assertEqual(client.post(f"/api/borrows/{self.current.pk}/extend-date/").status_code, 400)
+
+    @override_settings(TIME_ZONE="Europe/Warsaw")
+    def test_job_and_model_agree_near_midnight(self):
+        # 23:30 UTC to już następny dzień w strefie TIME_ZONE
+        borrow = Borrow.objects.create(patron=self.patron, book=self.book,
+                                       borrow_date=date(2024, 3, 1), due_date=date(2024, 3, 10))
+        now = datetime(2024, 3, 10, 23, 30, tzinfo=dt_timezone.utc)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            self.assertTrue(borrow.is_overdue())
+            mark_overdue()
+        self.assertEqual(Borrow.objects.get(pk=borrow.pk).status, "overdue")
+
+    def test_command_with_scheduler(self):
+        out = StringIO()
+        with mock.patch("library.management.commands.mark_overdue.time.sleep") as sleep:
+            call_command("mark_overdue", "--every", "60", "--max-runs", "2", stdout=out)
+        self.assertEqual(sleep.call_count, 1)
+        self.assertEqual(list(JobRun.objects.order_by("id").values_list("rows_changed", flat=True)), [3, 0])
+        self.assertIn("Oznaczono jako przeterminowane: 3", out.getvalue())
+
+
+def make_image(size=(1200, 1800), image_format="JPEG", name="cover.jpg"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (200, 40, 40)).save(buffer, image_format)
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+class CoverVariantsTests(TestCase):
+
+    def setUp(self):
+        self.media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root, LIBRARY_IMAGES={"SYNC": True}))
+        publisher = Publisher.objects.create(name="PWN")
+        self.book = Book.objects.create(title="Pan Tadeusz", publisher=publisher, publication_year=1834)
+
+    def test_variants_are_generated_and_exposed(self):
+        details = BookDetails.objects.create(book=self.book, isbn="9788300000001", cover_image=make_image())
+        details.refresh_from_db()
+        variants = details.cover_variants
+        self.assertEqual(variants["source"], details.cover_image.name)
+        self.assertEqual((variants["thumb"]["width"], variants["thumb"]["height"]), (160, 240))
+        self.assertEqual((variants["medium"]["width"], variants["medium"]["height"]), (480, 720))
+        for name in ("thumb", "medium"):
+            for format_name in images.OUTPUT_FORMATS:
+                self.assertTrue(os.path.exists(os.path.join(self.media_root, variants[name][format_name])))
+        with Image.open(os.path.join(self.media_root, variants["thumb"]["webp"])) as thumb:
+            self.assertEqual(thumb.format, "WEBP")
+
+        data = APIClient().get(f"/api/bookdetails/{details.pk}/").json()
+        self.assertTrue(data["cover_variants"]["thumb"]["webp"].startswith("http://testserver/media/covers/variants/"))
+        full_info = APIClient().get(f"/api/books/{self.book.pk}/full-info/").json()
+        self.assertEqual(full_info["details"]["cover_variants"], data["cover_variants"])
+
+    def test_new_cover_replaces_variants(self):
+        details = BookDetails.objects.create(book=self.book, isbn="9788300000001", cover_image=make_image())
+        old_thumb = os.path.join(self.media_root, details.cover_variants["thumb"]["jpeg"])
+        details.cover_image = make_image((300, 200), "PNG", "other.png")
+        details.save()
+        details.refresh_from_db()
+        self.assertFalse(os.path.exists(old_thumb))
+        self.assertEqual(details.cover_variants["source"], details.cover_image.name)
+        self.assertEqual(details.cover_variants["medium"]["width"], 300)    # bez powiększania
+
+        details.cover_image = None
+        details.save()
+        details.refresh_from_db()
+        self.assertEqual(details.cover_variants, {})
+
+    @override_settings(LIBRARY_IMAGES={"SYNC": False})
+    def test_processing_is_scheduled_after_commit(self):
+        with mock.patch("library.images.get_executor") as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                details = BookDetails.objects.create(book=self.book, isbn="9788300000001", cover_image=make_image())
+                get_executor.assert_not_called()
+        get_executor.return_value.submit.assert_called_once_with(images.process_in_background, details.pk)
+
+
+class MediaViewTests(TestCase):
+
+    def setUp(self):
+        self.media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root, LIBRARY_IMAGES={"SYNC": True}))
+        publisher = Publisher.objects.create(name="PWN")
+        book = Book.objects.create(title="Pan Tadeusz", publisher=publisher, publication_year=1834)
+        upload = make_image((90, 120))
+        self.content = upload.read()
+        self.details = BookDetails.objects.create(book=book, isbn="9788300000001", cover_image=upload)
+        self.url = self.details.cover_image.url
+
+    def test_upload_name_is_content_hash(self):
+        digest = hashlib.sha256(self.content).hexdigest()[:32]
+        self.assertEqual(self.details.cover_image.name, f"covers/{digest}.jpg")
+
+    def test_full_file_with_cache_headers(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), self.content)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertEqual(response["ETag"], f'"{hashlib.sha256(self.content).hexdigest()[:32]}"')
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+    def test_range_requests(self):
+        response = self.client.get(self.url, HTTP_RANGE="bytes=10-19")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.content[10:20])
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.content)}")
+
+        response = self.client.get(self.url, HTTP_RANGE="bytes=-5")
+        self.assertEqual(b"".join(response.streaming_content), self.content[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(self.content)}-")
+        self.assertEqual(response.status_code, 416)
+
+    def test_variant_and_missing_files(self):
+        thumb = self.details.cover_variants["thumb"]["webp"]
+        response = self.client.get(f"/media/{thumb}")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertEqual(self.client.get("/media/covers/missing.jpg").status_code, 404)
+        self.assertEqual(self.client.get("/media/covers/..%2F..%2Fmanage.py").status_code, 404)
+
+    @override_settings(LIBRARY_MEDIA={"SENDFILE": "x-accel-redirect"})
+    def test_delegation_to_proxy(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-media/{self.details.cover_image.name}")
+        self.assertEqual(response.content, b"")
+        self.assertIn("ETag", response)
+
+
+class CoverStorageTests(TestCase):
+
+    def setUp(self):
+        self.media_root = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(MEDIA_ROOT=self.media_root, LIBRARY_IMAGES={"SYNC": True}))
+        publisher = Publisher.objects.create(name="PWN")
+        self.books = [
+            Book.objects.create(title=f"Książka {i}", publisher=publisher, publication_year=2000) for i in range(2)
+        ]
+        os.makedirs(os.path.join(self.media_root, "uploads"))
+        self.upload = os.path.join(self.media_root, "uploads", "cover.jpg")
+        with open(self.upload, "wb") as f:
+            f.write(make_image((60, 90)).read())
+
+    def cover_files(self):
+        return sorted(name for name in os.listdir(os.path.join(self.media_root, "covers")) if name != "variants")
+
+    def test_identical_uploads_share_one_file(self):
+        first = BookDetails.objects.create(book=self.books[0], isbn="9788300000001", cover_image=make_image())
+        second = BookDetails.objects.create(book=self.books[1], isbn="9788300000002", cover_image=make_image())
+        self.assertEqual(first.cover_image.name, second.cover_image.name)
+        self.assertEqual(len(self.cover_files()), 1)
+
+    def test_cover_from_upload_is_copied_once(self):
+        client = APIClient()
+        response = client.post("/api/bookdetails/", {
+            "book": self.books[0].pk, "isbn": "9788300000001", "cover_image_from_upload": "uploads/cover.jpg",
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        details = BookDetails.objects.get(pk=response.json()["data"]["id"])
+        self.assertFalse(os.path.samefile(details.cover_image.path, self.upload))
+        with open(details.cover_image.path, "rb") as cover, open(self.upload, "rb") as upload:
+            self.assertEqual(cover.read(), upload.read())
+
+        for _ in range(2):
+            response = client.patch(f"/api/bookdetails/{details.pk}/", {"cover_image_from_upload": "uploads/cover.jpg"},
+                                    format="json")
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cover_files(), [os.path.basename(details.cover_image.name)])
+
+        response = client.patch(f"/api/bookdetails/{details.pk}/", {"cover_image_from_upload": "../manage.py"},
+                                format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_cleanup_removes_only_orphans(self):
+        details = BookDetails.objects.create(book=self.books[0], isbn="9788300000001", cover_image=make_image())
+        orphan = os.path.join(self.media_root, "covers", "0" * 32 + ".jpg")
+        with open(orphan, "wb") as f:
+            f.write(b"stara okladka")
+        fresh = os.path.join(self.media_root, "covers", "1" * 32 + ".jpg")
+        with open(fresh, "wb") as f:
+            f.write(b"nowa okladka")
+        os.utime(orphan, (0, 0))
+        os.utime(details.cover_image.path, (0, 0))
+
+        out = StringIO()
+        call_command("cleanup_covers", stdout=out)
+        self.assertFalse(os.path.exists(orphan))
+        self.assertTrue(os.path.exists(fresh))     # młodszy niż --min-age
+        self.assertTrue(os.path.exists(details.cover_image.path))
+        self.assertTrue(os.path.exists(os.path.join(self.media_root, details.cover_variants["thumb"]["jpeg"])))
+        self.assertIn("Nieużywane pliki okładek: 1", out.getvalue())
+
+    def test_cleanup_keeps_cover_assigned_during_walk(self):
+        orphan = os.path.join(self.media_root, "covers", "0" * 32 + ".jpg")
+        os.makedirs(os.path.dirname(orphan))
+        with open(orphan, "wb") as f:
+            f.write(make_image().read())
+        os.utime(orphan, (0, 0))
+
+        references = cleanup_covers.reference_counts
+        calls = []
+
+        # okładka przypisana po pierwszym zliczeniu odwołań, przed usuwaniem
+        def assigned_during_walk():
+            calls.append(1)
+            if len(calls) == 2:
+                BookDetails.objects.create(book=self.books[0], isbn="9788300000001", cover_image="covers/" + "0" * 32 + ".jpg")
+            return references()
+
+        with mock.patch.object(cleanup_covers, "reference_counts", assigned_during_walk):
+            call_command("cleanup_covers", stdout=StringIO())
+        self.assertTrue(os.path.exists(orphan))
+
+    def test_reused_cover_is_touched(self):
+        first = BookDetails.objects.create(book=self.books[0], isbn="9788300000001", cover_image=make_image())
+        os.utime(first.cover_image.path, (0, 0))
+        BookDetails.objects.create(book=self.books[1], isbn="9788300000002", cover_image=make_image())
+        self.assertGreater(os.stat(first.cover_image.path).st_mtime, time.time() - 60)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = Publisher.objects.create(name="Czytelnik")
+        self.category = Category.objects.create(name="Powieść")
+        self.author = Author.objects.create(first_name="Stefan", last_name="Żeromski", nationality="polska")
+        self.book = Book.objects.create(
+            title="Przedwiośnie", publisher=self.publisher, publication_year=1924, category=self.category)
+        self.book.authors.add(self.author)
+        BookDetails.objects.create(book=self.book, isbn="9788307000001")
+        self.other = Book.objects.create(title="Ludzie bezdomni", publisher=self.publisher, publication_year=1900)
+        self.patron = Patron.objects.create(library_card_number="654321", first_name="Anna", last_name="Przybysz")
+
+    def found(self, query, **kwargs):
+        return [(result['type'], result['id']) for result in search.search(query, **kwargs)]
+
+    def test_index_backend(self):
+        self.assertEqual(search.backend(), 'sqlite')
+
+    def test_prefix_diacritics_and_isbn(self):
+        self.assertEqual(self.found("przedwio"), [('book', self.book.pk)])
+        self.assertEqual(self.found("zeromski"), [('author', self.author.pk), ('book', self.book.pk)])
+        self.assertEqual(self.found("978-83-07"), [('book', self.book.pk)])
+        self.assertEqual(self.found("powieść czyt"), [('book', self.book.pk)])
+        self.assertEqual(self.found("przyb"), [('patron', self.patron.pk)])
+        self.assertEqual(self.found("prz", kinds=['book', 'author']), [('book', self.book.pk)])
+
+    def test_title_match_ranks_first(self):
+        Book.objects.create(title="Czytelnik i książka", publisher=self.publisher, publication_year=2000)
+        results = search.search("czytelnik")
+        self.assertEqual(results[0]['title'], "Czytelnik i książka")
+        self.assertEqual(len(results), 3)
+
+    def test_ranking_covers_all_matches(self):
+        SearchDocument.objects.bulk_create([
+            SearchDocument(kind='book', object_id=10 ** 6 + number, title=f"Tom {number}", body="Czytelnik")
+            for number in range(1500)
+        ])
+        Book.objects.create(title="Czytelnik", publisher=self.other.publisher, publication_year=2000)
+        results = search.search("czytelnik", limit=1)
+        self.assertEqual([result['title'] for result in results], ["Czytelnik"])
+
+    def test_index_follows_changes(self):
+        Author.objects.filter(pk=self.author.pk).update(last_name="Sienkiewicz")  # bez sygnałów
+        self.assertEqual(self.found("sienkiewicz"), [])
+        self.author.last_name = "Prus"
+        self.author.save()
+        self.assertEqual(self.found("prus"), [('author', self.author.pk), ('book', self.book.pk)])
+
+        self.other.authors.add(self.author)
+        self.assertIn(('book', self.other.pk), self.found("prus"))
+        self.category.delete()
+        self.assertEqual(self.found("powieść"), [])
+        self.author.delete()
+        self.assertEqual(self.found("prus"), [])
+        self.book.delete()
+        self.assertEqual(self.found("przedwiośnie"), [])
+
+    def test_bulk_operations_and_rebuild(self):
+        response = self.client.post('/api/books/bulk/', [
+            {"title": "Syzyfowe prace", "publisher": self.publisher.id, "publication_year": 1897, "authors": [self.author.id]},
+        ], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(self.found("syzyf")), 1)
+
+        search.SearchDocument.objects.all().delete()
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search.SearchDocument.objects.count(), 5)
+        self.assertEqual(self.found("syzyfowe pra"), self.found("żeromski syzyf"))
+
+    def test_search_endpoint(self):
+        response = self.client.get('/api/search/', {'q': 'zerom', 'type': 'author'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'type': 'author', 'id': self.author.pk, 'title': "Stefan Żeromski", 'score': mock.ANY},
+        ])
+        self.assertEqual(self.client.get('/api/search/', {'q': ' - '}).status_code, 400)
+        self.assertEqual(self.client.get('/api/search/', {'q': 'a', 'type': 'borrow'}).status_code, 400)
+
+    def test_graphql_search(self):
+        result = schema.execute('{ search(query: "bezdom", types: ["book"]) { type id title score } }')
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['search'][0]['title'], "Ludzie bezdomni")
+
+
+class AutocompleteTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.snapshot = os.path.join(directory, 'autocomplete.json')
+        self.enterContext(override_settings(LIBRARY_AUTOCOMPLETE={
+            'SNAPSHOT': self.snapshot, 'CHECK_INTERVAL': 0, 'SYNC': True,
+        }))
+        autocomplete.service.reset()
+        self.addCleanup(autocomplete.service.reset)
+
+        publisher = Publisher.objects.create(name="PWN")
+        self.book = Book.objects.create(title="Chłopi", publisher=publisher, publication_year=1904)
+        self.author = Author.objects.create(first_name="Władysław", last_name="Reymont", nationality="polska")
+        self.patron = Patron.objects.create(library_card_number="204711", first_name="Jan", last_name="Kowalski")
+
+    def labels(self, query, **kwargs):
+        return [result['label'] for result in autocomplete.complete(query, **kwargs)]
+
+    def test_prefix_fuzzy_and_card_number(self):
+        self.assertEqual(self.labels("chło"), ["Chłopi"])
+        self.assertEqual(self.labels("wlad rey"), ["Władysław Reymont"])
+        self.assertEqual(self.labels("reymnot"), ["Władysław Reymont"])    # literówka
+        self.assertEqual(self.labels("2047"), ["204711"])
+        self.assertEqual(self.labels("chlopi", kinds=['author']), [])
+
+    def test_index_follows_signals_without_rebuild(self):
+        self.labels("x")
+        index = autocomplete.service.index
+        self.book.title = "Ziemia obiecana"
+        self.book.save()
+        Book.objects.create(title="Komediantka", publisher=self.book.publisher, publication_year=1896)
+        self.author.delete()
+
+        self.assertEqual(self.labels("ziemia"), ["Ziemia obiecana"])
+        self.assertEqual(self.labels("komed"), ["Komediantka"])
+        self.assertEqual(self.labels("chłopi"), [])
+        self.assertEqual(self.labels("reymont"), [])
+        self.assertIs(autocomplete.service.index, index)
+        self.assertEqual(index.version, autocomplete.current_version())
+
+    def test_version_bumped_only_when_label_changes(self):
+        version = autocomplete.current_version()
+        self.book.publication_year = 1905      # indeks procesu nie jest załadowany
+        self.book.save()
+        self.patron.first_name = "Janusz"
+        self.patron.save()
+        self.client.patch('/api/books/bulk/', [{'id': self.book.id, 'publication_year': 1906}], format='json')
+        self.assertEqual(autocomplete.current_version(), version)
+
+        self.labels("x")
+        autocomplete.service.index.truncated = True     # budżet pamięci - nie wszystkie wpisy w indeksie
+        autocomplete.service.index.remove('book', self.book.pk)
+        self.book.publication_year = 1907
+        self.book.save()
+        self.assertEqual(autocomplete.current_version(), version)
+
+        self.client.patch('/api/books/bulk/', [{'id': self.book.id, 'title': "Lalka"}], format='json')
+        self.assertEqual(autocomplete.current_version(), version + 1)
+        self.author.last_name = "Rejment"
+        self.author.save()
+        self.assertEqual(autocomplete.current_version(), version + 2)
+
+    def test_change_from_other_process_rebuilds_index(self):
+        self.labels("x")
+        Book.objects.filter(pk=self.book.pk).update(title="Lalka")     # bez sygnałów
+        autocomplete.bump_version()
+        self.assertEqual(self.labels("lalka"), ["Lalka"])
+
+    def test_snapshot_is_used_when_version_matches(self):
+        call_command('build_autocomplete', stdout=StringIO())
+        autocomplete.service.reset()
+        with self.assertNumQueries(1):     # tylko wersja indeksu
+            self.assertEqual(self.labels("chłopi"), ["Chłopi"])
+
+        autocomplete.service.reset()
+        self.book.title = "Lalka"
+        self.book.save()
+        self.assertIsNone(autocomplete.load_snapshot(10 ** 6))
+        self.assertEqual(self.labels("lalka"), ["Lalka"])
+
+    def test_memory_budget(self):
+        index = autocomplete.AutocompleteIndex(memory_budget=1500)
+        added = [index.add('book', pk, f"Tytuł numer {pk}") for pk in range(10)]
+        self.assertIn(False, added)
+        self.assertTrue(index.truncated)
+        self.assertLessEqual(index.size, 1500)
+        for pk in range(10):
+            index.remove('book', pk)
+        self.assertEqual((index.size, index.vocabulary, index.trigrams), (0, [], {}))
+
+    def test_autocomplete_endpoint(self):
+        response = self.client.get('/api/autocomplete/', {'q': 'reym', 'type': 'author'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'type': 'author', 'id': self.author.pk, 'label': "Władysław Reymont", 'score': mock.ANY},
+        ])
+        self.assertEqual(self.client.get('/api/autocomplete/', {'q': ''}).data['results'], [])
+        self.assertEqual(self.client.get('/api/autocomplete/', {'q': 'a', 'limit': 'x'}).status_code, 400)
+
+
+class RollupTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.publisher = Publisher.objects.create(name="Znak")
+        self.other_publisher = Publisher.objects.create(name="Agora")
+        self.category = Category.objects.create(name="Reportaż")
+        self.book = Book.objects.create(
+            title="Cesarz", publisher=self.publisher, publication_year=1978, category=self.category)
+        self.other = Book.objects.create(title="Heban", publisher=self.publisher, publication_year=1998)
+        self.patron = Patron.objects.create(library_card_number="112233", first_name="Ewa", last_name="Lis")
+
+    def borrow(self, book, day, **kwargs):
+        return Borrow.objects.create(patron=self.patron, book=book, borrow_date=day, **kwargs)
+
+    # niezerowe wiersze agregatów - porównywane z przeliczeniem od zera
+    def rows(self):
+        return sorted(
+            BorrowRollup.objects.exclude(count=0)
+            .values_list('period', 'period_start', 'category_id', 'publisher_id', 'patron_id', 'status', 'count')
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.rows()
+        rollups.rebuild()
+        self.assertEqual(incremental, self.rows())
+
+    def test_incremental_updates_match_rebuild(self):
+        first = self.borrow(self.book, date(2024, 1, 10))
+        self.borrow(self.book, date(2024, 1, 20))
+        self.borrow(self.other, date(2024, 2, 3))
+        self.assertMatchesRebuild()
+
+        first.status, first.return_date = 'returned', date(2024, 1, 25)
+        first.save()
+        update_borrows(Borrow.objects.filter(book=self.other), status='overdue')
+        self.client.patch('/api/borrows/bulk/', [{'id': first.id, 'borrow_date': '2024-03-01'}], format='json')
+        self.assertMatchesRebuild()
+
+        self.book.refresh_from_db()     # save() zapisuje też liczniki wypożyczeń
+        self.book.category = None
+        self.book.save()
+        self.client.patch('/api/books/bulk/', [{'id': self.other.id, 'publisher': self.other_publisher.id}], format='json')
+        self.assertMatchesRebuild()
+
+        self.book.refresh_from_db()
+        self.book.category = self.category
+        self.book.save()
+        self.category.delete()
+        Borrow.objects.get(pk=first.pk).delete()
+        self.client.delete('/api/books/bulk/', [self.book.id], format='json')
+        self.assertMatchesRebuild()
+
+    def test_row_inserted_concurrently_is_incremented(self):
+        # równoległa transakcja wstawiła wiersz "wszyscy czytelnicy" po odczycie istniejących wierszy
+        BorrowRollup.objects.create(
+            period='day', period_start=date(2024, 1, 10), category_id=self.category.pk,
+            publisher_id=self.publisher.pk, patron_id=rollups.ALL_PATRONS, status='active', count=1,
+        )
+        existing_rows = rollups.existing_rows
+        calls = []
+
+        def first_read_misses_row(deltas):
+            calls.append(deltas)
+            return {} if len(calls) == 1 else existing_rows(deltas)
+
+        with mock.patch.object(rollups, 'existing_rows', first_read_misses_row):
+            self.borrow(self.book, date(2024, 1, 10))
+        self.assertEqual(rollups.timeseries('day'), [{'period': date(2024, 1, 10), 'count': 2}])
+
+    def test_timeseries(self):
+        self.borrow(self.book, date(2024, 1, 10))
+        self.borrow(self.book, date(2024, 1, 20))
+        self.borrow(self.other, date(2024, 2, 3), status='returned', return_date=date(2024, 2, 10))
+
+        self.assertEqual(rollups.timeseries(), [
+            {'period': date(2024, 1, 1), 'count': 2},
+            {'period': date(2024, 2, 1), 'count': 1},
+        ])
+        self.assertEqual(rollups.timeseries('day', start=date(2024, 1, 15), end=date(2024, 1, 31)), [
+            {'period': date(2024, 1, 20), 'count': 1},
+        ])
+        self.assertEqual(rollups.timeseries(group_by='category'), [
+            {'period': date(2024, 1, 1), 'key': self.category.pk, 'name': "Reportaż", 'count': 2},
+            {'period': date(2024, 2, 1), 'key': rollups.NO_CATEGORY, 'name': None, 'count': 1},
+        ])
+        self.assertEqual(rollups.timeseries(status='returned', group_by='publisher'), [
+            {'period': date(2024, 2, 1), 'key': self.publisher.pk, 'name': "Znak", 'count': 1},
+        ])
+
+    def test_timeseries_endpoints(self):
+        self.borrow(self.book, date(2024, 1, 10))
+        response = self.client.get('/api/borrows/timeseries/', {'group_by': 'status', 'start': '2024-01-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [
+            {'period': date(2024, 1, 1), 'key': 'active', 'name': 'active', 'count': 1},
+        ])
+        self.assertEqual(self.client.get('/api/borrows/timeseries/', {'period': 'year'}).status_code, 400)
+        self.assertEqual(
+            self.client.get('/api/borrows/timeseries/', {'start': '2024-02-01', 'end': '2024-01-01'}).status_code, 400)
+
+        result = schema.execute('{ borrowTimeseries(period: "day", groupBy: "patron") { period key name count } }')
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['borrowTimeseries'], [
+            {'period': '2024-01-10', 'key': str(self.patron.pk), 'name': "Ewa Lis", 'count': 1},
+        ])
+        result = schema.execute('{ borrowTimeseries(groupBy: "book") { count } }')
+        self.assertIn("group_by", result.errors[0].message)
+
+    def test_rebuild_command(self):
+        self.borrow(self.book, date(2024, 1, 10))
+        BorrowRollup.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn("4 wierszy", out.getvalue())
+        self.assertEqual(rollups.timeseries(), [{'period': date(2024, 1, 1), 'count': 1}])
+
+
+class AnalyticsTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        self.enterContext(override_settings(LIBRARY_ANALYTICS={'CHECK_INTERVAL': 0, 'MIN_AGE': 0, 'SYNC': True}))
+        analytics.service.reset()
+        self.addCleanup(analytics.service.reset)
+
+        publisher = Publisher.objects.create(name="Czarne")
+        self.authors = [
+            Author.objects.create(first_name="Olga", last_name="Tokarczuk"),
+            Author.objects.create(first_name="Szczepan", last_name="Twardoch"),
+            Author.objects.create(first_name="Jacek", last_name="Dehnel"),
+        ]
+        self.books = []
+        for year, author in zip((1996, 2012, 2016), self.authors):
+            book = Book.objects.create(title=f"Książka {year}", publisher=publisher, publication_year=year)
+            book.authors.add(author)
+            self.books.append(book)
+        self.patrons = [
+            Patron.objects.create(library_card_number=f"70000{number}", first_name="Czytelnik", last_name=str(number))
+            for number in range(3)
+        ]
+        # (czytelnik, książka, wypożyczenie, termin, zwrot)
+        for patron, book, borrowed, due, returned in (
+            (0, 0, date(2024, 1, 5), date(2024, 2, 4), date(2024, 1, 15)),
+            (0, 1, date(2024, 3, 1), date(2024, 3, 31), date(2024, 4, 20)),
+            (1, 0, date(2024, 1, 20), date(2024, 2, 19), date(2024, 2, 10)),
+            (1, 1, date(2024, 2, 2), date(2024, 3, 3), date(2024, 2, 9)),
+            (2, 2, date(2024, 2, 10), date(2024, 3, 11), None),
+        ):
+            Borrow.objects.create(
+                patron=self.patrons[patron], book=self.books[book], borrow_date=borrowed, due_date=due,
+                return_date=returned, status='returned' if returned else 'active',
+            )
+
+    def report(self, name, **params):
+        response = self.client.get(f'/api/analytics/{name}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_retention_cohorts(self):
+        self.assertEqual(self.report('retention', months=3), [
+            {'cohort': '2024-01', 'patrons': 2, 'retention': [1.0, 0.5, 0.5]},
+            {'cohort': '2024-02', 'patrons': 1, 'retention': [1.0, 0.0, 0.0]},
+        ])
+        response = self.client.get('/api/analytics/retention/', {'months': 0})
+        self.assertEqual(response.status_code, 400)
+
+    def test_loan_durations_and_overdue_by_decade(self):
+        durations = self.report('loan-durations')
+        self.assertEqual((durations['count'], durations['median'], durations['max']), (4, 15.5, 50))
+        self.assertEqual([item['count'] for item in durations['bins'][:4]], [0, 2, 0, 1])
+
+        self.assertEqual(self.report('overdue-by-decade'), [
+            {'decade': 1990, 'borrows': 2, 'overdue': 0, 'rate': 0.0},
+            {'decade': 2010, 'borrows': 3, 'overdue': 2, 'rate': 0.6667},    # zwrot po terminie, aktywne po terminie
+        ])
+
+    @override_settings(TIME_ZONE="America/New_York")
+    def test_overdue_by_decade_uses_local_date(self):
+        # 2:00 UTC 12 marca to jeszcze 11 marca w strefie TIME_ZONE - aktywne wypożyczenie
+        # z terminem 11 marca nie jest przeterminowane
+        now = datetime(2024, 3, 12, 2, 0, tzinfo=dt_timezone.utc)
+        with mock.patch("django.utils.timezone.now", return_value=now):
+            self.assertEqual(self.report('overdue-by-decade')[1]['overdue'], 1)
+
+    def test_co_borrowed_authors(self):
+        tokarczuk, twardoch, dehnel = self.authors
+        self.assertEqual(self.report('co-borrowed-authors'), [{
+            'authors': [{'id': tokarczuk.pk, 'name': "Olga Tokarczuk"}, {'id': twardoch.pk, 'name': "Szczepan Twardoch"}],
+            'patrons': 2,
+        }])
+        self.assertEqual(self.report('co-borrowed-authors', author=dehnel.pk), [])
+
+    def test_snapshot_follows_table_versions(self):
+        self.assertEqual(self.client.get('/api/analytics/').data['snapshot']['borrows'], 5)
+        with self.assertNumQueries(1):     # tylko wersje tabel
+            self.report('loan-durations')
+
+        Borrow.objects.create(
+            patron=self.patrons[2], book=self.books[0], borrow_date=date(2024, 5, 1),
+            return_date=date(2024, 5, 3), status='returned',
+        )
+        self.assertEqual(self.report('loan-durations')['count'], 5)
+        self.assertEqual(self.client.get('/api/analytics/unknown/').status_code, 404)
+
+    def test_recent_snapshot_is_served_after_changes(self):
+        self.report('loan-durations')
+        Borrow.objects.create(
+            patron=self.patrons[2], book=self.books[0], borrow_date=date(2024, 5, 1),
+            return_date=date(2024, 5, 3), status='returned',
+        )
+        with override_settings(LIBRARY_ANALYTICS={'CHECK_INTERVAL': 0, 'MIN_AGE': 3600, 'SYNC': True}):
+            with self.assertNumQueries(0):     # snapshot młodszy niż MIN_AGE - bez sprawdzania wersji
+                self.assertEqual(self.report('loan-durations')['count'], 4)
+        self.assertEqual(self.report('loan-durations')['count'], 5)
+
+
+
+class RecommendationTests(TestCase):
+
+    def setUp(self):
+        self.client = APIClient()
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        self.snapshot = os.path.join(directory, 'recommendations.npz')
+        self.enterContext(override_settings(LIBRARY_RECOMMENDATIONS={'SNAPSHOT': self.snapshot, 'CHECK_INTERVAL': 0}))
+        recommendations.service.reset()
+        self.addCleanup(recommendations.service.reset)
+
+        publisher = Publisher.objects.create(name="Znak")
+        self.books = [
+            Book.objects.create(title=f"Tom {number}", publisher=publisher, publication_year=2000 + number)
+            for number in range(5)
+        ]
+        self.patrons = [
+            Patron.objects.create(library_card_number=f"80000{number}", first_name="Czytelnik", last_name=str(number))
+            for number in range(4)
+        ]
+        # czytelnik -> książki (powtórne wypożyczenie liczy się raz); książka 4 bez wypożyczeń
+        for patron, books in ((0, (0, 1, 2)), (1, (0, 1)), (2, (0, 1, 1)), (3, (2, 3))):
+            for book in books:
+                self.borrow(patron, book)
+
+    def borrow(self, patron, book):
+        return Borrow.objects.create(
+            patron=self.patrons[patron], book=self.books[book], borrow_date=date(2024, 1, 5),
+            due_date=date(2024, 2, 4), return_date=date(2024, 1, 20), status='returned',
+        )
+
+    def ids(self, *numbers):
+        return [self.books[number].pk for number in numbers]
+
+    def test_neighbors_ranked_by_cosine_similarity(self):
+        b0, b1, b2, b3, b4 = self.ids(0, 1, 2, 3, 4)
+        self.assertEqual(recommendations.similar_books(b0), [(b1, 1.0, 3), (b2, 0.4082, 1)])
+        # remis wyników - rozstrzyga id książki
+        self.assertEqual(recommendations.similar_books(b2), [(b3, 0.7071, 1), (b0, 0.4082, 1), (b1, 0.4082, 1)])
+        self.assertEqual(recommendations.similar_books(b2, limit=1), [(b3, 0.7071, 1)])
+        self.assertEqual(recommendations.similar_books(b4), [])
+
+        index = recommendations.build_index(top_k=1, min_support=2)
+        self.assertEqual(index.similar(b0), [(b1, 1.0, 3)])
+        self.assertEqual(index.similar(b2), [])
+        self.assertEqual(index.stats()['neighbors'], 2)
+
+        Borrow.objects.all().delete()
+        self.assertEqual(recommendations.build_index().similar(b0), [])
+
+    def test_similar_endpoint(self):
+        b0, b1, b2 = self.ids(0, 1, 2)
+        response = self.client.get(f'/api/books/{b0}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['book'], b0)
+        self.assertEqual(
+            [(item['book']['id'], item['book']['title'], item['score'], item['patrons']) for item in response.data['results']],
+            [(b1, "Tom 1", 1.0, 3), (b2, "Tom 2", 0.4082, 1)],
+        )
+        self.assertEqual(len(self.client.get(f'/api/books/{b0}/similar/', {'limit': 1}).data['results']), 1)
+        self.assertEqual(self.client.get(f'/api/books/{b0}/similar/', {'limit': 'x'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/books/999999/similar/').status_code, 404)
+
+        result = schema.execute(f'{{ similarBooks(bookId: {b0}, first: 1) {{ book {{ title }} score patrons }} }}')
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data['similarBooks'], [{'book': {'title': "Tom 1"}, 'score': 1.0, 'patrons': 3}])
+
+    def test_rebuilt_snapshot_is_reloaded(self):
+        b3, b4 = self.ids(3, 4)
+        self.assertEqual(recommendations.similar_books(b4), [])
+        self.assertTrue(os.path.exists(self.snapshot))
+        with self.assertNumQueries(0):
+            recommendations.similar_books(b3)
+
+        self.borrow(3, 4)
+        self.assertEqual(recommendations.similar_books(b4), [])     # indeks do przebudowy
+        out = StringIO()
+        call_command('build_recommendations', stdout=out)
+        self.assertIn("5 książek", out.getvalue())
+        self.assertEqual([book_id for book_id, _, _ in recommendations.similar_books(b4)], self.ids(3, 2))
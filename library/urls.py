@@ -7,7 +7,12 @@ from .views import (
     BookViewSet,
     BookDetailsViewSet,
     PatronViewSet,
-    BorrowViewSet
+    BorrowViewSet,
+    cache_stats_view,
+    search_view,
+    autocomplete_view,
+    analytics_index_view,
+    analytics_view,
 )
 
 router = DefaultRouter()
@@ -20,5 +25,10 @@ router.register(r'patrons', PatronViewSet)
 router.register(r'borrows', BorrowViewSet)
 
 urlpatterns = [
+    path('cache-stats/', cache_stats_view, name='cache-stats'),
+    path('search/', search_view, name='search'),
+    path('autocomplete/', autocomplete_view, name='autocomplete'),
+    path('analytics/', analytics_index_view, name='analytics-index'),
+    path('analytics/<slug:report>/', analytics_view, name='analytics'),
     path('', include(router.urls)),
 ]
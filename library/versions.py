@@ -0,0 +1,36 @@
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TableVersion
+from . import cache
+
+
+# Podbija wersje tabel podanych modeli (jednym UPDATE-em, w bieżącej transakcji)
+def bump(*models):
+    tables = {model._meta.db_table for model in models}
+    now = timezone.now()
+    updated = TableVersion.objects.filter(table__in=tables).update(version=F('version') + 1, updated_at=now)
+    if updated < len(tables):
+        for table in tables:
+            TableVersion.objects.get_or_create(
+                table=table, defaults={'version': 1, 'updated_at': now})
+
+
+# {model: (wersja, czas ostatniej zmiany)}; tabele jeszcze niezmieniane mają wersję 0
+def get_versions(models):
+    tables = {model._meta.db_table: model for model in models}
+    rows = TableVersion.objects.filter(table__in=tables).values_list('table', 'version', 'updated_at')
+    versions = {model: (0, None) for model in models}
+    for table, version, updated_at in rows:
+        versions[tables[table]] = (version, updated_at)
+    return versions
+
+
+# Zmiana danych modeli: nowe wersje tabel (ETag) i unieważnienie cache'u odpowiedzi.
+# Cache jest unieważniany od razu i ponownie po zatwierdzeniu transakcji - czytelnik, który
+# przed commitem zapisał stare dane pod nową wersją, nie zostawi ich w cache'u (bez TTL)
+def models_changed(*models):
+    bump(*models)
+    cache.invalidate_models(*models)
+    transaction.on_commit(lambda: cache.invalidate_models(*models))
@@ -5,4 +5,8 @@ from .book_views import BookViewSet
 from .bookdetails_views import BookDetailsViewSet
 from .patron_views import PatronViewSet
 from .borrow_views import BorrowViewSet
-from .home_view import home_view
\ No newline at end of file
+from .home_view import home_view
+from .cache_views import cache_stats_view
+from .metrics_views import metrics_view
+from .search_views import search_view, autocomplete_view
+from .analytics_views import analytics_index_view, analytics_view
@@ -0,0 +1,50 @@
+from django.http import Http404
+from django.utils import timezone
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .. import analytics
+
+
+# Lista raportów analitycznych i stan snapshotu danych, z którego są liczone
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def analytics_index_view(request):
+    return Response({
+        'reports': {name: request.build_absolute_uri(f'{name}/') for name in analytics.REPORTS},
+        'snapshot': analytics.service.get_snapshot().stats(),
+    })
+
+
+# Raporty z library.analytics:
+# - retention/?months=12 - retencja kohort czytelników (miesiąc pierwszego wypożyczenia),
+# - loan-durations/ - rozkład czasu wypożyczenia w dniach,
+# - overdue-by-decade/ - odsetek przeterminowanych wypożyczeń według dekady wydania,
+# - co-borrowed-authors/?limit=20&author=<id> - autorzy wypożyczani przez tych samych czytelników
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def analytics_view(request, report):
+    if report not in analytics.REPORTS:
+        raise Http404
+    params = {}
+    if report == 'retention':
+        params['months'] = parse_int(request, 'months', 12, 1, analytics.MAX_COHORT_MONTHS)
+    elif report == 'overdue-by-decade':
+        params['today'] = timezone.localdate()
+    elif report == 'co-borrowed-authors':
+        params['limit'] = parse_int(request, 'limit', analytics.DEFAULT_LIMIT, 1, analytics.MAX_LIMIT)
+        if 'author' in request.query_params:
+            params['author'] = parse_int(request, 'author', None, 1, None)
+    return Response({'report': report, 'results': analytics.report(report, **params)})
+
+
+def parse_int(request, name, default, minimum, maximum):
+    try:
+        value = int(request.query_params.get(name, default))
+    except ValueError:
+        raise ValidationError({name: ["Wymagana jest liczba całkowita."]})
+    if value < minimum or (maximum is not None and value > maximum):
+        limits = f"od {minimum} do {maximum}" if maximum is not None else f"co najmniej {minimum}"
+        raise ValidationError({name: [f"Dozwolone wartości: {limits}."]})
+    return value
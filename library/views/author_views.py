@@ -4,9 +4,11 @@ from rest_framework.response import Response
 from rest_framework.renderers import JSONRenderer
 from ..models import Author
 from ..serializers import AuthorSerializer, AuthorCreateUpdateSerializer
+from .mixins import ConditionalGetMixin
 
-class AuthorViewSet(viewsets.ModelViewSet):
+class AuthorViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all()
+    etag_models = (Author,)
     renderer_classes = [JSONRenderer]
     filter_backends = [filters.SearchFilter]
     search_fields = ['first_name', 'last_name']
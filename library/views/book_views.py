@@ -1,21 +1,32 @@
 from rest_framework import viewsets, status, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.renderers import JSONRenderer
 from django.db.models import Count
 from django_filters.rest_framework import DjangoFilterBackend
-from ..models import Book
+from ..models import Book, Author, Category, Publisher, Borrow
+from .. import bulk, exports, images, recommendations
+from ..cache import cache_response
 from ..serializers import BookSerializer, BookCreateUpdateSerializer
+from .mixins import BulkMixin, ConditionalGetMixin, OptimizedQuerysetMixin, StreamingExportMixin
 
-class BookViewSet(viewsets.ModelViewSet):
+class BookViewSet(StreamingExportMixin, BulkMixin, ConditionalGetMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Book.objects.all()
+    etag_models = (Book, Author, Category, Publisher)
     renderer_classes = [JSONRenderer]
+    export_fields = ('id', 'title', 'publisher', 'publication_year', 'category', 'authors')
+    export_rows = staticmethod(exports.book_rows)
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['publication_year', 'category', 'authors', 'publisher']
     ordering_fields = ['publication_year', 'title']
-
-    def get_queryset(self):
-        return Book.objects.annotate(borrow_count=Count('borrows'))
+    bulk_operations = {'POST': bulk.create_books, 'PATCH': bulk.update_books, 'DELETE': bulk.delete_books}
+    bulk_messages = {
+        'POST': "Dodano książki: {count}.",
+        'PATCH': "Zaktualizowano książki: {count}.",
+        'DELETE': "Usunięto książki: {count}.",
+    }
+    page_size = 50
 
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PUT', 'PATCH']:
@@ -54,7 +65,8 @@ class BookViewSet(viewsets.ModelViewSet):
             "details": {
                 "isbn": details.isbn if details else None,
                 "pages": details.pages if details else None,
-                "cover_image": request.build_absolute_uri(details.cover_image.url) if details and details.cover_image else None
+                "cover_image": request.build_absolute_uri(details.cover_image.url) if details and details.cover_image else None,
+                "cover_variants": images.variant_urls(details.cover_variants, request) if details else {},
             }
         })
 
@@ -74,7 +86,25 @@ class BookViewSet(viewsets.ModelViewSet):
         ]
         return Response(data)
 
+    # Książki wypożyczane przez czytelników tej książki (library.recommendations), ?limit=10
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk=None):
+        book = self.get_object()
+        try:
+            limit = int(request.query_params.get('limit', recommendations.DEFAULT_LIMIT))
+        except ValueError:
+            raise ValidationError({'limit': ["Limit musi być liczbą całkowitą."]})
+        neighbors = recommendations.similar_books(book.pk, limit)
+        books = self.get_queryset().in_bulk([book_id for book_id, _, _ in neighbors])
+        results = [
+            {"score": score, "patrons": patrons, "book": self.get_serializer(books[book_id]).data}
+            for book_id, score, patrons in neighbors
+            if book_id in books
+        ]
+        return Response({"book": book.pk, "results": results})
+
     @action(detail=False, methods=['get'], url_path='most-borrowed')
+    @cache_response('most_borrowed', models=(Book, Author, Category, Publisher, Borrow))
     def most_borrowed(self, request):
         books = self.get_queryset().order_by('-borrow_count')[:3]
         serializer = self.get_serializer(books, many=True)
@@ -82,10 +112,8 @@ class BookViewSet(viewsets.ModelViewSet):
 
     # zwróci listę kategorii i liczbę książek, które do nich należą
     @action(detail=False, methods=['get'], url_path='category-stats')
+    @cache_response('category_stats', models=(Category, Book))
     def category_stats(self, request):
-
-        from ..models import Category
-
         stats = (
             Category.objects
             .annotate(book_count=Count('books'))
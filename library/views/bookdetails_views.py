@@ -1,11 +1,13 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
 from rest_framework.renderers import JSONRenderer
-from ..models import BookDetails
+from ..models import BookDetails, Book, Author, Category, Publisher
 from ..serializers import BookDetailsSerializer, BookDetailsCreateUpdateSerializer
+from .mixins import ConditionalGetMixin, OptimizedQuerysetMixin
 
-class BookDetailsViewSet(viewsets.ModelViewSet):
+class BookDetailsViewSet(ConditionalGetMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = BookDetails.objects.all()
+    etag_models = (BookDetails, Book, Author, Category, Publisher)
     renderer_classes = [JSONRenderer]
 
     def get_serializer_class(self):
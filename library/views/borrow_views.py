@@ -4,16 +4,30 @@ from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.renderers import JSONRenderer
 from django_filters.rest_framework import DjangoFilterBackend
-from datetime import date, timedelta
-from ..models import Borrow
-from ..serializers import BorrowSerializer, BorrowCreateUpdateSerializer
-
-class BorrowViewSet(viewsets.ModelViewSet):
+from datetime import timedelta
+from django.utils import timezone
+from ..models import Borrow, Patron, Book, Author, Category, Publisher
+from .. import bulk, rollups
+from ..cache import cache_response
+from ..serializers import BorrowSerializer, BorrowCreateUpdateSerializer, BorrowTimeseriesQuerySerializer
+from .mixins import BulkMixin, ConditionalGetMixin, OptimizedQuerysetMixin, StreamingExportMixin
+from .utils import query_flag
+
+class BorrowViewSet(StreamingExportMixin, BulkMixin, ConditionalGetMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Borrow.objects.all()
+    etag_models = (Borrow, Book, Author, Category, Publisher, Patron)
     renderer_classes = [JSONRenderer]
+    export_fields = ('id', 'patron', 'book', 'borrow_date', 'due_date', 'return_date', 'status')
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['status', 'patron']
     ordering_fields = ['borrow_date', 'due_date']
+    bulk_operations = {'POST': bulk.create_borrows, 'PATCH': bulk.update_borrows, 'DELETE': bulk.delete_borrows}
+    bulk_messages = {
+        'POST': "Dodano wypożyczenia: {count}.",
+        'PATCH': "Zaktualizowano wypożyczenia: {count}.",
+        'DELETE': "Usunięto wypożyczenia: {count}.",
+    }
+    page_size = 100
 
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PUT', 'PATCH']:
@@ -38,46 +52,53 @@ class BorrowViewSet(viewsets.ModelViewSet):
         return Response({"message": f"Wypożyczenie książki '{instance.book.title}' zostało usunięte."}, status=status.HTTP_200_OK)
 
     # Zwraca statystyki wypożyczeń
+    # ?stats=false pomija statystyki, ?stats_only=true zwraca same statystyki bez listy
     def list(self, request, *args, **kwargs):
-        queryset = self.filter_queryset(self.get_queryset())
+        stats_only = query_flag(request, 'stats_only')
+        with_stats = stats_only or query_flag(request, 'stats', default=True)
 
-        stats = {
-            "total_borrows": queryset.count(),
-            "active": queryset.filter(status='active').count(),
-            "overdue": queryset.filter(status='overdue').count(),
-            "returned": queryset.filter(status='returned').count(),
-        }
+        data = {}
+        if with_stats:
+            queryset = self.filter_queryset(self.get_queryset())
+            data["stats"] = queryset.status_counts(statuses=('active', 'overdue', 'returned'))
+        if stats_only:
+            return Response(data)
 
         response = super().list(request, *args, **kwargs)
-        response.data = {
-            "stats": stats,
-            "results": response.data
-        }
+        if isinstance(response.data, dict):     # odpowiedź stronicowana: next, previous, results
+            data.update(response.data)
+        else:
+            data["results"] = response.data
+        response.data = data
         return response
 
-    # Zwraca szczegóły wypożyczenia
+    # Zwrot książki - aktywne i przeterminowane wypożyczenia (status 'overdue' ustawia mark_overdue)
     @action(detail=True, methods=['post'], url_path='return-book')
     def return_book(self, request, pk=None):
         borrow = self.get_object()
-        if borrow.status != 'active':
-            return Response({'error': 'Tylko aktywne wypożyczenia mogą zostać oznaczone jako zwrócone.'}, status=status.HTTP_400_BAD_REQUEST)
+        if borrow.status not in ('active', 'overdue'):
+            return Response({'error': 'Tylko aktywne lub przeterminowane wypożyczenia mogą zostać oznaczone jako zwrócone.'}, status=status.HTTP_400_BAD_REQUEST)
         borrow.status = 'returned'
-        borrow.return_date = date.today()
+        borrow.return_date = timezone.localdate()
         borrow.save()
         return Response({'message': 'Książka została zwrócona.'}, status=status.HTTP_200_OK)
 
-    # Przedłuża termin zwrotu książki o 30 dni
+    # Przedłuża termin zwrotu książki o 30 dni. Przeterminowane wypożyczenie też można przedłużyć -
+    # jeśli nowy termin jeszcze nie minął, wraca do statusu 'active' (inaczej zostaje 'overdue')
     @action(detail=True, methods=['post'], url_path='extend-date')
     def extend_due_date(self, request, pk=None):
         borrow = self.get_object()
-        if borrow.status != 'active':
-            return Response({'error': 'Tylko aktywne wypożyczenia mogą zostać przedłużone.'}, status=status.HTTP_400_BAD_REQUEST)
+        if borrow.status not in ('active', 'overdue'):
+            return Response({'error': 'Tylko aktywne lub przeterminowane wypożyczenia mogą zostać przedłużone.'}, status=status.HTTP_400_BAD_REQUEST)
         borrow.due_date = borrow.due_date + timedelta(days=30)
+        if borrow.status == 'overdue' and borrow.due_date >= timezone.localdate():
+            borrow.status = 'active'
         borrow.save()
         return Response({'message': 'Termin zwrotu książki został przedłużony o 30 dni.'}, status=status.HTTP_200_OK)
 
     # Zwraca statystyki wypożyczeń w każdej z możliwych kategorii statusu
     @action(detail=False, methods=['get'], url_path='status-stats')
+    @cache_response('status_stats', models=(Borrow,))
     def status_stats(self, request):
         queryset = Borrow.objects.values('status').annotate(count=Count('id'))
         return Response({
@@ -86,24 +107,33 @@ class BorrowViewSet(viewsets.ModelViewSet):
 
     # Zwraca ile wypozyczył książek każdy z czytelników
     @action(detail=False, methods=['get'], url_path='patron-stats')
+    @cache_response('patron_stats', models=(Patron, Borrow))
     def patron_stats(self, request):
-        queryset = (
-            Borrow.objects
-            .values('patron_id', 'patron__first_name', 'patron__last_name')
-            .annotate(total_borrows=Count('id'))
+        patrons = (
+            Patron.objects
+            .filter(borrow_count__gt=0)
+            .values('id', 'first_name', 'last_name', 'borrow_count')
         )
-        return Response({"results": list(queryset)})
+        results = [
+            {
+                "patron_id": patron['id'],
+                "patron__first_name": patron['first_name'],
+                "patron__last_name": patron['last_name'],
+                "total_borrows": patron['borrow_count'],
+            }
+            for patron in patrons
+        ]
+        return Response({"results": results})
 
     @action(detail=False, methods=['get'], url_path='stats')
     def borrow_stats(self, request):
-        queryset = self.get_queryset()
-
-        stats = {
-            "total_borrows": queryset.count(),
-            "active": queryset.filter(status='active').count(),
-            "overdue": queryset.filter(status='overdue').count(),
-            "returned": queryset.filter(status='returned').count(),
-            "lost": queryset.filter(status='lost').count(),
-        }
-
+        stats = self.get_queryset().status_counts()
         return Response({"stats": stats}, status=status.HTTP_200_OK)
+
+    # Szereg czasowy liczby wypożyczeń z agregatów (library.rollups), np.
+    # ?period=month&group_by=category&start=2024-01-01&end=2024-12-31&status=returned
+    @action(detail=False, methods=['get'], url_path='timeseries')
+    def timeseries(self, request):
+        params = BorrowTimeseriesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response({**params.data, "results": rollups.timeseries(**params.validated_data)})
@@ -0,0 +1,11 @@
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .. import cache
+
+
+# Zwraca statystyki trafień cache'u odpowiedzi (w obrębie bieżącego procesu)
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def cache_stats_view(request):
+    return Response(cache.stats.snapshot())
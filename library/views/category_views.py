@@ -4,9 +4,11 @@ from rest_framework.renderers import JSONRenderer
 from django_filters.rest_framework import DjangoFilterBackend
 from ..models import Category
 from ..serializers import CategorySerializer, CategoryCreateUpdateSerializer
+from .mixins import ConditionalGetMixin
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
+    etag_models = (Category,)
     renderer_classes = [JSONRenderer]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['name']
@@ -0,0 +1,10 @@
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+
+from .. import metrics
+
+
+# Metryki w formacie tekstowym Prometheusa (suma wszystkich procesów na hoście)
+@require_GET
+def metrics_view(request):
+    return HttpResponse(metrics.render(), content_type=metrics.CONTENT_TYPE)
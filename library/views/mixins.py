@@ -0,0 +1,139 @@
+import hashlib
+
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+
+from .. import exports, versions
+from .utils import query_flag
+
+
+# Zwraca relacje zadeklarowane w serializerze jako `required_relations`
+def get_required_relations(serializer_class):
+    relations = getattr(serializer_class, 'required_relations', {})
+    return relations.get('select_related', []), relations.get('prefetch_related', [])
+
+
+# Dokłada do querysetu select_related/prefetch_related wymagane przez serializer,
+# dzięki czemu zagnieżdżone serializery nie generują zapytań N+1
+def optimize_queryset(queryset, serializer_class):
+    select, prefetch = get_required_relations(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+
+# Mixin dla ViewSetów - optymalizuje queryset pod serializer z get_serializer_class()
+class OptimizedQuerysetMixin:
+    def get_queryset(self):
+        return optimize_queryset(super().get_queryset(), self.get_serializer_class())
+
+
+# Odpowiedź 304 - zgłaszana w initial(), zanim widok pobierze i zserializuje dane
+class NotModified(APIException):
+    status_code = status.HTTP_304_NOT_MODIFIED
+
+
+# Mixin dla ViewSetów - ETag i Last-Modified dla list i szczegółów.
+# Walidatory wyliczane są z wersji tabel (library.versions) modeli z `etag_models`,
+# więc ich koszt to jedno zapytanie niezależnie od rozmiaru odpowiedzi.
+class ConditionalGetMixin:
+    etag_models = ()
+    conditional_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.validators = None
+        if request.method in ('GET', 'HEAD') and self.action in self.conditional_actions:
+            self.validators = self.get_validators(request)
+            if self.is_not_modified(request, *self.validators):
+                raise NotModified()
+
+    def get_validators(self, request):
+        table_versions = versions.get_versions(self.etag_models)
+        raw = repr((request.get_full_path(), [table_versions[model][0] for model in self.etag_models]))
+        etag = '"%s"' % hashlib.sha1(raw.encode('utf-8')).hexdigest()
+        modified = [updated_at for _, updated_at in table_versions.values() if updated_at]
+        return etag, max(modified) if modified else None
+
+    def is_not_modified(self, request, etag, last_modified):
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            return '*' in etags or etag in etags
+        if_modified_since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+        if if_modified_since is not None and last_modified is not None:
+            return int(last_modified.timestamp()) <= if_modified_since
+        return False
+
+    def set_validators(self, response):
+        etag, last_modified = self.validators
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified.timestamp())
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            self.set_validators(response)
+            return response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if getattr(self, 'validators', None) and response.status_code == status.HTTP_200_OK:
+            self.set_validators(response)
+        return response
+
+
+# Mixin dla ViewSetów - endpoint zbiorczy /bulk/: POST dodaje, PATCH aktualizuje, DELETE usuwa
+# (lista id). `bulk_operations` mapuje metodę HTTP na funkcję z library.bulk.
+# Domyślnie błąd dowolnej pozycji odrzuca całą paczkę; ?atomic=false zapisuje poprawne
+# pozycje, a błędy pozostałych zwraca w polu "errors".
+class BulkMixin:
+    bulk_operations = {}
+    bulk_messages = {}
+
+    @action(detail=False, methods=['post', 'patch', 'delete'], url_path='bulk')
+    def bulk(self, request):
+        atomic = query_flag(request, 'atomic', default=True)
+        result = self.bulk_operations[request.method](request.data, atomic=atomic)
+        if result.errors and atomic:
+            return Response(
+                {"message": "Paczka zawiera błędy - żadna pozycja nie została zapisana.", "errors": result.errors},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        if request.method == 'DELETE':
+            data = result.objects
+        else:
+            data = self.get_serializer(result.objects, many=True).data
+        return Response(
+            {
+                "message": self.bulk_messages[request.method].format(count=len(result.objects)),
+                "data": data,
+                "errors": result.errors,
+            },
+            status=status.HTTP_201_CREATED if request.method == 'POST' else status.HTTP_200_OK,
+        )
+
+
+# Mixin dla ViewSetów - eksport strumieniowy /export/ndjson/ i /export/csv/.
+# Queryset przechodzi przez filter_queryset, więc działają te same filtry i sortowanie co w liście.
+class StreamingExportMixin:
+    export_fields = ()
+    export_rows = staticmethod(exports.value_rows)
+
+    # odpowiedź eksportu nie przechodzi przez renderery - nagłówek Accept (np. text/csv) nie daje 406
+    def perform_content_negotiation(self, request, force=False):
+        return super().perform_content_negotiation(request, force=force or self.action == 'export')
+
+    @action(detail=False, methods=['get'], url_path=r'export/(?P<fmt>ndjson|csv)')
+    def export(self, request, fmt=None):
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = self.export_rows(queryset, self.export_fields)
+        return exports.streaming_response(rows, self.export_fields, fmt, queryset.model._meta.verbose_name_plural)
@@ -4,10 +4,13 @@ from rest_framework.response import Response
 from rest_framework.renderers import JSONRenderer
 from ..models import Patron
 from ..serializers import PatronSerializer, PatronCreateUpdateSerializer, BorrowSerializer
+from .mixins import ConditionalGetMixin, StreamingExportMixin, optimize_queryset
 
-class PatronViewSet(viewsets.ModelViewSet):
+class PatronViewSet(StreamingExportMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Patron.objects.all()
+    etag_models = (Patron,)
     renderer_classes = [JSONRenderer]
+    export_fields = ('id', 'library_card_number', 'first_name', 'last_name', 'email')
 
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PUT', 'PATCH']:
@@ -36,7 +39,7 @@ class PatronViewSet(viewsets.ModelViewSet):
         patron = self.get_object()
         status_param = request.query_params.get('status', None)
 
-        borrows = patron.borrows.all()
+        borrows = optimize_queryset(patron.borrows.all(), BorrowSerializer)
         if status_param:
             borrows = borrows.filter(status=status_param)
 
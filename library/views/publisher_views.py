@@ -1,13 +1,14 @@
 from rest_framework import viewsets, status
 from rest_framework.response import Response
-from django.db.models import Count
 from rest_framework.decorators import action
 from rest_framework.renderers import JSONRenderer
 from ..models import Publisher, Book
 from ..serializers import PublisherSerializer, PublisherCreateUpdateSerializer, BookSerializer
+from .mixins import ConditionalGetMixin, optimize_queryset
 
-class PublisherViewSet(viewsets.ModelViewSet):
+class PublisherViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Publisher.objects.all()
+    etag_models = (Publisher,)
     renderer_classes = [JSONRenderer]
 
     def get_serializer_class(self):
@@ -35,7 +36,7 @@ class PublisherViewSet(viewsets.ModelViewSet):
     @action(detail=True, methods=['get'], url_path='books')
     def list_books(self, request, pk=None):
         publisher = self.get_object()
-        books = Book.objects.filter(publisher=publisher)
+        books = optimize_queryset(Book.objects.filter(publisher=publisher), BookSerializer)
         serializer = BookSerializer(books, many=True)
         return Response(serializer.data)
 
@@ -46,14 +47,8 @@ class PublisherViewSet(viewsets.ModelViewSet):
 
         books_count = publisher.books.count()       # policzenie książek
 
-        # liczenie wypożyczeń
-        total_borrows = (
-            publisher.books
-            .aggregate(total=Count('borrows'))['total']     # borrows -> related_name w book -> Borrow
-        )
-
         return Response({
             "publisher": publisher.name,
             "books_count": books_count,
-            "total_borrows": total_borrows
+            "total_borrows": publisher.total_borrows    # licznik utrzymywany przez library.counters
         })
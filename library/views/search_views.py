@@ -0,0 +1,46 @@
+from rest_framework.decorators import api_view, renderer_classes
+from rest_framework.exceptions import ValidationError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from .. import autocomplete, search
+
+
+# Wyszukiwanie pełnotekstowe w książkach (tytuł, autorzy, wydawca, kategoria, ISBN),
+# autorach i czytelnikach: ?q=<zapytanie>&type=book,author&limit=20
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def search_view(request):
+    query = request.query_params.get('q', '').strip()
+    if not search.terms(query):
+        raise ValidationError({'q': ["Podaj szukaną frazę."]})
+
+    kinds = parse_kinds(request, search.KINDS)
+    limit = parse_limit(request, search.DEFAULT_LIMIT)
+    return Response({'query': query, 'results': search.search(query, kinds, limit)})
+
+
+# Podpowiedzi podczas pisania (tytuły, autorzy, numery kart) z indeksu w pamięci procesu,
+# z tolerancją literówek: ?q=<początek frazy>&type=book,patron&limit=10
+@api_view(['GET'])
+@renderer_classes([JSONRenderer])
+def autocomplete_view(request):
+    query = request.query_params.get('q', '').strip()
+    kinds = parse_kinds(request, autocomplete.KINDS)
+    limit = parse_limit(request, autocomplete.DEFAULT_LIMIT)
+    results = autocomplete.complete(query, kinds, limit) if query else []
+    return Response({'query': query, 'results': results})
+
+
+def parse_kinds(request, allowed):
+    kinds = [kind for kind in request.query_params.get('type', '').split(',') if kind]
+    unknown = [kind for kind in kinds if kind not in allowed]
+    if unknown:
+        raise ValidationError({'type': [f"Nieznany typ: {', '.join(unknown)}. Dozwolone: {', '.join(allowed)}."]})
+    return kinds
+
+
+def parse_limit(request, default):
+    try:
+        return int(request.query_params.get('limit', default))
+    except ValueError:
+        raise ValidationError({'limit': ["Limit musi być liczbą całkowitą."]})
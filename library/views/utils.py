@@ -0,0 +1,15 @@
+TRUE_VALUES = ('1', 'true', 'yes', 'on')
+FALSE_VALUES = ('0', 'false', 'no', 'off')
+
+
+# Odczytuje parametr typu tak/nie z query string (np. ?stats=false)
+def query_flag(request, name, default=False):
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    value = value.lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    return default